@@ -0,0 +1,167 @@
+#Transparent reading and writing of compressed files
+import bz2
+import gzip
+import io
+import locale
+import lzma
+import os
+import queue
+import threading
+
+"""
+gzip, xz and bz2 files are detected by their magic bytes when read and by their extension when written. Compressed
+input is decompressed by a background thread (the codecs release the GIL), so decompression and parsing overlap
+"""
+
+READ_BUFFER_SIZE = 1 << 20
+WRITE_BUFFER_SIZE = 1 << 20
+BACKGROUND_QUEUE_SIZE = 8  # decompressed chunks the background thread may read ahead
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"\xfd7zXZ\x00": "xz", b"BZh": "bz2"}
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".gzip": "gzip", ".xz": "xz", ".lzma": "xz", ".bz2": "bz2"}
+COMPRESSION_MODULES = {"gzip": gzip, "xz": lzma, "bz2": bz2}
+
+
+def detect_compression(file_path):
+    # type: (str) -> str
+    """
+    :param file_path: existing file
+    :return: "gzip", "xz", "bz2" or None for uncompressed files
+    """
+    with open(file_path, "rb") as file:
+        head = file.read(max(len(magic) for magic in COMPRESSION_MAGIC))
+    for magic, compression in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def strip_compression_extension(file_path):
+    # type: (str) -> str
+    """
+    :param file_path:
+    :return: the path without a compression extension, e.g. "data.csv" for "data.csv.gz"
+    """
+    root, extension = os.path.splitext(file_path)
+    return root if extension.lower() in COMPRESSION_EXTENSIONS else file_path
+
+
+def open_input(file_path, background=True):
+    # type: (str, bool) -> file
+    """
+    Opens a (possibly compressed) file for reading text with a large buffer
+    :param file_path:
+    :param background: whether compressed files are decompressed by a background thread
+    :return: text file object
+    """
+    compression = detect_compression(file_path)
+    if compression is None:
+        return open(file_path, buffering=READ_BUFFER_SIZE)
+    stream = COMPRESSION_MODULES[compression].open(file_path, "rb")
+    if background:
+        stream = BackgroundReader(stream)
+    return io.TextIOWrapper(io.BufferedReader(stream, READ_BUFFER_SIZE), encoding=locale.getpreferredencoding(False))
+
+
+def open_output(file_path):
+    # type: (str) -> file
+    """
+    Opens a file for writing text, compressed if its extension is one of COMPRESSION_EXTENSIONS
+    :param file_path:
+    :return: text file object
+    """
+    compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+    if compression is None:
+        return open(file_path, "w", buffering=WRITE_BUFFER_SIZE)
+    if compression == "gzip":  # the default level 9 is several times slower for little gain
+        stream = gzip.open(file_path, "wb", compresslevel=6)
+    else:
+        stream = COMPRESSION_MODULES[compression].open(file_path, "wb")
+    return io.TextIOWrapper(io.BufferedWriter(stream, WRITE_BUFFER_SIZE), encoding=locale.getpreferredencoding(False))
+
+
+class BackgroundReader(io.RawIOBase):
+    """
+    Raw stream reading a (decompressing) source in a background thread, handing the chunks over by a bounded queue
+    """
+    def __init__(self, source, chunk_size=READ_BUFFER_SIZE):
+        # type: (file, int) -> None
+        """
+        Constructor, starts the thread
+        :param source: binary file object
+        :param chunk_size: number of bytes read from the source at once
+        """
+        super().__init__()
+        self.source = source
+        self.chunk_size = chunk_size
+        self.chunks = queue.Queue(BACKGROUND_QUEUE_SIZE)
+        self.pending = memoryview(b"")
+        self.finished = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.produce, daemon=True)
+        self.thread.start()
+
+    def produce(self):
+        # type: (None) -> None
+        """
+        Thread function, an empty chunk marks the end of the source, an exception is handed over to be raised
+        :return:
+        """
+        try:
+            while not self.stopped.is_set():
+                chunk = self.source.read(self.chunk_size)
+                self.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self.put(e)
+
+    def put(self, item):
+        # type: (object) -> None
+        """
+        Blocks while the queue is full, unless the reader has been closed
+        :param item:
+        :return:
+        """
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # type: (bytearray) -> int
+        """
+        :param buffer:
+        :return: number of bytes copied into the buffer, 0 at the end of the source
+        """
+        if not self.pending:
+            if self.finished:
+                return 0
+            chunk = self.chunks.get()
+            if isinstance(chunk, Exception):
+                self.finished = True
+                raise chunk
+            if not chunk:
+                self.finished = True
+                return 0
+            self.pending = memoryview(chunk)
+        n = min(len(buffer), len(self.pending))
+        buffer[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def close(self):
+        # type: (None) -> None
+        """
+        Stops the thread and closes the source
+        :return:
+        """
+        if not self.closed:
+            self.stopped.set()
+            self.thread.join()
+            self.source.close()
+        super().close()
@@ -1,13 +1,152 @@
 #Defines a day aggregator object
 import datetime
+import math
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from Sketch import SUMMARY_TYPES, Summary, TDigest, percentile_fraction
+from Downsampling import DOWNSAMPLE_METHODS, envelope, lttb
 
 """Node and Leaf classes helping to build a date tree structure, could be expanded easily"""
 
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+WEEK = 10080
+# weeks start on mondays, the epoch is a thursday
+WEEK_ORIGIN = 4 * 1440
+# width of the named output resolutions in minutes
+RESOLUTIONS = {"minute": 1, "hour": 60, "day": 1440, "week": WEEK}
+# units of resolutions given as a multiple like "15min", "6h", "2d" or "1w"
+RESOLUTION_UNITS = {"min": 1, "h": 60, "d": 1440, "w": WEEK}
+# value types answered from the nested means and extremes, all others from summaries (see Sketch)
+NESTED_TYPES = ("mean", "min", "max")
+# ranges of up to this many rollup entries are summed directly rather than as a difference of prefix sums
+DIRECT_SUM_ENTRIES = 64
+
+
+def datetime_to_minute(date):
+    # type: (datetime) -> int
+    """
+    Converts a datetime object into minutes since the epoch (seconds are dropped)
+    :param date:
+    :return: epoch minute
+    """
+    return (date.toordinal() - EPOCH_ORDINAL) * 1440 + date.hour * 60 + date.minute
+
+
+def minute_to_datetime(key):
+    # type: (int) -> datetime
+    """
+    Converts minutes since the epoch back into a datetime object
+    :param key: epoch minute
+    :return:
+    """
+    return EPOCH + datetime.timedelta(minutes=key)
+
+
+def resolution_width(resolution):
+    # type: (str) -> int
+    """
+    Converts an output resolution into its bucket width in minutes
+    :param resolution: name of RESOLUTIONS or a multiple of a unit like "5min", "15min", "6h", "2d" or "1w"
+    :return: width in minutes
+    """
+    if resolution in RESOLUTIONS:
+        return RESOLUTIONS[resolution]
+    match = re.match(r"^([0-9]+)(min|h|d|w)$", str(resolution))
+    if match is None or int(match.group(1)) < 1:
+        raise ValueError("Invalid resolution: '%s'" % str(resolution))
+    return int(match.group(1)) * RESOLUTION_UNITS[match.group(2)]
+
+
+def check_value_type(value_type):
+    # type: (str) -> str
+    """
+    :param value_type: "mean", "min", "max" (nested like the tree), "count", "sum", "var", "std", "median" or a
+                       percentile like "p95", "p99.9" (of all values of a bucket)
+    :return: the value type, an AssertionError is raised for unknown ones
+    """
+    if value_type in NESTED_TYPES or value_type in SUMMARY_TYPES or percentile_fraction(str(value_type)) is not None:
+        return value_type
+    raise AssertionError("Invalid value type: " + str(value_type))
+
+
+def split_value_types(value_type):
+    # type: (str) -> (str,)
+    """
+    Several value types are computed in the same pass over a container, yielding one tuple of values per bucket
+    :param value_type: value type (see check_value_type), comma separated value types like "mean,min,max,count" or a
+                       list of them
+    :return: tuple of the checked value types
+    """
+    if isinstance(value_type, str):
+        value_type = value_type.split(",")
+    return tuple(check_value_type(str(element).strip()) for element in value_type)
+
+
+def bucket_start(key, width):
+    # type: (int, int) -> int
+    """
+    Buckets spanning whole weeks start on mondays, all others are aligned to the epoch
+    :param key: epoch minute
+    :param width: bucket width in minutes
+    :return: epoch minute the bucket containing key starts at
+    """
+    origin = WEEK_ORIGIN if width % WEEK == 0 else 0
+    return (key - origin) // width * width + origin
+
+
+def nan_min(values):
+    # type: ([float]) -> float
+    """
+    Minimum leaving out nan (stored "NA" fields), min() alone returns nan or not depending on where nan is placed
+    :param values: list or array of floats
+    :return: minimum of the values which are not nan, nan if there are none
+    """
+    total = sum(values)
+    if total - total == 0:  # neither nan nor inf
+        return min(values)
+    values = [value for value in values if value == value]
+    return min(values) if values else float("nan")
+
+
+def nan_max(values):
+    # type: ([float]) -> float
+    """
+    Maximum leaving out nan, see nan_min
+    :param values: list or array of floats
+    :return: maximum of the values which are not nan, nan if there are none
+    """
+    total = sum(values)
+    if total - total == 0:
+        return max(values)
+    values = [value for value in values if value == value]
+    return max(values) if values else float("nan")
+
+
+def pair_min(a, b):
+    # type: (float, float) -> float
+    """
+    :return: nan_min of two values
+    """
+    return b if a != a or b < a else a
+
+
+def pair_max(a, b):
+    # type: (float, float) -> float
+    """
+    :return: nan_max of two values
+    """
+    return b if a != a or b > a else a
+
 
 class MainContainer(object):
     """
     Container class holding all  derived instances
     """
+    child_width = 1440  # width of the children's time unit in minutes
+    child_keys = None  # sorted epoch minute keys of the children, built on the first range query (see get_child_keys)
+
     def __init__(self, date=None, _type="", sensor="", _id="DummyID", name="container"):
         self.id = _id
         self.type = _type
@@ -17,6 +156,7 @@ class MainContainer(object):
         self.value = None
         self.min_value = None
         self.max_value = None
+        self.summary = None  # Summary of all values below the node, merged from the children's summaries
         self.actual_child = 0
         self.name = name
 
@@ -56,11 +196,9 @@ class MainContainer(object):
         if self.min_value is not None:
             return self.min_value
         else:
-            instance_min = float("inf")
+            instance_min = float("nan")  # nan only if all values are nan, see nan_min
             for child in self.children:
-                local_min = child.get_min_value()
-                if local_min < instance_min:
-                    instance_min = local_min
+                instance_min = pair_min(instance_min, child.get_min_value())
             self.min_value = instance_min
             return instance_min
 
@@ -68,21 +206,105 @@ class MainContainer(object):
         if self.max_value is not None:
             return self.max_value
         else:
-            instance_max = 0
+            instance_max = float("nan")
             for child in self.children:
-                local_max = child.get_max_value()
-                if local_max > instance_max:
-                    instance_max = local_max
+                instance_max = pair_max(instance_max, child.get_max_value())
             self.max_value = instance_max
             return instance_max
 
+    def get_summary(self):
+        # type: (None) -> Summary
+        """
+        :return: summary of all values below the node, merged from the (cached) summaries of the children
+        """
+        if self.summary is None:
+            summary = Summary()
+            for child in self.children:
+                summary.merge(child.get_summary())
+            self.summary = summary
+        return self.summary
+
+    def get_statistic(self, value_type):
+        # type: (str) -> float
+        """
+        :param value_type: see check_value_type, "mean" is the nested mean of the children's means
+        :return: the aggregate of the node
+        """
+        if value_type == "mean":
+            return self.get_value()
+        if value_type == "min":
+            return self.get_min_value()
+        if value_type == "max":
+            return self.get_max_value()
+        return self.get_summary().get(value_type)
+
     def add_child(self, timestamp):
         self.children.append(Day(date=timestamp))
         self.actual_child += 1
 
+    def get_child_keys(self):
+        # type: (None) -> array
+        """
+        Children are only ever appended (a merged child keeps its date), so the keys of children added since the last
+        call are appended as well
+        :return: sorted epoch minute keys of the children
+        """
+        if self.child_keys is None:
+            self.child_keys = array("q")
+        keys = self.child_keys
+        if len(keys) < len(self.children):
+            keys.extend(datetime_to_minute(child.date) for child in self.children[len(keys):])
+        return keys
+
+    def get_index_range(self, start_time, end_time):
+        # type: (datetime, datetime) -> (int, int)
+        """
+        Finds the children overlapping the time range by bisecting their keys. Timestamps without a child of their own
+        are mapped to the nearest children within the range, thus the range may be empty
+        :param start_time:
+        :param end_time:
+        :return: tuple (index of the first child, index after the last child)
+        """
+        keys = self.get_child_keys()
+        start_key = bucket_start(datetime_to_minute(start_time), self.child_width)
+        return bisect_left(keys, start_key), bisect_right(keys, datetime_to_minute(end_time))
+
+    def merge(self, other):
+        """
+        Appends the children of a node of the same type holding later data (e.g. parsed from the following chunk of
+        the file), nodes of the time unit straddling the boundary are merged recursively
+        :param other:
+        :return:
+        """
+        children = other.children
+        if self.children and children and self.children[-1].date == children[0].date:
+            self.children[-1].merge(children[0])
+            children = children[1:]
+        self.children.extend(children)
+        self.actual_child = len(self.children)
+        self.value = None
+        self.min_value = None
+        self.max_value = None
+        self.summary = None
+
+    def invalidate_last(self):
+        """
+        Resets the cached aggregates of this node and of its last descendants, the only nodes later values of a
+        chronological file can be appended to
+        :return:
+        """
+        self.value = None
+        self.min_value = None
+        self.max_value = None
+        self.summary = None
+        if self.name != "minute" and self.children:
+            self.children[-1].invalidate_last()
+
 
 class Day(MainContainer):
     """Day class, representing a day instance"""
+    child_width = 60
+
     def __init__(self, date):
         super().__init__(date=date)
         self.name = "day"
@@ -119,6 +341,7 @@ class Day(MainContainer):
 
 
 class Hour(Day):
+    child_width = 1
 
     def __init__(self, date):
         super().__init__(date=date)
@@ -152,7 +375,7 @@ class Minute(Hour):
 
     def get_min_value(self):
         try:
-            instance_min = min(self.children)
+            instance_min = nan_min(self.children)
             self.min_value = instance_min
             return instance_min
         except (ValueError, TypeError):
@@ -160,7 +383,7 @@ class Minute(Hour):
 
     def get_max_value(self):
         try:
-            instance_max = max(self.children)
+            instance_max = nan_max(self.children)
             self.max_value = instance_max
             return instance_max
         except (ValueError, TypeError):
@@ -169,9 +392,852 @@ class Minute(Hour):
     def get_raw_values(self):
         return self.children
 
+    def get_summary(self):
+        # type: (None) -> Summary
+        """
+        Not cached, the summary of a minute is about as large as its raw values
+        :return: summary of the minute's values
+        """
+        summary = Summary()
+        summary.add(self.children)
+        return summary
+
     def correct_date(self, date):
         return date
 
     def add_child(self, value):
         for i in value:
-            self.children.append(i)
\ No newline at end of file
+            self.children.append(i)
+
+    def merge(self, other):
+        self.children.extend(other.children)
+        self.value = None
+        self.min_value = None
+        self.max_value = None
+        self.summary = None
+
+
+class ColumnContainer(object):
+    """
+    Array backed alternative to the MainContainer tree. Holds one sorted key (minutes since epoch) per minute and all
+    raw values of the column in one contiguous float array, minute i owning values[offsets[i]:offsets[i + 1]]
+    """
+    def __init__(self, _type="", sensor="", _id="DummyID"):
+        self.id = _id
+        self.type = _type
+        self.sensor = sensor
+        self.keys = array("q")
+        self.offsets = array("q", [0])
+        self.values = array("d")
+        self.days = None  # optional per-day summary arrays (see summarize_days), set when loaded from a store
+        self.name = "column"
+
+    @staticmethod
+    def from_tree(root):
+        # type: (MainContainer) -> ColumnContainer
+        """
+        Converts a Day/Hour/Minute tree into a column container
+        :param root: MainContainer instance
+        :return:
+        """
+        column = ColumnContainer(_type=root.type, sensor=root.sensor, _id=root.id)
+        for day in root.children:
+            for hour in day.children:
+                for minute in hour.children:
+                    column.add_value(datetime_to_minute(minute.date), minute.children)
+        return column
+
+    def summarize_days(self):
+        # type: (None) -> dict
+        """
+        Computes one summary row per day: key of the day, index of its first minute, number of values and mean (of
+        the hour means, as in the tree), min and max
+        :return: dictionary of arrays keyed by "keys", "first", "count", "mean", "min" and "max"
+        """
+        days = {"keys": array("q"), "first": array("q"), "count": array("q"), "mean": array("d"),
+                "min": array("d"), "max": array("d")}
+        for i, key in enumerate(self.keys):
+            day_key = key // 1440 * 1440
+            if not days["keys"] or days["keys"][-1] != day_key:
+                days["keys"].append(day_key)
+                days["first"].append(i)
+        days["first"].append(len(self.keys))
+        for i in range(len(days["keys"])):
+            days["count"].append(self.offsets[days["first"][i + 1]] - self.offsets[days["first"][i]])
+        if self.keys:
+            start_time, end_time = minute_to_datetime(self.keys[0]), minute_to_datetime(self.keys[-1])
+            for value_type in ("mean", "min", "max"):
+                for _, value in self.iter_aggregated_values(start_time, end_time, "day", value_type):
+                    days[value_type].append(value)
+        return days
+
+    def __str__(self):
+        return "Minutes: %d, Values: %d, Type: %s, Sensor: %s" % (len(self.keys), len(self.values), self.type,
+                                                                  self.sensor)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_value(self, key, value):
+        # type: (int, [float]) -> None
+        """
+        Appends the values of one csv field to the minute given by key, opening a new minute if necessary
+        :param key: epoch minute of the field's timestamp
+        :param value: list of extracted floats ("NA" is stored as nan)
+        :return:
+        """
+        if not isinstance(value, list):
+            value = [float("nan")]
+        if not self.keys or self.keys[-1] != key:
+            self.keys.append(key)
+            self.offsets.append(self.offsets[-1])
+        self.values.extend(value)
+        self.offsets[-1] = len(self.values)
+
+    def merge(self, other):
+        # type: (ColumnContainer) -> None
+        """
+        Appends a container holding later data (e.g. parsed from the following chunk of the file), joining the values
+        of a minute straddling the boundary
+        :param other:
+        :return:
+        """
+        base = len(self.values)
+        self.values.extend(other.values)
+        start = 0
+        if self.keys and other.keys and self.keys[-1] == other.keys[0]:
+            start = 1
+            self.offsets[-1] = base + other.offsets[1]
+        self.keys.extend(other.keys[start:])
+        self.offsets.extend(base + offset for offset in other.offsets[start + 1:])
+
+    def get_index_range(self, start_time, end_time, width=1):
+        # type: (datetime, datetime, int) -> (int, int)
+        """
+        Finds the minute indices covering all buckets of the given width between start and end time
+        :param start_time:
+        :param end_time:
+        :param width: bucket width in minutes
+        :return: tuple (first index, index after the last minute)
+        """
+        start_key = bucket_start(datetime_to_minute(start_time), width)
+        end_key = bucket_start(datetime_to_minute(end_time), width) + width - 1
+        return bisect_left(self.keys, start_key), bisect_right(self.keys, end_key)
+
+    def get_raw_values(self, start_time, end_time):
+        # type: (datetime, datetime) -> [*(datetime, [*float])]
+        """
+        :param start_time:
+        :param end_time:
+        :return: list of tuples -> [*(datetime: timestamp, [float]: values)]
+        """
+        return list(self.iter_raw_values(start_time, end_time))
+
+    def iter_raw_values(self, start_time, end_time):
+        # type: (datetime, datetime) -> iter
+        """
+        :param start_time:
+        :param end_time:
+        :return: iterator of tuples -> (datetime: timestamp, [float]: values)
+        """
+        keys, offsets, values = self.keys, self.offsets, self.values
+        start_idx, end_idx = self.get_index_range(start_time, end_time)
+        for i in range(start_idx, end_idx):
+            yield minute_to_datetime(keys[i]), values[offsets[i]:offsets[i + 1]].tolist()
+
+    def get_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> [*(datetime, float)]
+        """
+        Aggregates the minutes between start and end time with the same semantics as the tree: the mean of an hour is
+        the mean of its minute means and the mean of a day the mean of its hour means, min and max cover all values.
+        Other widths average the means of the coarsest of these units dividing them (e.g. a week its day means)
+        :param start_time:
+        :param end_time:
+        :param resolution: "day", "hour", "minute" or any other resolution accepted by resolution_width
+        :param value_type: type of aggregation ("mean", "min", "max" or several of them, see split_value_types)
+        :return: list of tuples -> [*(datetime: timestamp, float: value or (float,): values)]
+        """
+        return list(self.iter_aggregated_values(start_time, end_time, resolution, value_type))
+
+    def iter_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> iter
+        """
+        Generator version of get_aggregated_values
+        :param start_time:
+        :param end_time:
+        :param resolution: "day", "hour", "minute" or any other resolution accepted by resolution_width
+        :param value_type: type of aggregation ("mean", "min", "max" or several of them, see split_value_types)
+        :return: iterator of tuples -> (datetime: timestamp, float: value or (float,): values)
+        """
+        value_types = split_value_types(value_type)
+        for element in value_types:
+            if element not in NESTED_TYPES:
+                raise AssertionError("Invalid value type: " + str(element))
+        width = resolution_width(resolution)
+        if width == 1440 and self.days is not None:  # answer from the precomputed summary
+            day_keys, columns = self.days["keys"], [self.days[element] for element in value_types]
+            start_idx = bisect_left(day_keys, datetime_to_minute(start_time) // 1440 * 1440)
+            end_idx = bisect_right(day_keys, datetime_to_minute(end_time) // 1440 * 1440)
+            for i in range(start_idx, end_idx):
+                if len(columns) == 1:
+                    yield minute_to_datetime(day_keys[i]), columns[0][i]
+                else:
+                    yield minute_to_datetime(day_keys[i]), tuple(column[i] for column in columns)
+            return
+        start_idx, end_idx = self.get_index_range(start_time, end_time, width)
+        buckets = self.iter_minute_values(start_idx, end_idx, value_types)
+        level_widths = [level_width for level_width in (60, 1440) if level_width < width and width % level_width == 0]
+        for level_width in level_widths + ([width] if width > 1 else []):
+            buckets = ColumnContainer.collapse(buckets, level_width, value_types)
+        for key, values in buckets:
+            yield minute_to_datetime(key), values[0] if len(values) == 1 else values
+
+    def iter_minute_values(self, start_idx, end_idx, value_types):
+        # type: (int, int, (str,)) -> iter
+        """
+        :param start_idx: index of the first minute
+        :param end_idx: index after the last minute
+        :param value_types: types of aggregation ("mean", "min", "max")
+        :return: iterator of (key, (values)) pairs in minute resolution, one value per value type
+        """
+        keys, offsets, values = self.keys, self.offsets, self.values
+        for i in range(start_idx, end_idx):
+            chunk = values[offsets[i]:offsets[i + 1]]
+            row = []
+            for value_type in value_types:
+                if value_type == "mean":
+                    row.append(sum(chunk) / len(chunk))
+                elif value_type == "min":
+                    row.append(nan_min(chunk))
+                else:
+                    row.append(nan_max(chunk))
+            yield keys[i], tuple(row)
+
+    @staticmethod
+    def collapse(buckets, width, value_types):
+        # type: (iter, int, (str,)) -> iter
+        """
+        Merges sorted (key, (values)) pairs into buckets of the given width
+        :param buckets:
+        :param width: bucket width in minutes
+        :param value_types: types of aggregation ("mean", "min", "max") of the values
+        :return: iterator of (key, (values)) pairs keyed by the bucket start
+        """
+        current_key = None
+        current = None
+        count = 0
+        for key, values in buckets:
+            key = bucket_start(key, width)
+            if key == current_key:
+                for k, value_type in enumerate(value_types):
+                    if value_type == "mean":
+                        current[k] += values[k]
+                    elif value_type == "min":
+                        current[k] = pair_min(current[k], values[k])
+                    else:
+                        current[k] = pair_max(current[k], values[k])
+                count += 1
+            else:
+                if current_key is not None:
+                    yield current_key, tuple(value / count if value_type == "mean" else value
+                                             for value, value_type in zip(current, value_types))
+                current_key, current, count = key, list(values), 1
+        if current_key is not None:
+            yield current_key, tuple(value / count if value_type == "mean" else value
+                                     for value, value_type in zip(current, value_types))
+
+
+class StreamingContainer(object):
+    """
+    One-pass aggregator keeping only running sums/ counts/ min/ max of the open buckets and the results of the closed
+    buckets at a single resolution, thus using memory proportional to the number of output buckets. Means are nested
+    like in the tree (an hour is the mean of its minute means, a day the mean of its hour means). If asked for, every
+    bucket also keeps a Summary (Welford moments and t-digest) of bounded size for the other value types
+    """
+    def __init__(self, resolution="minute", _type="", sensor="", _id="DummyID", callback=None, summaries=False):
+        # type: (str, str, str, str, callable, bool) -> None
+        """
+        Constructor
+        :param resolution: bucket resolution, "day", "hour", "minute" or any other accepted by resolution_width
+        :param callback: optional function called as callback(date, stats) whenever a bucket is closed, stats being a
+                         dictionary with the keys "mean", "min", "max", "count" and "summary" (the bucket's Summary,
+                         None without summaries)
+        :param summaries: whether every bucket keeps a Summary, needed for all value types but "mean", "min" and "max"
+                          (default: False, only the running count/ min/ max are kept)
+        """
+        self.id = _id
+        self.type = _type
+        self.sensor = sensor
+        self.resolution = resolution
+        self.callback = callback
+        self.keys = array("q")
+        self.means = array("d")
+        self.min_values = array("d")
+        self.max_values = array("d")
+        self.counts = array("q")
+        self.summaries = [] if summaries else None
+        self.name = "stream"
+        self.width = resolution_width(resolution)
+        # nested levels: every unit dividing the bucket width, the bucket itself on top
+        self._widths = [width for width in (1, 60, 1440) if width < self.width and self.width % width == 0]
+        self._widths.append(self.width)
+        self._open = [None] * len(self._widths)  # key of the open bucket at every level
+        self._sums = [0.0] * len(self._widths)
+        self._children = [0] * len(self._widths)
+        self._min = float("inf")
+        self._max = float("-inf")
+        self._count = 0
+        self._summary = Summary() if summaries else None  # summary of the values of the open bucket
+
+    def __str__(self):
+        return "Buckets: %d, Resolution: %s, Type: %s, Sensor: %s" % (len(self.keys), self.resolution, self.type,
+                                                                     self.sensor)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add_value(self, key, value):
+        # type: (int, [float]) -> None
+        """
+        Adds the values of one csv field, closing the open buckets if the field starts a new one
+        :param key: epoch minute of the field's timestamp
+        :param value: list of extracted floats ("NA" is counted as nan)
+        :return:
+        """
+        if not isinstance(value, list):
+            value = [float("nan")]
+        if self._open[0] != key:
+            self.advance(key)
+        self._sums[0] += sum(value)
+        self._children[0] += len(value)
+        if self._summary is not None:
+            self._summary.add(value)
+            return
+        self._count += len(value)
+        for element in value:
+            if element < self._min:
+                self._min = element
+            if element > self._max:
+                self._max = element
+
+    def advance(self, key):
+        # type: (int) -> None
+        """
+        Moves the open buckets to the given minute, closing (bottom up) every level whose bucket ends
+        :param key: epoch minute
+        :return:
+        """
+        for level, width in enumerate(self._widths):
+            bucket_key = bucket_start(key, width)
+            if self._open[level] == bucket_key:
+                break
+            if self._open[level] is not None:
+                self.close_level(level)
+            self._open[level] = bucket_key
+
+    def close_level(self, level):
+        # type: (int) -> None
+        """
+        Closes the open bucket of a level, handing its mean to the level above or storing it as a result
+        :param level:
+        :return:
+        """
+        mean = self._sums[level] / self._children[level]
+        self._sums[level] = 0.0
+        self._children[level] = 0
+        if level + 1 < len(self._widths):
+            self._sums[level + 1] += mean
+            self._children[level + 1] += 1
+            return
+        summary = self._summary
+        if summary is not None:
+            summary.digest.compress()
+            self._min, self._max, self._count = summary.min, summary.max, summary.count
+            self.summaries.append(summary)
+            self._summary = Summary()
+        self.keys.append(self._open[level])
+        self.means.append(mean)
+        if self._min > self._max:  # only nan values
+            self._min = self._max = float("nan")
+        self.min_values.append(self._min)
+        self.max_values.append(self._max)
+        self.counts.append(self._count)
+        self._min = float("inf")
+        self._max = float("-inf")
+        self._count = 0
+        if self.callback is not None:
+            self.callback(minute_to_datetime(self._open[level]),
+                          {"mean": mean, "min": self.min_values[-1], "max": self.max_values[-1],
+                           "count": self.counts[-1], "summary": summary})
+
+    def close(self):
+        # type: (None) -> None
+        """
+        Closes all open buckets, has to be called at the end of the input
+        :return:
+        """
+        if self._open[0] is None:
+            return
+        for level in range(len(self._widths)):
+            self.close_level(level)
+            self._open[level] = None
+
+    def get_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> [*(datetime, float)]
+        """
+        :param start_time:
+        :param end_time:
+        :param resolution: has to match the resolution the container has been created with
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type)
+        :return: list of tuples -> [*(datetime: timestamp, float: value)]
+        """
+        return list(self.iter_aggregated_values(start_time, end_time, resolution, value_type))
+
+    def iter_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> iter
+        """
+        Generator version of get_aggregated_values
+        :param start_time:
+        :param end_time:
+        :param resolution: has to match the resolution the container has been created with
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type) or several of them (see
+                           split_value_types)
+        :return: iterator of tuples -> (datetime: timestamp, float: value or (float,): values)
+        """
+        if resolution_width(resolution) != self.width:
+            raise AssertionError("Streaming container only holds %s buckets, not %s" % (self.resolution, resolution))
+        value_types = split_value_types(value_type)
+        columns = {"mean": self.means, "min": self.min_values, "max": self.max_values}
+        if self.summaries is None and any(element not in columns for element in value_types):
+            raise AssertionError("Streaming container keeps no summaries, only %s values can be aggregated" %
+                                 ", ".join(NESTED_TYPES))
+        start_idx = bisect_left(self.keys, bucket_start(datetime_to_minute(start_time), self.width))
+        end_idx = bisect_right(self.keys, bucket_start(datetime_to_minute(end_time), self.width))
+        for i in range(start_idx, end_idx):
+            values = tuple(columns[element][i] if element in columns else self.summaries[i].get(element)
+                           for element in value_types)
+            yield minute_to_datetime(self.keys[i]), values[0] if len(values) == 1 else values
+
+
+class Rollup(object):
+    """
+    Precomputed rollup pyramid of one column, answering aggregates of any bucket width without touching the raw
+    values. For the minute, hour and day series it holds prefix sums of the means, value sums and value counts, so the
+    mean of any long range is a difference of two (compensated) prefixes, short ranges are summed directly, and min/
+    max pyramids whose level k holds the extremes of
+    aligned blocks of 2^k entries, so the min/ max of any range combines at most two entries per level. A bucket
+    averages the means of the coarsest series whose width divides the bucket width, keeping the nested means of the
+    tree (an hour is the mean of its minute means, a day the mean of its hour means, a week the mean of its day means).
+    Counts and sums are differences of prefixes as well, variances combine the Welford moments (sum of squared
+    deviations) of the entries and percentiles merge the t-digests of the hours/ days, which are built on the first
+    percentile query
+    """
+    def __init__(self):
+        self.series = {}  # width (1, 60, 1440) -> dictionary of arrays
+        self.digests = {}  # width (60, 1440) -> list of TDigest per entry of the series
+        self.source = None  # container the rollup has been built from, see get_chunk
+        self.minute_nodes = None  # Minute nodes of a tree source
+
+    @staticmethod
+    def from_container(objct):
+        # type: (MainContainer) -> Rollup
+        """
+        Builds the rollup of a tree or of a column container in one pass over its minutes
+        :param objct: MainContainer instance "representing kind of the root node" or ColumnContainer
+        :return:
+        """
+        minutes = {"keys": array("q"), "mean": array("d"), "min": array("d"), "max": array("d"), "sum": array("d"),
+                   "count": array("q"), "m2": array("d")}
+        rollup = Rollup()
+        rollup.source = objct
+        if objct.name == "column":
+            keys, offsets, values = objct.keys, objct.offsets, objct.values
+            chunks = ((keys[i], values[offsets[i]:offsets[i + 1]]) for i in range(len(keys)))
+        elif objct.name == "container":
+            rollup.minute_nodes = [minute for day in objct.children for hour in day.children
+                                   for minute in hour.children]
+            chunks = ((datetime_to_minute(minute.date), minute.children) for minute in rollup.minute_nodes)
+        else:
+            raise AssertionError("A rollup cannot be built from %s containers" % objct.name)
+        for key, chunk in chunks:
+            total = sum(chunk)
+            mean = total / len(chunk)
+            minutes["keys"].append(key)
+            minutes["mean"].append(mean)
+            minutes["min"].append(nan_min(chunk))
+            minutes["max"].append(nan_max(chunk))
+            minutes["sum"].append(total)
+            minutes["count"].append(len(chunk))
+            minutes["m2"].append(sum((value - mean) * (value - mean) for value in chunk))
+        hours = Rollup.coarsen(minutes, 60)
+        days = Rollup.coarsen(hours, 1440)
+        rollup.add_series(1, minutes)
+        rollup.add_series(60, hours)
+        rollup.add_series(1440, days)
+        return rollup
+
+    @staticmethod
+    def coarsen(series, width):
+        # type: (dict, int) -> dict
+        """
+        Combines the entries of a series into buckets of the given width (means are averaged)
+        :param series: dictionary of arrays keyed by "keys", "mean", "min", "max", "sum", "count" and "m2"
+        :param width: bucket width in minutes
+        :return: series of the buckets
+        """
+        result = {field: array(series[field].typecode) for field in ("keys", "mean", "min", "max", "sum", "count",
+                                                                     "m2")}
+        keys = series["keys"]
+        i = 0
+        while i < len(keys):
+            key = bucket_start(keys[i], width)
+            j = bisect_left(keys, key + width, i)
+            result["keys"].append(key)
+            result["mean"].append(sum(series["mean"][i:j]) / (j - i))
+            result["min"].append(nan_min(series["min"][i:j]))
+            result["max"].append(nan_max(series["max"][i:j]))
+            result["sum"].append(sum(series["sum"][i:j]))
+            result["count"].append(sum(series["count"][i:j]))
+            result["m2"].append(Rollup.range_moments(series, i, j)[2])
+            i = j
+        return result
+
+    def add_series(self, width, series):
+        # type: (int, dict) -> None
+        """
+        Adds the prefix sums and min/ max pyramids to a series and stores it
+        :param width: width of the series' entries in minutes
+        :param series: dictionary of arrays keyed by "keys", "mean", "min", "max", "sum", "count" and "m2"
+        :return:
+        """
+        prefix = array("q", [0])
+        for value in series["count"]:
+            prefix.append(prefix[-1] + value)
+        series["count_prefix"] = prefix
+        for field in ("mean", "sum"):
+            prefix, error = array("d", [0]), array("d", [0])
+            total, compensation = 0.0, 0.0
+            for value in series[field]:
+                if value - value == 0:  # nan and inf would spoil all following prefixes, they are counted instead
+                    # Neumaier's summation, compensation collects the rounding errors of the additions
+                    new_total = total + value
+                    if abs(total) >= abs(value):
+                        compensation += (total - new_total) + value
+                    else:
+                        compensation += (value - new_total) + total
+                    total = new_total
+                prefix.append(total)
+                error.append(compensation)
+            series[field + "_prefix"] = prefix
+            series[field + "_error"] = error
+        nonfinite = array("q", [0])
+        for value in series["mean"]:
+            nonfinite.append(nonfinite[-1] + (value - value != 0))
+        series["nonfinite_prefix"] = nonfinite
+        for field, function in (("min", pair_min), ("max", pair_max)):
+            pyramid = [series[field]]
+            while len(pyramid[-1]) > 1:
+                level = pyramid[-1]
+                upper = array("d", map(function, level[0::2], level[1::2]))
+                if len(level) % 2:
+                    upper.append(level[-1])
+                pyramid.append(upper)
+            series[field + "_pyramid"] = pyramid
+        self.series[width] = series
+
+    def get_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> [*(datetime, float)]
+        """
+        :param start_time:
+        :param end_time:
+        :param resolution: any resolution accepted by resolution_width
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type)
+        :return: list of tuples -> [*(datetime: timestamp, float: value)]
+        """
+        return list(self.iter_aggregated_values(start_time, end_time, resolution, value_type))
+
+    def iter_aggregated_values(self, start_time, end_time, resolution, value_type="mean"):
+        # type: (datetime, datetime, str, str) -> iter
+        """
+        Generator version of get_aggregated_values
+        :param start_time:
+        :param end_time:
+        :param resolution: any resolution accepted by resolution_width
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type) or several of them (see
+                           split_value_types)
+        :return: iterator of tuples -> (datetime: timestamp, float: value or (float,): values)
+        """
+        value_types = split_value_types(value_type)
+        width = resolution_width(resolution)
+        level = max(level for level in (1, 60, 1440) if width % level == 0)
+        series = self.series[level]
+        keys = series["keys"]
+        i = bisect_left(keys, bucket_start(datetime_to_minute(start_time), width))
+        stop = bisect_left(keys, bucket_start(datetime_to_minute(end_time), width) + width)
+        while i < stop:
+            key = bucket_start(keys[i], width)
+            j = bisect_left(keys, key + width, i, stop)
+            values = []
+            digest = None  # merged once per bucket for all percentiles
+            for element in value_types:
+                if element == "mean":
+                    values.append(self.range_mean(series, i, j))
+                elif element in NESTED_TYPES:
+                    values.append(self.range_extreme(series[element + "_pyramid"], i, j, element))
+                elif percentile_fraction(element) is not None:
+                    if digest is None:
+                        digest = self.range_digest(level, i, j)
+                    values.append(digest.quantile(percentile_fraction(element)))
+                else:
+                    values.append(self.range_statistic(level, i, j, element))
+            yield minute_to_datetime(key), values[0] if len(values) == 1 else tuple(values)
+            i = j
+
+    @staticmethod
+    def range_mean(series, start_idx, end_idx):
+        # type: (dict, int, int) -> float
+        """
+        :param series:
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :return: mean of the entries' means
+        """
+        return Rollup.range_sum(series, "mean", start_idx, end_idx) / (end_idx - start_idx)
+
+    @staticmethod
+    def range_sum(series, field, start_idx, end_idx):
+        # type: (dict, str, int, int) -> float
+        """
+        Short ranges are summed directly and exactly rounded, so a bucket's result does not depend on its position. The
+        prefixes of long ranges are differences of sums over everything before them, their compensations (rounding
+        errors) are subtracted as well, which keeps the result accurate to the magnitude of the range
+        :param series:
+        :param field: "mean" or "sum"
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :return: sum of the entries' field
+        """
+        if series["nonfinite_prefix"][end_idx] != series["nonfinite_prefix"][start_idx]:
+            return sum(series[field][start_idx:end_idx])
+        if end_idx - start_idx <= DIRECT_SUM_ENTRIES:
+            return math.fsum(series[field][start_idx:end_idx])
+        prefix, error = series[field + "_prefix"], series[field + "_error"]
+        return (prefix[end_idx] - prefix[start_idx]) + (error[end_idx] - error[start_idx])
+
+    @staticmethod
+    def range_extreme(pyramid, start_idx, end_idx, value_type):
+        # type: ([array], int, int, str) -> float
+        """
+        Walks up the pyramid, taking the blocks at the ends of the range which are not covered by a block of the next
+        level
+        :param pyramid: min or max pyramid of a series
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :param value_type: "min" or "max"
+        :return: min or max of the entries
+        """
+        candidates = []
+        for level in pyramid:
+            if start_idx >= end_idx:
+                break
+            if start_idx & 1:
+                candidates.append(level[start_idx])
+                start_idx += 1
+            if end_idx & 1:
+                end_idx -= 1
+                candidates.append(level[end_idx])
+            start_idx >>= 1
+            end_idx >>= 1
+        return nan_min(candidates) if value_type == "min" else nan_max(candidates)
+
+    def range_statistic(self, level, start_idx, end_idx, value_type):
+        # type: (int, int, int, str) -> float
+        """
+        :param level: width of the series (1, 60 or 1440)
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :param value_type: "count", "sum", "var", "std", "median" or a percentile
+        :return: statistic of all values of the entries
+        """
+        series = self.series[level]
+        if value_type == "count":
+            return series["count_prefix"][end_idx] - series["count_prefix"][start_idx]
+        if value_type == "sum":
+            return Rollup.range_sum(series, "sum", start_idx, end_idx)
+        if value_type == "var" or value_type == "std":
+            count, _, m2 = Rollup.range_moments(series, start_idx, end_idx)
+            return m2 / count if value_type == "var" else math.sqrt(m2 / count)
+        return self.range_digest(level, start_idx, end_idx).quantile(percentile_fraction(value_type))
+
+    def range_digest(self, level, start_idx, end_idx):
+        # type: (int, int, int) -> TDigest
+        """
+        :param level: width of the series (1, 60 or 1440)
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :return: digest of all finite values of the entries
+        """
+        digest = TDigest()
+        if level == 1:  # minutes have no digests of their own, their raw values are few
+            for i in range(start_idx, end_idx):
+                digest.add(value for value in self.get_chunk(i) if value - value == 0)
+        else:
+            for entry in self.get_digests(level)[start_idx:end_idx]:
+                digest.merge(entry)
+        return digest
+
+    @staticmethod
+    def range_moments(series, start_idx, end_idx):
+        # type: (dict, int, int) -> (int, float, float)
+        """
+        Chan's parallel combination of the entries' moments
+        :param series:
+        :param start_idx: index of the first entry
+        :param end_idx: index after the last entry
+        :return: tuple (count, mean, sum of squared deviations from the mean) of all values of the entries
+        """
+        count, mean, m2 = 0, 0.0, 0.0
+        for i in range(start_idx, end_idx):
+            other_count = series["count"][i]
+            other_mean = series["sum"][i] / other_count
+            total = count + other_count
+            delta = other_mean - mean
+            m2 += series["m2"][i] + delta * delta * count * other_count / total
+            mean += delta * other_count / total
+            count = total
+        return count, mean, m2
+
+    def get_chunk(self, i):
+        # type: (int) -> [float]
+        """
+        :param i: index of a minute
+        :return: raw values of the minute
+        """
+        if self.minute_nodes is not None:
+            return self.minute_nodes[i].children
+        return self.source.values[self.source.offsets[i]:self.source.offsets[i + 1]]
+
+    def get_digests(self, level):
+        # type: (int) -> [TDigest]
+        """
+        Builds the digests of the hours from the raw values and those of the days from the hour digests, once
+        :param level: 60 or 1440
+        :return: list of TDigest per entry of the series
+        """
+        if level not in self.digests:
+            finer = 1 if level == 60 else 60
+            finer_keys = self.series[finer]["keys"]
+            digests = []
+            i = 0
+            for key in self.series[level]["keys"]:
+                j = bisect_left(finer_keys, key + level, i)
+                digest = TDigest()
+                for k in range(i, j):
+                    if finer == 1:
+                        digest.add(value for value in self.get_chunk(k) if value - value == 0)
+                    else:
+                        digest.merge(self.get_digests(finer)[k])
+                digest.compress()
+                digests.append(digest)
+                i = j
+            self.digests[level] = digests
+        return self.digests[level]
+
+    def downsample(self, start_time, end_time, points, method="lttb"):
+        # type: (datetime, datetime, int, str) -> [*(datetime, *float)]
+        """
+        Reduces the values between start and end time to at most the given number of points for plotting. Ranges
+        holding enough minutes are answered from the series (day, hour or minute means for "lttb", min/ max of
+        pixels of whole minutes for "minmax"), only short ranges read the raw values, which are spread evenly over their
+        minute. Pixels start at the first minute of the range, nothing outside of the range is taken into account
+        :param start_time:
+        :param end_time:
+        :param points: maximal number of returned points (at least 3)
+        :param method: "lttb" (Largest-Triangle-Three-Buckets) or "minmax" (min/ max envelope of points pixels)
+        :return: list of tuples -> (datetime, float: value) for "lttb", (datetime: pixel start, (float, float): min and
+                 max) for "minmax"
+        """
+        if method not in DOWNSAMPLE_METHODS:
+            raise AssertionError("Invalid downsampling method: '%s', choose one of %s" % (method,
+                                                                                        ", ".join(DOWNSAMPLE_METHODS)))
+        if points < 3:
+            raise AssertionError("At least 3 points are needed for downsampling")
+        keys = self.series[1]["keys"]
+        start_idx = bisect_left(keys, datetime_to_minute(start_time))
+        end_idx = bisect_right(keys, datetime_to_minute(end_time))
+        if start_idx >= end_idx:
+            return []
+        first, last = keys[start_idx], keys[end_idx - 1]
+        if method == "minmax":
+            if last - first + 1 >= points:  # pixels of whole minutes, at most points of them cover the range
+                return list(self.iter_pixels(start_idx, end_idx, -(-(last - first + 1) // points)))
+            width = (last - first + 1) * 60.0 / points
+            return [(EPOCH + datetime.timedelta(seconds=first * 60 + pixel * width), (low, high)) for pixel, low, high
+                    in envelope(self.iter_points(start_idx, end_idx), first * 60, width, points)]
+        for level in (1440, 60, 1):
+            series = self.series[level]
+            i = bisect_left(series["keys"], first)  # entries lying completely within the range
+            j = bisect_right(series["keys"], last - level + 1)
+            if j - i >= points or level == 1 and series["count_prefix"][j] - series["count_prefix"][i] <= j - i:
+                selected = lttb(lambda: self.iter_level_points(level, i, j, start_idx, end_idx), first * 60,
+                                last * 60, points)
+                break
+        else:  # fewer minutes than points, the raw values are selected
+            selected = lttb(lambda: self.iter_points(start_idx, end_idx), first * 60, last * 60 + 60, points)
+        return [(EPOCH + datetime.timedelta(seconds=x), y) for x, y in selected]
+
+    def iter_pixels(self, start_idx, end_idx, width):
+        # type: (int, int, int) -> iter
+        """
+        :param start_idx: index of the first minute
+        :param end_idx: index after the last minute
+        :param width: pixel width in minutes, the first pixel starts at the first minute
+        :return: iterator of tuples -> (datetime: pixel start, (float, float): min and max) of the pixels holding
+                 minutes
+        """
+        series = self.series[1]
+        keys = series["keys"]
+        i = start_idx
+        while i < end_idx:
+            pixel = keys[start_idx] + (keys[i] - keys[start_idx]) // width * width
+            j = bisect_left(keys, pixel + width, i, end_idx)
+            yield minute_to_datetime(pixel), (self.range_extreme(series["min_pyramid"], i, j, "min"),
+                                              self.range_extreme(series["max_pyramid"], i, j, "max"))
+            i = j
+
+    def iter_level_points(self, level, i, j, start_idx, end_idx):
+        # type: (int, int, int, int, int) -> iter
+        """
+        :param level: width of the series (1, 60 or 1440)
+        :param i: index of the series' first entry lying completely within the minutes
+        :param j: index after its last one (i < j)
+        :param start_idx: index of the first minute
+        :param end_idx: index after the last minute
+        :return: iterator of the entries' means as (seconds since the epoch, value) points, the minutes before the
+                 first and after the last entry are averaged into a point each
+        """
+        minutes, series = self.series[1], self.series[level]
+        head = bisect_left(minutes["keys"], series["keys"][i], start_idx, end_idx)
+        if head > start_idx:
+            yield minutes["keys"][start_idx] * 60, self.range_mean(minutes, start_idx, head)
+        for k in range(i, j):
+            yield series["keys"][k] * 60, series["mean"][k]
+        tail = bisect_left(minutes["keys"], series["keys"][j - 1] + level, head, end_idx)
+        if tail < end_idx:
+            yield minutes["keys"][tail] * 60, self.range_mean(minutes, tail, end_idx)
+
+    def iter_points(self, start_idx, end_idx):
+        # type: (int, int) -> iter
+        """
+        :param start_idx: index of the first minute
+        :param end_idx: index after the last minute
+        :return: iterator of the raw values as (seconds since the epoch, value) points, the values of a minute being
+                 spread evenly over it
+        """
+        keys = self.series[1]["keys"]
+        for i in range(start_idx, end_idx):
+            chunk = self.get_chunk(i)
+            step = 60.0 / len(chunk)
+            x = keys[i] * 60
+            for k, value in enumerate(chunk):
+                yield x + k * step, value
@@ -0,0 +1,88 @@
+#Binary on-disk store for parsed containers
+from DataAggregator import *
+import json
+import mmap
+import struct
+import sys
+
+"""
+Columnar binary file format replacing pickled object trees:
+
+    magic (8 bytes) | header length (uint64) | json header | padding to 8 bytes | arrays
+
+For every column the arrays are the int64 epoch minute keys, the int64 value offsets (one more than keys), the float64
+values and the per-day summary of ColumnContainer.summarize_days. The header holds type, offset and length of every
+array, so a loaded store consists of memory-mapped views that are only read when they are queried.
+"""
+
+MAGIC = b"DPSTORE1"
+ALIGNMENT = 8
+
+
+def save_store(container, file_path):
+    # type: (dict, str) -> None
+    """
+    Writes a container dictionary (tree or columnar containers) to a store file
+    :param container: dictionary column name -> MainContainer/ ColumnContainer
+    :param file_path:
+    :return:
+    """
+    blocks = []  # arrays in file order
+    columns = {}
+    position = 0
+    for name, objct in container.items():
+        if objct.name == "stream":
+            raise AssertionError("Streaming containers only hold aggregates and cannot be stored")
+        if objct.name != "column":
+            objct = ColumnContainer.from_tree(objct)
+        arrays = {"keys": objct.keys, "offsets": objct.offsets, "values": objct.values}
+        for field, day_array in objct.summarize_days().items():
+            arrays["day_" + field] = day_array
+        layout = {}
+        for field, data in arrays.items():
+            layout[field] = [data.typecode if isinstance(data, array) else data.format, position, len(data)]
+            position += len(data) * data.itemsize
+            blocks.append(data)
+        columns[name] = {"type": objct.type, "sensor": objct.sensor, "id": objct.id, "arrays": layout}
+
+    header = json.dumps({"byteorder": sys.byteorder, "columns": columns}).encode("utf-8")
+    with open(file_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<Q", len(header)))
+        file.write(header)
+        file.write(b"\0" * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT))
+        for data in blocks:
+            file.write(data)
+
+
+def load_store(file_path):
+    # type: (str) -> dict
+    """
+    Memory-maps a store file, the returned containers read their arrays lazily from the mapping (they are read-only)
+    :param file_path:
+    :return: dictionary column name -> ColumnContainer
+    """
+    with open(file_path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a store file: '%s'" % file_path)
+    header_length = struct.unpack_from("<Q", mapped, len(MAGIC))[0]
+    header_end = len(MAGIC) + 8 + header_length
+    header = json.loads(mapped[len(MAGIC) + 8:header_end].decode("utf-8"))
+    data_start = header_end + (-header_end % ALIGNMENT)
+    view = memoryview(mapped)
+
+    container = {}
+    for name, column in header["columns"].items():
+        arrays = {}
+        for field, (typecode, offset, length) in column["arrays"].items():
+            data = view[data_start + offset:data_start + offset + length * 8].cast(typecode)
+            if header["byteorder"] != sys.byteorder:  # foreign byte order, copy and swap
+                data = array(typecode, data.tobytes())
+                data.byteswap()
+            arrays[field] = data
+        objct = ColumnContainer(_type=column["type"], sensor=column["sensor"], _id=column["id"])
+        objct.keys, objct.offsets, objct.values = arrays["keys"], arrays["offsets"], arrays["values"]
+        objct.days = {field[4:]: data for field, data in arrays.items() if field.startswith("day_")}
+        container[name] = objct
+    return container
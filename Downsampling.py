@@ -0,0 +1,106 @@
+#Reduction of a time series to a few representative points for plotting
+import math
+
+"""
+Largest-Triangle-Three-Buckets keeps the shape of a series: the time range is split into equally wide buckets and from
+every bucket the point forming the largest triangle with the point chosen from the previous bucket and the average of
+the next bucket is taken. Min-max envelopes keep the extremes instead: the time range is split into pixels and the
+minimum and maximum of every pixel are taken, so no spike is lost. Both work on iterators of (x, y) points and only
+hold the selected points, the points themselves are generated again for every pass
+"""
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def lttb(points, start, stop, threshold):
+    # type: (callable, float, float, int) -> [*(float, float)]
+    """
+    The buckets span equal ranges of x rather than equal numbers of points, so dense and sparse parts of a series are
+    treated alike. Two passes: the averages of the buckets first, then the selection
+    :param points: function returning a new iterator of the (x, y) points sorted by x, non-finite y are left out
+    :param start: x of the first point
+    :param stop: x of the last point
+    :param threshold: number of points to be selected (at least 3)
+    :return: list of the selected (x, y) points, all points if there are not more than threshold
+    """
+    buckets = threshold - 2  # the first and the last point are always taken
+    width = (stop - start) / buckets or 1.0
+    sums_x, sums_y, counts = [0.0] * buckets, [0.0] * buckets, [0] * buckets
+    first, last, count = None, None, 0
+    for x, y in points():
+        if y - y != 0:
+            continue
+        count += 1
+        if first is None:
+            first = (x, y)
+            continue
+        last = (x, y)
+        k = max(0, min(int((x - start) / width), buckets - 1))
+        sums_x[k] += x
+        sums_y[k] += y
+        counts[k] += 1
+    if count <= threshold:
+        return [point for point in points() if point[1] - point[1] == 0]
+    k = max(0, min(int((last[0] - start) / width), buckets - 1))
+    sums_x[k] -= last[0]
+    sums_y[k] -= last[1]
+    counts[k] -= 1
+    following = [last] * buckets  # average of the next bucket holding points, the last point for the last one
+    average = last
+    for k in range(buckets - 1, -1, -1):
+        following[k] = average
+        if counts[k]:
+            average = (sums_x[k] / counts[k], sums_y[k] / counts[k])
+    selected = [first]
+    current, best, best_area = None, None, -1.0
+    n = 0
+    for x, y in points():
+        if y - y != 0:
+            continue
+        n += 1
+        if n == 1:
+            continue
+        if n == count:
+            break
+        k = max(0, min(int((x - start) / width), buckets - 1))
+        if k != current:
+            if best is not None:
+                selected.append(best)
+            current, best, best_area = k, None, -1.0
+        ax, ay = selected[-1]
+        cx, cy = following[k]
+        area = abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+        if area > best_area:
+            best, best_area = (x, y), area
+    if best is not None:
+        selected.append(best)
+    selected.append(last)
+    return selected
+
+
+def envelope(points, start, width, pixels):
+    # type: (iter, float, float, int) -> [*(int, float, float)]
+    """
+    :param points: iterator of (x, y) points sorted by x, non-finite y are left out
+    :param start: x the first pixel starts at
+    :param width: width of a pixel
+    :param pixels: number of pixels
+    :return: list of (pixel index, min, max) tuples of the pixels containing points
+    """
+    result = []
+    current, low, high = None, math.inf, -math.inf
+    for x, y in points:
+        if y - y != 0:
+            continue
+        pixel = min(int((x - start) / width), pixels - 1)
+        if pixel != current:
+            if current is not None:
+                result.append((current, low, high))
+            current, low, high = pixel, y, y
+        elif y < low:
+            low = y
+        elif y > high:
+            high = y
+    if current is not None:
+        result.append((current, low, high))
+    return result
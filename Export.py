@@ -0,0 +1,79 @@
+#Binary export of extracted columns as NumPy (npz) or Arrow IPC/ Feather files
+import sys
+try:
+    import numpy
+except ImportError:  # only needed by the binary output formats
+    numpy = None
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+"""
+The rows of a column are handed over as typed buffers instead of text: the timestamps as datetime64[s] (int64) and the
+values as float64 arrays, one per value type. The arrays are built from the array.array buffers of the containers
+without creating a Python object per value, raw values of a ColumnContainer are even shared without copying
+"""
+
+BINARY_FORMATS = ("npz", "arrow", "feather")
+DATE_COLUMN = "Date"
+
+
+def check_binary_format(output_format):
+    # type: (str) -> None
+    """
+    Raises an ImportError if the package needed by the format is not installed
+    :param output_format: "npz", "arrow" or "feather"
+    :return:
+    """
+    if numpy is None:
+        raise ImportError("numpy is needed for the %s output format (pip install numpy)" % output_format)
+    if output_format != "npz" and pyarrow is None:
+        raise ImportError("pyarrow is needed for the %s output format (pip install pyarrow)" % output_format)
+
+
+def minute_array(keys):
+    # type: (array) -> numpy.ndarray
+    """
+    :param keys: epoch minutes (array of typecode "q" or a numpy int64 array)
+    :return: datetime64[s] array of the minutes
+    """
+    return (numpy.asarray(keys, dtype=numpy.int64) * 60).view("datetime64[s]")
+
+
+def value_array(values):
+    # type: (array) -> numpy.ndarray
+    """
+    :param values: array.array of typecode "d" (or a memoryview of doubles)
+    :return: float64 array sharing the buffer of values
+    """
+    return numpy.frombuffer(values, dtype=numpy.float64)
+
+
+def write_binary(output_file, columns, output_format="npz"):
+    # type: (str, dict, str) -> int
+    """
+    :param output_file: filename or path including filename ("-" = stdout)
+    :param columns: ordered dictionary of column name -> numpy array, all of the same length
+    :param output_format: "npz" (numpy.savez), "arrow" (Arrow IPC file) or "feather" (Feather v2, compressed)
+    :return: number of written rows
+    """
+    check_binary_format(output_format)
+    sink = sys.stdout.buffer if output_file == "-" else output_file
+    if output_format == "npz" and sink is output_file:  # numpy.savez appends ".npz" to other filenames
+        with open(output_file, "wb") as file:
+            numpy.savez(file, **columns)
+    elif output_format == "npz":
+        numpy.savez(sink, **columns)
+    else:
+        table = pyarrow.table(columns)
+        if output_format == "feather":
+            pyarrow.feather.write_feather(table, sink)
+        else:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    if sink is not output_file:
+        sink.flush()
+    return len(next(iter(columns.values()))) if columns else 0
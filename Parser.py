@@ -1,12 +1,45 @@
 from DataAggregator import *
+from DataStore import load_store, save_store
+from Profiling import ProfileStats, peak_memory
+from Compression import WRITE_BUFFER_SIZE, detect_compression, open_input, open_output
+from Quarantine import BadValueLog
+from Sorting import reorder_lines, sort_lines
+from Export import BINARY_FORMATS, DATE_COLUMN, check_binary_format, minute_array, value_array, write_binary
 import re
 import datetime
-from itertools import cycle
-import pickle
+import json
+import sys
+import os
+import copy
+import locale
+import mmap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from functools import partial
+from itertools import islice, chain
+from array import array
+try:
+    import numpy
+except ImportError:  # the bulk conversion falls back to float() per field
+    numpy = None
 
+PM_PATTERN = re.compile(r'pm|PM')
+AM_PATTERN = re.compile(r'am|AM')
+CHUNKS_PER_WORKER = 4  # more chunks than workers balance the load of unevenly dense parts of a file
+MIN_CHUNK_SIZE = 1 << 20
+BULK_LINES = 4096  # lines converted at once by LineParser.parse_lines
+# numbers in messy fields, a sign is only taken if it does not follow a digit or letter ("10-20" are two values)
+NUMBER_PATTERN = re.compile(r'(?:(?<![0-9A-Za-z.,])[-+])?(?:[0-9]+(?:[.,][0-9]*)?|[.,][0-9]+)(?:[eE][-+]?[0-9]+)?')
+# methods of LineParser instances wrapped by LineParser.profile
+PROFILED_METHODS = ("parse_line", "parse_lines", "extract_timestamp", "extract_values", "convert_fields",
+                    "insert_value")
+# how buckets without values are filled in aggregated output, see FileWriter.fill_gaps ("none" leaves them out)
+FILL_METHODS = ("none", "na", "ffill", "linear")
+# value types known for buckets without values, filled gaps get 0 instead of a filled value
+EMPTY_BUCKET_TYPES = ("count", "sum")
 
 # TODO add support for non-numeric values
-# TODO enable "NA" encoding and/ or interpolation for missing time frames
 
 
 class LineParser(object):
@@ -15,18 +48,27 @@ class LineParser(object):
         numerical values in a tree structure. At moment values are always stored in minute resolution
     """
     def __init__(self, container_object, columns, timestamp_column=-1, sensor="", sep=",", hour_format="auto",
-                 date_format="auto"):
-        # type: (dict, int, int, str, str, str, str) -> None
+                 date_format="auto", storage="tree", resolution="minute", on_bucket=None, bad_values="skip",
+                 quarantine=None, value_type="mean"):
+        # type: (dict, int, int, str, str, str, str, str, str, callable, str, str, str) -> None
         """
         Constructor
         :param container_object: (a reference to a dictionary given by a FileParser instance)
         :param timestamp_column: the column of the line after splitting, where the timestamp can be found (-1 = auto)
         :param sensor: name of the used sensor e.g. "ECG" (optional)
         :param sep: separator for csv like file that defines the individual fields (default: ",")
-        :param columns: list of column indices defining which fields to parse (default: all)
+        :param columns: column name or list of column names/ indices defining which fields to parse (default: all)
         :param hour_format: predefines the hour-format (12/24) used throughout the file (default: "auto")
         :param date_format: predefines the date-format (D/M/Y or Y/M/D) used throughout the file (default: "auto") if
                             american date format is used user must indicate it by giving the parameter ("US")
+        :param storage: container backend, "tree" (Day/Hour/Minute nodes), "columnar" (ColumnContainer arrays) or
+                        "stream" (StreamingContainer, raw values are discarded after aggregation)
+        :param resolution: bucket resolution of the "stream" backend ("day", "hour", "minute", "week", "15min", ...)
+        :param on_bucket: optional function called as on_bucket(col_name, date, stats) when a "stream" bucket closes
+        :param bad_values: policy for fields without a numerical value, "skip", "na" (stored as nan) or "fail"
+        :param quarantine: optional path of a csv file the lines containing such fields are written to
+        :param value_type: value type(s) the "stream" backend has to answer (see split_value_types), its buckets only
+                           keep summaries if types other than "mean", "min" and "max" are asked for
         """
         self._sep = sep
         self._columns = columns
@@ -35,10 +77,38 @@ class LineParser(object):
         self._is_initialized = False
         self._date_pattern = None
         self._time_pattern = None
+        self._date_regex = None
+        self._time_regex = None
+        self._layout = None
+        self._minute_key = None  # minute defining part of the previous line's timestamp field
+        self._minute_timestamp = None
+        self._leaf_timestamp = None
+        self._appenders = {}  # column index -> add function of the leaf holding the values of _leaf_timestamp
+        self._sort_key = None  # minute key and epoch minute of the previous line passed to line_minute
+        self._sort_minute = None
+        self._is_unordered = False  # whether warn_unordered has been called
         self._col_names = []
         self.container = container_object
         self._sensor = sensor
         self._time_stamp_column = timestamp_column
+        self._storage = storage
+        self._resolution = resolution
+        self._on_bucket = on_bucket
+        self._value_type = value_type
+        self.bad_value_log = BadValueLog(bad_values, quarantine)
+        self.stats = None  # ProfileStats collecting counters/ timings of the hot paths when profiling is enabled
+
+    def __getstate__(self):
+        # type: (None) -> dict
+        """
+        Copies and pickles (forks for worker processes) are never profiled, the wrappers of profile are dropped
+        :return:
+        """
+        state = dict(self.__dict__)
+        for method_name in PROFILED_METHODS:
+            state.pop(method_name, None)
+        state["stats"] = None
+        return state
 
     def __str__(self):
         # type: (None) -> str
@@ -140,10 +210,136 @@ class LineParser(object):
         if self._time_stamp_column == -1:
             self.auto_detect_timestamp_column(line)
 
-        for name in self._col_names:
-            self.container[name] = MainContainer(sensor=self._sensor, _type=name)
+        self._date_regex = re.compile(self._date_pattern)
+        self._time_regex = re.compile(self._time_pattern)
+        self.compile_layout(line.split(self._sep)[self._time_stamp_column])
+
+        if self._columns is None:  # default: every field but the timestamp
+            self._columns = [i for i in range(len(self._col_names)) if i != self._time_stamp_column]
+
+        self.create_containers()
         self._is_initialized = True
 
+    def create_containers(self):
+        # type: (None) -> None
+        """
+        Adds an empty container of the selected backend for every column to the container dictionary
+        :return:
+        """
+        for name in self._col_names:
+            if self._storage == "columnar":
+                self.container[name] = ColumnContainer(sensor=self._sensor, _type=name)
+            elif self._storage == "stream":
+                callback = partial(self._on_bucket, name) if self._on_bucket is not None else None
+                summaries = any(value_type not in NESTED_TYPES for value_type in split_value_types(self._value_type))
+                self.container[name] = StreamingContainer(self._resolution, sensor=self._sensor, _type=name,
+                                                          callback=callback, summaries=summaries)
+            else:
+                self.container[name] = MainContainer(sensor=self._sensor, _type=name)
+
+    def fork(self):
+        # type: (None) -> LineParser
+        """
+        Creates a parser sharing the detected header, separator and timestamp format of this (initialized) parser but
+        writing into its own, empty container dictionary
+        :return: new LineParser instance
+        """
+        line_parser = copy.copy(self)
+        line_parser.container = {}
+        line_parser._minute_key = None
+        line_parser._minute_timestamp = None
+        line_parser._leaf_timestamp = None
+        line_parser._appenders = {}
+        line_parser.bad_value_log = self.bad_value_log.fork()
+        line_parser.create_containers()
+        return line_parser
+
+    def profile(self, stats):
+        # type: (ProfileStats) -> None
+        """
+        Wraps the hot path methods of this instance, collecting the number of values as well as calls
+        (lines for parse_line, batches for parse_lines) and time per stage in stats. insert_value is only called for the first value of a column per minute, so its time
+        mostly consists of creating nodes. The bulk conversion of parse_lines (convert_fields) is timed as extract_values
+        as well, one call per column and batch
+        :param stats:
+        :return:
+        """
+        self.stats = stats
+        stats.instrument(self, "parse_line")  # calls = lines
+        stats.instrument(self, "parse_lines", argument_counter="bulk_lines")
+        stats.instrument(self, "extract_timestamp")
+        stats.instrument(self, "extract_values", result_counter="values")
+        stats.instrument(self, "convert_fields", stage="extract_values")
+        stats.instrument(self, "insert_value")
+
+    def close(self):
+        # type: (None) -> None
+        """
+        Is called at the end of a file, closes the open buckets of streaming containers
+        :return:
+        """
+        for container in self.container.values():
+            if container.name == "stream":
+                container.close()
+
+    def compile_layout(self, field):
+        # type: (str) -> None
+        """
+        Records where year, month, day, hour, minute (and am/pm) are located in the given timestamp field, so following
+        timestamps with the same fixed-width layout can be sliced instead of searched by regex
+        :param field: timestamp field of the first line
+        :return:
+        """
+        date_match = self._date_regex.search(field)
+        time_match = self._time_regex.search(field)
+        if date_match is None or time_match is None:
+            self._layout = None
+            return
+        if self._date_format == "day":
+            day, month, year = date_match.span(1), date_match.span(2), date_match.span(3)
+        elif self._date_format == "year":
+            day, month, year = date_match.span(3), date_match.span(2), date_match.span(1)
+        else:
+            day, month, year = date_match.span(2), date_match.span(1), date_match.span(3)
+        hour, minute = time_match.span(1), time_match.span(2)
+        marker = slice(*time_match.span(3)) if self._time_format == 12 else None
+        end = max(year[1], month[1], day[1], minute[1])
+        # position of the last digit is included, so shorter fields fail the separator check
+        checked = [i for i in range(end) if not field[i].isdigit()] + [end - 1]
+        self._layout = (itemgetter(*checked), itemgetter(*checked)(field)[:-1],
+                        itemgetter(*[slice(*span) for span in (year, month, day, hour, minute)]), marker, end)
+
+    def matches_layout(self, field):
+        # type: (str) -> bool
+        """
+        :param field: timestamp field
+        :return: whether the field has the fixed-width layout recorded by compile_layout
+        """
+        layout = self._layout
+        if layout is None:
+            return False
+        try:
+            if layout[0](field)[:-1] != layout[1]:
+                return False
+        except IndexError:
+            return False
+        return layout[3] is None or field[layout[3]] in ("am", "AM", "pm", "PM")
+
+    def get_minute_key(self, field):
+        # type: (str) -> str
+        """
+        Returns the part of a fixed-layout timestamp field that defines its minute (prefix up to the minute digits plus
+        the am/pm marker), lines sharing the key belong to the same minute
+        :param field: timestamp field
+        :return: key or None if no layout has been recorded
+        """
+        layout = self._layout
+        if layout is None:
+            return None
+        if layout[3] is None:
+            return field[:layout[4]]
+        return field[:layout[4]] + field[layout[3]]
+
     def parse_header(self, line):
         # type: (str) -> None
         """
@@ -154,25 +350,41 @@ class LineParser(object):
         for i in range(len(col_names)):
             col_names[i] = col_names[i].strip()
         self._col_names = col_names
+        self.bad_value_log.header = line
         self.set_col_index()
 
     def set_col_index(self):
-        # TODO: add support for lists of names
         # type: (None) -> [int]
         """
-        gets column index based on col name if it is defined and not a list
+        Converts the column name (or list of column names/ indices) to be extracted into a list of column indices
         :return:
         """
-        if self._columns is not None and not isinstance(self._columns, list):
-            for i in range(len(self._col_names)):
-                if self._col_names[i] == self._columns:
-                    self._columns = i
-                    break
+        if self._columns is None:
+            return self._columns
+        columns = self._columns if isinstance(self._columns, list) else [self._columns]
+        indices = []
+        for column in columns:
+            if isinstance(column, int):
+                indices.append(column)
+            elif column in self._col_names:
+                indices.append(self._col_names.index(column))
+            else:
+                raise ValueError("Column not found in header: '%s'" % column)
+        self._columns = indices
+        return indices
+
+    def get_column_names(self):
+        # type: (None) -> [str]
+        """
+        :return: names of the columns that are extracted (available after the first line has been parsed)
+        """
+        return [self._col_names[i] for i in self._columns]
 
     def parse_line(self, line):
-        # TODO: support for list of col names
         # type: (str) -> None
         """
+        Extracts the timestamp of the line once and adds the values of all selected columns. Lines whose timestamp
+        shares the minute key of the previous line reuse its timestamp without parsing it again
         :param line:
         :return:
         """
@@ -180,85 +392,266 @@ class LineParser(object):
 
         if not self._is_initialized:
             self.initialize(line)
-        if self._columns is None:
-            n_cols = len(chunks)
-            for col in range(n_cols):
-                if col != self._time_stamp_column:
-                    self.parse_value(chunks, col)
-        #else:
-        #    for col in range(self._columns):
-        #        self.parse_value(chunks, self._time_stamp_column, col)
+        field = chunks[self._time_stamp_column]
+        key = self.get_minute_key(field)
+        if key is not None and key == self._minute_key:
+            timestamp = self._minute_timestamp
         else:
-            self.parse_value(chunks, self._columns)
+            timestamp = self.extract_timestamp(field)
+            if self._minute_timestamp is not None and timestamp < self._minute_timestamp:
+                self.warn_unordered(line)
+            self._minute_key = key if self.matches_layout(field) else None
+            self._minute_timestamp = timestamp
+        for column in self._columns:
+            self.parse_value(chunks, column, timestamp)
+
+    def parse_lines(self, lines):
+        # type: ([str]) -> None
+        """
+        Bulk version of parse_line: the timestamps of all lines are extracted first, then the fields of every column are
+        converted at once (by NumPy if installed) and added per minute instead of per value. A column whose fields
+        cannot all be converted directly is parsed field by field by extract_values, like in parse_line
+        :param lines: consecutive lines of the file
+        :return:
+        """
+        if not lines:
+            return
+        if not self._is_initialized:
+            self.initialize(lines[0])
+        self.bad_value_log.forget()
+        rows = [line.split(self._sep) for line in lines]
+        timestamps = []  # timestamp of every run of lines sharing a minute
+        starts = []  # index of the first line of every run
+        key, timestamp = self._minute_key, self._minute_timestamp
+        for i, chunks in enumerate(rows):
+            field = chunks[self._time_stamp_column]
+            minute_key = self.get_minute_key(field)
+            if minute_key is None or minute_key != key:
+                previous, timestamp = timestamp, self.extract_timestamp(field)
+                if previous is not None and timestamp < previous:
+                    self.warn_unordered(lines[i])
+                key = minute_key if self.matches_layout(field) else None
+            if not timestamps or timestamp != timestamps[-1]:
+                timestamps.append(timestamp)
+                starts.append(i)
+        self._minute_key, self._minute_timestamp = key, timestamp
+        runs = list(zip(timestamps, starts, starts[1:] + [len(rows)]))
+        for column in self._columns:
+            fields = [chunks[column] for chunks in rows]
+            values = self.convert_fields(fields)
+            if values is not None:
+                if self.stats is not None:
+                    self.stats.count("values", len(values))
+                for timestamp, start, end in runs:
+                    self.add_value(column, timestamp, values[start:end])
+                continue
+            for timestamp, start, end in runs:
+                for i in range(start, end):
+                    self.parse_value(rows[i], column, timestamp)
+
+    @staticmethod
+    def convert_fields(fields):
+        # type: ([str]) -> [float]
+        """
+        Converts a whole column of fields in one call (NumPy if installed, else float() per field)
+        :param fields:
+        :return: list of floats, None if any field is not a plain finite number
+        """
+        if numpy is not None:
+            try:
+                values = numpy.array(fields, dtype=numpy.float64)
+            except (ValueError, TypeError, OverflowError):
+                return None
+            if not numpy.isfinite(values).all():
+                return None
+            return values.tolist()
+        try:
+            values = list(map(float, fields))
+        except ValueError:
+            return None
+        total = sum(values)
+        if total - total != 0:  # nan or inf ("nan" fields are no measurements, see extract_values)
+            return None
+        return values
 
-    def parse_value(self, line, column):
-        # type: ([str], int) -> None
+    def parse_value(self, line, column, timestamp=None):
+        # type: ([str], int, datetime) -> None
         """
-        Parses one field of the csv file and adds it at the correct position in the container object
+        Parses one field of the csv file and adds it at the correct position in the container object, fields without a
+        numerical value are handled by bad_value
         :param line: actual csv line
-        :param self._time_stamp_column:
         :param column: column index of the value to be extracted
+        :param timestamp: already extracted timestamp of the line (extracted from the line if not given)
         :return:
         """
-        timestamp = self.extract_timestamp(line[self._time_stamp_column])
+        if timestamp is None:
+            timestamp = self.extract_timestamp(line[self._time_stamp_column])
         try:
             value = self.extract_values(line[column])
-        except:
-            print("Could not be converted to numerical value (float): '" + line[column] +
-                  "' Value has been coded as 'NA'")
-            value = "NA"
+        except ValueError:
+            value = []
+        if not value:
+            value = self.bad_value(line, column)
+            if value is None:
+                return
 
         #insert value based on its date and column_name
-        self.insert_value(self.container[self._col_names[column]], timestamp, value)
+        self.add_value(column, timestamp, value)
+
+    def bad_value(self, line, column):
+        # type: ([str], int) -> [float]
+        """
+        Records a field without a numerical value in the bad value log and applies the bad value policy
+        :param line: actual csv line
+        :param column: column index of the field
+        :return: [nan] for the "na" policy, None if the field is skipped
+        """
+        log = self.bad_value_log
+        log.add(self._col_names[column], line, self._sep)
+        if log.policy == "fail":
+            raise ValueError("No numerical value in column '%s': '%s'" % (self._col_names[column],
+                                                                          self._sep.join(line).rstrip("\r\n")))
+        return [float("nan")] if log.policy == "na" else None
+
+    def add_value(self, column, timestamp, value):
+        # type: (int, datetime, [float]) -> None
+        """
+        Adds the value to the leaf of its minute. The leaf of every column is remembered, so further values of the
+        same minute are appended directly instead of traversing the tree again
+        :param column: column index of the value
+        :param timestamp:
+        :param value:
+        :return:
+        """
+        if timestamp != self._leaf_timestamp:
+            self._leaf_timestamp = timestamp
+            self._appenders = {}
+        appender = self._appenders.get(column)
+        if appender is None:
+            leaf = self.insert_value(self.container[self._col_names[column]], timestamp, value)
+            if leaf is None:
+                return
+            if leaf.name == "column" or leaf.name == "stream":
+                self._appenders[column] = partial(leaf.add_value, datetime_to_minute(timestamp))
+            else:
+                self._appenders[column] = leaf.add_child
+        elif len(value) > 0:
+            appender(value)
 
     def extract_values(self, input_str):
         # type: (str) -> [float]
         """
-        Matches both integers and floating point numbers in the given string and return list of respecting floats
+        Converts a plain number directly, otherwise matches all (signed, decimal point or comma, exponent) numbers in
+        the given string and returns the list of respecting floats
         :param input_str:
         :return:
         """
-        values = []
-        match_iter = re.findall(r'([0-9]*[\.,]?[0-9]+)', input_str)
-        for match in match_iter:
-            values.append(float(match))
-        return values
+        try:
+            value = float(input_str)
+        except ValueError:
+            pass
+        else:
+            if value - value == 0:  # "nan" and "inf" are parsed by float() but are no measurements
+                return [value]
+        return [float(match.replace(",", ".")) for match in NUMBER_PATTERN.findall(input_str)]
 
     def insert_value(self, _object, timestamp, value):
         # type: (Container, datetime, [float]) -> None
         """
         Recursive method, traversing the tree, adding nodes/ leaves when necessary and inserting values at the
         correct position (each timestamp will be associated with one specific minute)
-        :param _object: Instance of class Day, Hour or Minute
+        :param _object: Instance of class Day, Hour or Minute (or a ColumnContainer)
         :param timestamp:
         :param value:
-        :return:
+        :return: the node the value has been added to (Minute or ColumnContainer), None if there was no value
         """
         if len(value) < 1:  # don't add if no value is present
-            return
+            return None
+        if _object.name == "column" or _object.name == "stream":  # Flat backends, no tree to traverse
+            _object.add_value(datetime_to_minute(timestamp), value)
+            return _object
         if _object.name == "minute":  # Base case
             _object.add_child(value)
-            return
+            return _object
         if len(_object.children) < 1:  # If not leaf node and no children, create child node and traverse it
             _object.add_child(timestamp )
-            self.insert_value(_object.children[-1], timestamp, value)
+            return self.insert_value(_object.children[-1], timestamp, value)
         else: # len(children) >= 1
             if _object.children[-1] == timestamp:  # enter last child node when no new time unit began
-                self.insert_value(_object.children[-1], timestamp, value)
+                return self.insert_value(_object.children[-1], timestamp, value)
             else: # new time unit began, thus create new node/ leaf
                 _object.add_child(timestamp)
-                self.insert_value(_object.children[-1], timestamp, value)
+                return self.insert_value(_object.children[-1], timestamp, value)
+
+    def warn_unordered(self, line):
+        # type: (str) -> None
+        """
+        Warns once that the file is not ordered chronologically, its values would end up in duplicate nodes
+        :param line: first line with an earlier timestamp than its predecessor
+        :return:
+        """
+        if not self._is_unordered:
+            self._is_unordered = True
+            print("The file is not ordered chronologically, use a reorder buffer or sort it (see FileReader): '%s'" %
+                  line.rstrip("\r\n"), file=sys.stderr)
+
+    def line_minute(self, line):
+        # type: (str) -> int
+        """
+        Sort key of a line, lines sharing the minute key of the previous one reuse its minute
+        :param line: csv line (the parser has to be initialized)
+        :return: epoch minute of the line's timestamp
+        """
+        field = line.split(self._sep)[self._time_stamp_column]
+        key = self.get_minute_key(field)
+        if key is None or key != self._sort_key:
+            self._sort_minute = datetime_to_minute(self.extract_timestamp(field))
+            self._sort_key = key if self.matches_layout(field) else None
+        return self._sort_minute
+
+    def line_timestamp(self, line):
+        # type: (str) -> datetime
+        """
+        :param line: csv line (the parser has to be initialized)
+        :return: timestamp of the line
+        """
+        return self.extract_timestamp(line.split(self._sep)[self._time_stamp_column])
 
-    """extracts timestamp, parameter = str (line containing date)
-       return = DateTime (timestamp)"""
     def extract_timestamp(self, line):
         # type: (str) -> datetime
         """
-        Converts the csv's timestamp field to a datetime object which is defined up to the minute resolution
+        Converts the csv's timestamp field to a datetime object which is defined up to the minute resolution. Fields
+        matching the fixed-width layout of the first timestamp are sliced directly, all others are searched by regex
+        :param line: timestamp string
+        :return: datetime object
+        """
+        layout = self._layout
+        try:
+            if layout is None or layout[0](line)[:-1] != layout[1]:
+                return self.search_timestamp(line)
+            year, month, day, hour, minute = map(int, layout[2](line))
+        except (IndexError, ValueError):  # shorter field or non-digits where digits are expected
+            return self.search_timestamp(line)
+        if layout[3] is not None:
+            marker = line[layout[3]]
+            if marker == "pm" or marker == "PM":
+                if hour != 12:
+                    hour += 12
+            elif marker == "am" or marker == "AM":
+                if hour == 12:
+                    hour = 0
+            else:
+                return self.search_timestamp(line)
+        return datetime.datetime(year, month, day, hour, minute)
+
+    def search_timestamp(self, line):
+        # type: (str) -> datetime
+        """
+        General (regex based) version of extract_timestamp, used when the field does not match the detected layout
         :param line: timestamp string
         :return: datetime object
         """
-        match = re.search(self._date_pattern, line)  # Extract date
+        match = self._date_regex.search(line)  # Extract date
         if self._date_format == "day":
             day = int(match.group(1))
             month = int(match.group(2))
@@ -273,15 +666,15 @@ class LineParser(object):
             year = int(match.group(3))
 
         #Extract time
-        match = re.search(self._time_pattern, line)
+        match = self._time_regex.search(line)
         hour = int(match.group(1))
         minute = int(match.group(2))
 
         if self._time_format == 12:
-            if re.search(r'pm|PM', line):
+            if hour != 12 and PM_PATTERN.search(line):
                 #If 12h format convert to 24h format
                 hour += 12
-            if hour == 12  and re.search(r'am|AM', line):
+            if hour == 12 and AM_PATTERN.search(line):
                 hour = 0  # Now I see why the 24h format is so much better...
 
         timestamp = datetime.datetime(year, month, day, hour, minute)
@@ -296,58 +689,459 @@ class FileReader(object):
     @staticmethod
     def warning():
         print("If you use US date format it's impossible to auto detect so manually indicate it as "
-              "date_format='US'")
+              "date_format='US'", file=sys.stderr)
 
     # TODO add col index of timestamp to constructor arguments
-    def __init__(self, file_path, timestamp_column=-1, sep=",", sensor="", columns=None, hour_format="auto", date_format="auto"):
-        # type: (str, str, str, [int], str, str) -> None
+    def __init__(self, file_path, timestamp_column=-1, sep=",", sensor="", columns=None, hour_format="auto", date_format="auto",
+                 storage="tree", resolution="minute", on_bucket=None, bad_values="skip", quarantine=None,
+                 reorder_lines=0, external_sort=False, temp_dir=None, value_type="mean"):
+        # type: (str, str, str, [int], str, str, str, str, callable, str, str, int, bool, str, str) -> None
         """
         Constructor
         :param file_path: absolute or relative file path
         :param timestamp_column: column index of the timestamp after splitting the csv by the separator (default: -1 = auto)
         :param sensor: name of the used sensor e.g. "ECG" (optional)
         :param sep: separator for csv like file that defines the individual fields (default: ",")
-        :param columns: list of column indices defining which fields to parse (default: all)
+        :param columns: column name or list of column names/ indices defining which fields to parse (default: all)
         :param hour_format: predefines the hour-format (12/24) used throughout the file (default: "auto")
         :param date_format: predefines the date-format (D/M/Y or Y/M/D) used throughout the file (default: "auto")
+        :param storage: container backend, "tree", "columnar" (much smaller memory footprint for large files) or
+                        "stream" (one-pass aggregation at the given resolution, raw values are not kept)
+        :param resolution: bucket resolution of the "stream" backend ("day", "hour", "minute", "week", "15min", ...)
+        :param on_bucket: optional function called as on_bucket(col_name, date, stats) when a "stream" bucket closes
+        :param bad_values: policy for fields without a numerical value, "skip" (default), "na" (stored as nan) or
+                           "fail" (raises a ValueError)
+        :param quarantine: optional path of a csv file the lines containing such fields are written to
+        :param reorder_lines: capacity of a reorder buffer ordering files whose lines are at most this many lines away
+                              from their chronological position (default: 0 = the file is ordered)
+        :param external_sort: whether the lines of a completely unsorted file are ordered by an external merge sort
+        :param temp_dir: directory of the temporary files of the external sort (default: system temporary directory)
+        :param value_type: value type(s) the "stream" backend has to answer, see LineParser (default: "mean")
         """
         FileReader.warning()
         self.file_path = file_path
+        self.reorder_lines = reorder_lines
+        self.external_sort = external_sort
+        self.temp_dir = temp_dir
+        self.offset = 0  # byte offset after the last line parsed by read_new_lines
         self.container = {}
+        self.stats = None  # ProfileStats, see profile
         self.line_parser = LineParser(self.container, columns, sensor=sensor, sep=sep, hour_format=hour_format,
-                                      date_format=date_format, timestamp_column=timestamp_column)
+                                      date_format=date_format, timestamp_column=timestamp_column, storage=storage,
+                                      resolution=resolution, on_bucket=on_bucket, bad_values=bad_values,
+                                      quarantine=quarantine, value_type=value_type)
 
     def __iadd__(self, other):
         self.file_path = other
         return self
 
-    def read_file(self):
-        # type: (None) -> None
+    def profile(self, stats=None):
+        # type: (ProfileStats) -> ProfileStats
+        """
+        Enables profiling: the hot paths of the line parser and the reading methods are timed from now on
+        :param stats: ProfileStats instance to be used (e.g. shared with a FileWriter), a new one by default
+        :return: the stats
+        """
+        self.stats = stats if stats is not None else ProfileStats()
+        self.line_parser.profile(self.stats)
+        self.stats.instrument(self, "read_file")
+        self.stats.instrument(self, "read_new_lines")
+        return self.stats
+
+    def update_stats(self):
+        # type: (None) -> ProfileStats
+        """
+        Sets the counters derived from the parsed data: lines, bad values and nodes (days, hours and minutes of trees,
+        minutes of columnar containers, buckets of streaming containers)
+        :return: the stats
+        """
+        nodes = 0
+        for container in self.container.values():
+            if container.name == "container":
+                for day in container.children:
+                    nodes += 1 + len(day.children) + sum(len(hour.children) for hour in day.children)
+            else:
+                nodes += len(container)
+        self.stats.counters["lines"] = self.stats.calls.get("parse_line", 0) + self.stats.counters.get("bulk_lines", 0)
+        self.stats.counters["nodes"] = nodes
+        self.stats.counters["bad_values"] = len(self.line_parser.bad_value_log)
+        return self.stats
+
+    def read_file(self, workers=1, start_time=None, end_time=None):
+        # type: (int, datetime, datetime) -> None
         """
         Opens file and parses it
+        :param workers: number of processes parsing the file in parallel (default: 1)
+        :param start_time: if given, lines before this minute are skipped without being parsed (requires a
+                           chronologically ordered file)
+        :param end_time: if given, lines after this minute are skipped without being parsed
         :return:
         """
-        with open(self.file_path) as file:
+        if self.reorder_lines > 0 or self.external_sort:
+            self.read_file_unsorted()
+            return
+        # compressed files are streamed through the decompressor, they cannot be split or seeked by byte offsets, thus
+        # they are parsed in one process and as a whole (the writer still only outputs the requested time range)
+        if (workers <= 1 and start_time is None and end_time is None) or detect_compression(self.file_path):
+            with open_input(self.file_path) as file:
+                self.line_parser.parse_header(next(file))
+                for lines in iter(lambda: list(islice(file, BULK_LINES)), []):
+                    self.line_parser.parse_lines(lines)
+            self.line_parser.close()
+            self.line_parser.bad_value_log.flush()
+            return
+
+        if workers > 1 and self.line_parser._storage == "stream":
+            raise AssertionError("Parallel parsing is not supported by the stream backend")
+        encoding = locale.getpreferredencoding(False)
+        with open(self.file_path, "rb") as file:
+            self.line_parser.parse_header(file.readline().decode(encoding))
+            data_start = file.tell()
+            first_line = file.readline().decode(encoding)
+            if not first_line:
+                return
+            self.line_parser.initialize(first_line)
+            start, end = data_start, os.fstat(file.fileno()).st_size
+            if start_time is not None or end_time is not None:
+                start, end = self.seek_time_range(file, data_start, start_time, end_time, encoding)
+            if workers > 1:
+                ranges = FileReader.split_file(file, start, end, workers * CHUNKS_PER_WORKER)
+
+        if workers > 1:
+            self.read_file_parallel(ranges, workers, encoding)
+        else:
+            FileReader.parse_chunk(self.line_parser, self.file_path, start, end, encoding)
+        self.line_parser.bad_value_log.flush()
+
+    def read_file_unsorted(self):
+        # type: (None) -> None
+        """
+        Parses a file that is not ordered chronologically in one process, its lines are ordered by the reorder buffer
+        or the external sort first. Time ranges cannot be seeked in such a file, it is always parsed as a whole
+        :return:
+        """
+        with open_input(self.file_path) as file:
             self.line_parser.parse_header(next(file))
-            for line in file:
-                self.line_parser.parse_line(line)
+            first_line = file.readline()
+            if not first_line:
+                return
+            self.line_parser.initialize(first_line)
+            lines = chain([first_line], file)
+            if self.external_sort:
+                lines = sort_lines(lines, self.line_parser.line_minute, temp_dir=self.temp_dir)
+            else:
+                lines = reorder_lines(lines, self.line_parser.line_minute, self.reorder_lines)
+            for batch in iter(lambda: list(islice(lines, BULK_LINES)), []):
+                self.line_parser.parse_lines(batch)
+        self.line_parser.close()
+        self.line_parser.bad_value_log.flush()
+
+    def read_new_lines(self):
+        # type: (None) -> datetime
+        """
+        Incremental reading of a growing file: parses only the complete lines appended since the previous call (the
+        first call parses the whole file) and remembers the byte offset of the next line. Cached aggregates of the
+        nodes the new values are appended to are invalidated. A file that got shorter is parsed again from scratch
+        :return: timestamp of the first new line (every bucket from its bucket on has changed), None if nothing new
+        """
+        if self.line_parser._storage == "stream":
+            raise AssertionError("Incremental reading is not supported by the stream backend")
+        if detect_compression(self.file_path):
+            raise AssertionError("Incremental reading is not supported for compressed files")
+        if self.reorder_lines > 0 or self.external_sort:
+            raise AssertionError("Incremental reading requires a chronologically ordered file")
+        encoding = locale.getpreferredencoding(False)
+        with open(self.file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < self.offset:  # truncated or replaced
+                log = self.line_parser.bad_value_log
+                self.line_parser = self.line_parser.fork()
+                self.line_parser.bad_value_log = BadValueLog(log.policy, log.quarantine)
+                self.container = self.line_parser.container
+                self.offset = 0
+                if self.stats is not None:
+                    self.line_parser.profile(self.stats)
+            if size == 0:
+                return None
+            if self.offset == 0:
+                header = file.readline()
+                if not header.endswith(b"\n"):  # header not completely written yet
+                    return None
+                self.line_parser.parse_header(header.decode(encoding))
+                self.offset = file.tell()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = mapped.rfind(b"\n", self.offset) + 1  # a partially written last line is left for later
+            if end <= self.offset:
+                return None
+            file.seek(self.offset)
+            first_line = file.readline().decode(encoding)
+            if not self.line_parser._is_initialized:
+                self.line_parser.initialize(first_line)
+            first_time = self.line_parser.line_timestamp(first_line)
+
+        for container in self.container.values():
+            if container.name == "container":
+                container.invalidate_last()
+        FileReader.parse_chunk(self.line_parser, self.file_path, self.offset, end, encoding)
+        self.line_parser.bad_value_log.flush()
+        self.offset = end
+        return first_time
+
+    def save_state(self, file_address, resolution="day"):
+        # type: (str, str) -> None
+        """
+        Saves what read_new_lines needs to continue in a later run as json: file path, byte offset of the next line,
+        header and first line (the formats are detected from them again, see load_state) and the raw values of the
+        open bucket, the bucket of the latest minute at the given resolution. Earlier buckets are final, their values
+        are left out, so the state stays small however much of the file has been read
+        :param file_address:
+        :param resolution: output resolution of the runs (any resolution accepted by resolution_width)
+        :return:
+        """
+        state = {"file_path": self.file_path, "offset": 0, "resolution": resolution, "columns": {}}
+        last_keys = [key for key in map(FileReader.last_minute, self.container.values()) if key is not None]
+        if self.line_parser._is_initialized:
+            encoding = locale.getpreferredencoding(False)
+            with open(self.file_path, "rb") as file:
+                state["header"] = file.readline().decode(encoding)
+                state["first_line"] = file.readline().decode(encoding)
+            state["offset"] = self.offset
+            state["quarantine_started"] = self.line_parser.bad_value_log.is_started
+        if last_keys:
+            last_key = max(last_keys)
+            start_time = minute_to_datetime(bucket_start(last_key, resolution_width(resolution)))
+            writer = FileWriter(self.container)
+            for name, container in self.container.items():
+                keys, offsets, values = [], [0], []
+                for date, chunk in writer.iter_raw_values(container, start_time, minute_to_datetime(last_key)):
+                    keys.append(datetime_to_minute(date))
+                    values.extend(chunk)
+                    offsets.append(len(values))
+                state["columns"][name] = {"keys": keys, "offsets": offsets, "values": values}
+        with open(file_address, "w") as file:
+            json.dump(state, file)
+
+    def load_state(self, file_address, resolution="day"):
+        # type: (str, str) -> bool
+        """
+        Restores a state saved by save_state, if it belongs to the same input file and the file has only grown since
+        (its header and first line are unchanged and it is not shorter). The parser is initialized with that header and
+        line and the values of the open bucket are inserted again
+        :param file_address:
+        :param resolution: output resolution of this run, its buckets have to lie within the ones of the saved state
+        :return: whether the state has been restored (otherwise the file is read from the beginning)
+        """
+        with open(file_address) as file:
+            state = json.load(file)
+        if state["file_path"] != self.file_path or state["offset"] == 0:
+            return False
+        if resolution_width(state["resolution"]) % resolution_width(resolution) != 0:
+            raise ValueError("The state has been saved for resolution '%s', it cannot be continued at '%s'" %
+                             (state["resolution"], resolution))
+        encoding = locale.getpreferredencoding(False)
+        with open(self.file_path, "rb") as file:
+            header = file.readline().decode(encoding)
+            first_line = file.readline().decode(encoding)
+            size = os.fstat(file.fileno()).st_size
+        if size < state["offset"] or header != state["header"] or first_line != state["first_line"]:
+            return False
+        self.line_parser.parse_header(header)
+        self.line_parser.initialize(first_line)
+        self.line_parser.bad_value_log.is_started = state["quarantine_started"]
+        for name, column in state["columns"].items():
+            offsets, values = column["offsets"], column["values"]
+            for i, key in enumerate(column["keys"]):
+                self.line_parser.insert_value(self.container[name], minute_to_datetime(key),
+                                              values[offsets[i]:offsets[i + 1]])
+        self.offset = state["offset"]
+        return True
+
+    @staticmethod
+    def last_minute(container):
+        # type: (MainContainer) -> int
+        """
+        :param container: MainContainer or ColumnContainer
+        :return: epoch minute of the latest minute holding values, None if there is none
+        """
+        if container.name == "column":
+            return container.keys[-1] if len(container) else None
+        if not container.children:
+            return None
+        return datetime_to_minute(container.children[-1].children[-1].children[-1].date)
+
+    def seek_time_range(self, file, data_start, start_time, end_time, encoding):
+        # type: (file, int, datetime, datetime, str) -> (int, int)
+        """
+        Memory-maps the (chronologically ordered) file and binary searches the byte offsets of the lines belonging to
+        the given time range, parsing only the timestamps of the probed lines
+        :param file: file opened in binary mode
+        :param data_start: byte offset of the first line after the header
+        :param start_time: first minute to be included (None = beginning of the file)
+        :param end_time: last minute to be included (None = end of the file)
+        :param encoding: encoding of the file
+        :return: tuple (offset of the first line in range, offset after the last line in range)
+        """
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            start, end = data_start, len(mapped)
+            if start_time is not None:
+                start = self.find_line(mapped, data_start, datetime_to_minute(start_time), encoding)
+            if end_time is not None:
+                end = self.find_line(mapped, start, datetime_to_minute(end_time) + 1, encoding)
+        return start, end
+
+    def find_line(self, mapped, data_start, target, encoding):
+        # type: (mmap, int, int, str) -> int
+        """
+        Binary search over byte positions, every probed position is moved to the next line start
+        :param mapped: memory-mapped file
+        :param data_start: byte offset of a line start, lower bound of the search
+        :param target: epoch minute
+        :param encoding: encoding of the file
+        :return: byte offset of the first line whose timestamp is not before the target minute (file size if none)
+        """
+        size = len(mapped)
+        low, high = data_start, size
+        while low < high:
+            middle = (low + high) // 2
+            line_start = FileReader.next_line_start(mapped, data_start, middle)
+            if line_start >= size or self.line_minute(mapped, line_start, encoding) >= target:
+                high = middle
+            else:
+                low = middle + 1
+        return FileReader.next_line_start(mapped, data_start, low)
+
+    @staticmethod
+    def next_line_start(mapped, data_start, position):
+        # type: (mmap, int, int) -> int
+        """
+        :param mapped: memory-mapped file
+        :param data_start: byte offset of a line start
+        :param position: byte offset
+        :return: offset of the first line start at or after the position (file size if there is none)
+        """
+        if position <= data_start:
+            return data_start
+        newline = mapped.find(b"\n", position - 1)
+        return len(mapped) if newline < 0 else newline + 1
+
+    def line_minute(self, mapped, line_start, encoding):
+        # type: (mmap, int, str) -> int
+        """
+        :param mapped: memory-mapped file
+        :param line_start: byte offset of a line start
+        :param encoding: encoding of the file
+        :return: epoch minute of the line's timestamp
+        """
+        line_end = mapped.find(b"\n", line_start)
+        line = mapped[line_start:line_end if line_end >= 0 else len(mapped)].decode(encoding)
+        if not line.strip():  # trailing empty line
+            return float("inf")
+        return datetime_to_minute(self.line_parser.line_timestamp(line))
+
+    def read_file_parallel(self, ranges, workers, encoding):
+        # type: ([*(int, int)], int, str) -> None
+        """
+        Parses the given newline aligned byte ranges in worker processes (each with a fork of the initialized line
+        parser) and merges the resulting containers in time order
+        :param ranges: list of (start, end) byte offsets
+        :param workers: number of worker processes
+        :param encoding: encoding of the file
+        :return:
+        """
+        worker = FileReader.parse_chunk if self.stats is None else FileReader.parse_chunk_profiled
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(worker, self.line_parser.fork(), self.file_path, start, end, encoding)
+                       for start, end in ranges]
+            for future in futures:  # merge in file order
+                result = future.result()
+                if self.stats is not None:
+                    result, stats = result
+                    self.stats.merge(stats)
+                containers, bad_value_log = result
+                for name, container in containers.items():
+                    self.container[name].merge(container)
+                self.line_parser.bad_value_log.merge(bad_value_log)
+
+    @staticmethod
+    def split_file(file, start, end, n_chunks):
+        # type: (file, int, int, int) -> [*(int, int)]
+        """
+        Splits the byte range between two line starts into chunks beginning at line starts
+        :param file: file opened in binary mode
+        :param start: byte offset of the first line
+        :param end: byte offset after the last line
+        :param n_chunks: desired number of chunks (less for small ranges)
+        :return: list of (start, end) byte offsets
+        """
+        chunk_size = max((end - start) // n_chunks, MIN_CHUNK_SIZE)
+        boundaries = [start]
+        while boundaries[-1] + chunk_size < end:
+            file.seek(boundaries[-1] + chunk_size)
+            file.readline()  # move to the beginning of the next line
+            if file.tell() >= end:
+                break
+            boundaries.append(file.tell())
+        boundaries.append(end)
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    @staticmethod
+    def parse_chunk(line_parser, file_path, start, end, encoding):
+        # type: (LineParser, str, int, int, str) -> dict
+        """
+        Worker function of read_file_parallel, parses the lines between two byte offsets
+        :param line_parser: initialized parser with empty containers
+        :param file_path:
+        :param start: byte offset of the first line
+        :param end: byte offset after the last line
+        :param encoding: encoding of the file
+        :return: tuple (container dictionary, bad value log of the parser)
+        """
+        with open(file_path, "rb") as file:
+            file.seek(start)
+            position = start
+            lines = []
+            while position < end:
+                line = file.readline()
+                if not line:
+                    break
+                position += len(line)
+                lines.append(line.decode(encoding))
+                if len(lines) == BULK_LINES:
+                    line_parser.parse_lines(lines)
+                    lines = []
+            line_parser.parse_lines(lines)
+        line_parser.close()
+        return line_parser.container, line_parser.bad_value_log
+
+    @staticmethod
+    def parse_chunk_profiled(line_parser, file_path, start, end, encoding):
+        # type: (LineParser, str, int, int, str) -> (dict, ProfileStats)
+        """
+        Profiled version of parse_chunk, the stats of the worker are returned to be merged
+        :return: tuple (result of parse_chunk, ProfileStats)
+        """
+        stats = ProfileStats()
+        line_parser.profile(stats)
+        return FileReader.parse_chunk(line_parser, file_path, start, end, encoding), stats
 
     def load(self, file_address):
         # type: (str) -> None
         """
-        Load previously saved container object
-        :param file_address:
+        Load previously saved container object (memory-mapped, values are only read when queried)
+        :param file_address: path of a file written by save
         :return:
         """
-        self.container = pickle.load(file_address)
+        self.container.clear()  # the line parser shares this dictionary
+        self.container.update(load_store(file_address))
 
     def save(self, filename):
         # type: (str) -> None
         """
-        Save container object (containing the extracted data) to disk
+        Save container object (containing the extracted data) to disk in the binary store format (see DataStore)
+        :param filename:
         :return:
         """
-        pickle.dump(self.container, filename)
+        save_store(self.container, filename)
 
 
 
@@ -356,26 +1150,50 @@ class FileWriter(object):
     Provides methods to write a csv or json file off of the datetime tree structure created by a FileReader instance
     """
     @staticmethod
-    def find_item_in_list(sorted_list, idx_left, idx_right, target):
-        # type: ([], int, int, datetime) -> int
-        """
-        Performs simple binary search on the given ordered list
-        Note: Might be changed to a iterative version
-        :param sorted_list:
-        :param idx_left: usually starts with 0
-        :param idx_right: usually starts with len(sorted_list)
-        :param target: target value to be found in the list
-        :return: index of the target element in the array or -1 if not found
-        """
-        middle = (idx_left + idx_right) // 2
-        if sorted_list[middle] == target:
-            return middle
-        if len(sorted_list[idx_left:idx_right]) <= 1:
-            raise ValueError("File is probably not ordered chronologically!")
-        if sorted_list[middle] > target:
-            return FileWriter.find_item_in_list(sorted_list, idx_left, middle, target)
-        else:
-            return FileWriter.find_item_in_list(sorted_list, middle, idx_right, target)
+    def open_output(address):
+        # type: (str) -> file
+        """
+        Opens the output file with a large write buffer, "-" refers to stdout. Files ending with ".gz", ".xz" or ".bz2"
+        are compressed
+        :param address:
+        :return: file object
+        """
+        if address == "-":
+            return sys.stdout
+        return open_output(address)
+
+    @staticmethod
+    def find_tail(address, start_time, output_format="csv"):
+        # type: (str, datetime, str) -> (int, bool)
+        """
+        Locates the rows of an existing (uncompressed) csv, json or json lines output starting at start_time or later.
+        The rows are ordered chronologically, so the file is scanned backwards from its end and only these rows and the
+        last row before them are read
+        :param address: path of the output file
+        :param start_time: date of the first row to be found
+        :param output_format: "csv", "json" or "jsonl"
+        :return: tuple (byte offset the rows start at (json: end of the last earlier row, without its comma), whether
+                 earlier rows precede it)
+        """
+        date = str(start_time).encode("ascii")
+        date_start = 0 if output_format == "csv" else len('{"Date": "')
+        with open(address, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return 0, False
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                end = len(mapped)
+                if output_format == "json":  # closing bracket
+                    end = mapped.rfind(b"\n") + 1
+                while end > 0:
+                    line_start = mapped.rfind(b"\n", 0, end - 1) + 1
+                    if line_start == 0 and output_format != "jsonl":  # csv header or opening json bracket
+                        return (1 if output_format == "json" else end), False
+                    if mapped[line_start + date_start:line_start + date_start + len(date)] < date:
+                        if output_format == "json":
+                            return end - (2 if mapped[end - 2:end - 1] == b"," else 1), True
+                        return end, True
+                    end = line_start
+        return 0, False
 
     @staticmethod
     def dump(string, address="Undefined.csv"):
@@ -386,8 +1204,10 @@ class FileWriter(object):
         :param address:
         :return:
         """
-        with open(address, "w") as file:
-            file.write(string)
+        file = FileWriter.open_output(address)
+        file.write(string)
+        if file is not sys.stdout:
+            file.close()
 
     @staticmethod
     def get_string(value):
@@ -406,32 +1226,96 @@ class FileWriter(object):
             return string
 
     @staticmethod
-    def format_csv(values, col_name, sep):
-        # type: ([*tuple], str, str) -> str
+    def format_header(col_name, sep, value_types=None):
+        # type: (str, str, (str,)) -> str
+        """
+        :param col_name: name of extracted column
+        :param sep: the separator to be used
+        :param value_types: value types of rows holding several aggregates, one output column each
+        :return: csv header line
+        """
+        if value_types is None:
+            return "Date%s %s\n" % (sep, col_name)
+        return "Date%s\n" % "".join("%s %s_%s" % (sep, col_name, value_type) for value_type in value_types)
+
+    @staticmethod
+    def format_csv(values, col_name, sep, value_types=None):
+        # type: ([*tuple], str, str, (str,)) -> str
         """
         Processes list of tuples into a csv format string
         :param values: list of tuples (datetime, value)
         :param col_name: name of extracted column
         :param sep: the separator to be used
+        :param value_types: see format_header
         :return: string form of the file
         """
-        result = ""
-        result += "Date%s %s\n" % (sep, col_name)
+        lines = [FileWriter.format_header(col_name, sep, value_types)]
         for value in values:
-            temp_line = "%s%s %s\n" % (str(value[0]), sep, FileWriter.get_string(value[1]))
-            result += temp_line
-        return result
+            lines.append(FileWriter.format_row(value[0], value[1], sep, "csv", value_types))
+        return "".join(lines)
 
     @staticmethod
-    def format_json(values, col_name, sep):
-        result = "[\n"
-        for value in values:
-            date = value[0]
-            data = value[1]
-            result += '{"Date": "%s", "Data": %s},\n' % (str(date), str(data))
-        result = result[0:-2]
-        result += "\n]"
-        return result
+    def format_json(values, col_name, sep, value_types=None):
+        rows = [FileWriter.format_row(value[0], value[1], sep, "json", value_types) for value in values]
+        return "[\n" + ",\n".join(rows) + "\n]"
+
+    @staticmethod
+    def format_values(values, col_name, sep, output_format="csv", value_types=None):
+        # type: ([*tuple], str, str, str, (str,)) -> str
+        """
+        :param values: list of tuples (datetime, value)
+        :param col_name: name of extracted column
+        :param sep: the separator to be used
+        :param output_format: "csv", "json" or "jsonl"
+        :param value_types: value types of rows holding several aggregates (tuples of values), see format_row
+        :return: string form of the file
+        """
+        if output_format == "csv":
+            return FileWriter.format_csv(values, col_name, sep, value_types)
+        if output_format == "json":
+            return FileWriter.format_json(values, col_name, sep, value_types)
+        return "".join([FileWriter.format_row(value[0], value[1], sep, "jsonl", value_types) for value in values])
+
+    @staticmethod
+    def get_json_string(value):
+        # type: (*float) -> str
+        """
+        Json has no literal for non-finite numbers, nan (e.g. "NA" fields or filled gaps) and infinities are written as
+        null
+        :param value: single value or list of values
+        :return: json form of the value(s)
+        """
+        string = str(value)
+        if "n" not in string:  # neither nan nor inf
+            return string
+        if isinstance(value, list):
+            return "[%s]" % ", ".join(FileWriter.get_json_string(element) for element in value)
+        return "null"
+
+    @staticmethod
+    def format_row(date, value, sep, output_format="csv", value_types=None):
+        # type: (datetime, *float, str, str, (str,)) -> str
+        """
+        Formats a single row, csv and json lines rows end with a newline, json objects are left unterminated
+        :param date:
+        :param value: single value, list of values or tuple of aggregates (one per value type)
+        :param sep: the separator to be used
+        :param output_format: "csv", "json" or "jsonl"
+        :param value_types: value types of a tuple of aggregates, written as separate csv columns or as json object
+        :return: string form of the row
+        """
+        if value_types is not None:
+            if output_format == "csv":
+                return "%s%s\n" % (str(date), "".join("%s %s" % (sep, str(element)) for element in value))
+            value = "{%s}" % ", ".join('"%s": %s' % (value_type, FileWriter.get_json_string(element))
+                                       for value_type, element in zip(value_types, value))
+        elif output_format != "csv":
+            value = FileWriter.get_json_string(value)
+        if output_format == "csv":
+            return "%s%s %s\n" % (str(date), sep, FileWriter.get_string(value))
+        if output_format == "jsonl":
+            return '{"Date": "%s", "Data": %s}\n' % (str(date), value)
+        return '{"Date": "%s", "Data": %s}' % (str(date), value)
 
     @staticmethod
     def string_to_datetime(str_date_time):
@@ -442,120 +1326,329 @@ class FileWriter(object):
                 l.append(int(date_list[i]))
             except IndexError:
                 l.append(0)
-                print("Unspecified values were set to 0")
+                print("Unspecified values were set to 0", file=sys.stderr)
         datetime_object = datetime.datetime(l[0], l[1], l[2], l[3], l[4])
         return datetime_object
 
-    # TODO: Implement continuous time line
-    """
     @staticmethod
     def range_time(start_time, end_time, resolution):
         # type: (datetime, datetime, str) -> iter
-        '''
-        returns the datetime range as an iterable
+        """
+        Continuous time line, generated lazily
         :param start_time:
         :param end_time:
-        :param resolution:
-        :return:
-        '''
-        pass
+        :param resolution: any resolution accepted by resolution_width
+        :return: iterator of the start datetimes of all buckets between start and end time
+        """
+        width = resolution_width(resolution)
+        key = bucket_start(datetime_to_minute(start_time), width)
+        end_key = datetime_to_minute(end_time)
+        while key <= end_key:
+            yield minute_to_datetime(key)
+            key += width
 
     @staticmethod
-    def process_values(values, function):
-        string = ""
-        for value in values:
-            string += function(value)
+    def fill_gaps(values, resolution, fill="na", value_type="mean"):
+        # type: (iter, str, str, str) -> iter
+        """
+        Merges sorted sparse rows with the continuous time line between the first and the last row, one row per bucket
+        of the resolution. Rows are generated on demand, the time line is never held in memory
+        :param values: iterator of aggregated (datetime, value) rows, e.g. of iter_values
+        :param resolution: resolution of the rows
+        :param fill: how missing buckets are filled, "na" (nan), "ffill" (the previous value) or "linear"
+                     (interpolated between the neighbouring values)
+        :param value_type: value type(s) of the rows (see split_value_types)
+        :return: iterator of (datetime, value) rows without gaps
+        """
+        width = resolution_width(resolution)
+        previous_key, previous_value = None, None
+        for date, value in values:
+            key = bucket_start(datetime_to_minute(date), width)
+            if previous_key is not None and key - previous_key > width:
+                yield from FileWriter.gap_rows(previous_key, previous_value, key, value, width, fill, value_type)
+            yield date, value
+            previous_key, previous_value = key, value
 
     @staticmethod
-    def minute_generator():
-        mins = range(59)
-        for i in cycle(mins):
-            yield i
+    def gap_rows(start_key, start_value, end_key, end_value, width, fill="na", value_type="mean"):
+        # type: (int, *float, int, *float, int, str, str) -> iter
+        """
+        Only value-like types are filled, count and sum of a missing bucket are 0
+        :param start_key: epoch minute of the bucket before the gap
+        :param start_value: its value (or tuple of values)
+        :param end_key: epoch minute of the bucket after the gap
+        :param end_value: its value (or tuple of values)
+        :param width: bucket width in minutes
+        :param fill: "na", "ffill" or "linear", see fill_gaps
+        :param value_type: value type(s) of the values (see split_value_types)
+        :return: iterator of (datetime, value) rows of the missing buckets in between
+        """
+        value_types = split_value_types(value_type)
+        start_values = start_value if isinstance(start_value, tuple) else (start_value,)
+        end_values = end_value if isinstance(end_value, tuple) else (end_value,)
+        steps = (end_key - start_key) // width
+        dates = FileWriter.range_time(minute_to_datetime(start_key + width), minute_to_datetime(end_key - width),
+                                      "%dmin" % width)
+        for step, date in enumerate(dates, 1):
+            values = []
+            for element, start, end in zip(value_types, start_values, end_values):
+                if element in EMPTY_BUCKET_TYPES:
+                    values.append(0)
+                elif fill == "ffill":
+                    values.append(start)
+                elif fill == "linear":
+                    values.append(FileWriter.interpolate(start, end, step / steps))
+                else:
+                    values.append(float("nan"))
+            yield date, tuple(values) if isinstance(start_value, tuple) else values[0]
 
     @staticmethod
-    def hour_generator(self):
-        hours = range(24)
-        for i in cycle(hours):
-            yield i
-    """
+    def interpolate(start_value, end_value, fraction):
+        # type: (float, float, float) -> float
+        """
+        :param start_value:
+        :param end_value:
+        :param fraction: position between the values (0 - 1)
+        :return: linearly interpolated value
+        """
+        return start_value + (end_value - start_value) * fraction
+
     def __init__(self, container):
         self.container = container
+        self.stats = None  # ProfileStats, see profile
+        self.rollups = {}  # id of a tree/ column container -> Rollup, built on the first query of another width
 
     def write(self, output_file, start_time, end_time, col_name, sep=",", resolution="minute", aggregate_type="mean",
-              output_format="csv"):
-        # type: (str, str, str, str, str, str, str, str) -> None
+              output_format="csv", fill="none", resume=False):
+        # type: (str, str, str, str, str, str, str, str, str, bool) -> int
         """
-        Convertes the container object into a csv like file and writes it to disk.
-        :param output_file: filename or path including filename where output should be written to
+        Convertes the container object into a csv like file and writes it to disk. Rows are generated and written one
+        by one, so neither the list of values nor the output string is ever held in memory
+        :param output_file: filename or path including filename where output should be written to ("-" = stdout)
         :param start_time: yyyy:mm:hh:mm
         :param end_time: yyyy:mm:hh:mm
         :param col_name: name of the column to be extracted
         :param sep: separator to be used, default ','
-        :param resolution: desired output resolution atm supports "day", "hour" and "minute", default="minute"
-        :param aggregate_type: How data should be aggregated (if possible) atm supports "mean", "min", "max"
-        :param output_format: specifies the desire format of the output file ("csv" or "json")
-        :param raw_values: Indicates whether values should be aggregated
-        :return:
+        :param resolution: desired output resolution "day", "hour", "minute", "week" or a multiple like "15min", "6h",
+                           "2d", "1w", default="minute"
+        :param aggregate_type: How data should be aggregated (if possible) atm supports "mean", "min", "max", "count",
+                               "sum", "var", "std", "median" and percentiles like "p95", several comma separated types
+                               like "mean,min,max" are written as one column each
+        :param output_format: specifies the desire format of the output file ("csv", "json" or "jsonl" - one json
+                              object per line, or the binary "npz", "arrow" and "feather", see get_arrays)
+        :param fill: "none" (default) skips buckets without values, "na", "ffill" or "linear" fill them (see fill_gaps)
+        :param resume: whether the rows of an existing output file before start_time are kept (see RowWriter)
+        :return: number of written rows
         """
-        start_time = FileWriter.string_to_datetime(start_time)
-        end_time = FileWriter.string_to_datetime(end_time)
-        if aggregate_type != "none":
-            values = self.get_aggregated_values(self.container[col_name], start_time=start_time, end_time=end_time,
-                                                resolution=resolution, value_type=aggregate_type)
-        else:
-            values = self.get_raw_values(self.container[col_name], start_time=start_time, end_time=end_time)
+        if output_format in BINARY_FORMATS:
+            check_binary_format(output_format)
+            columns = self.get_arrays(FileWriter.string_to_datetime(start_time),
+                                      FileWriter.string_to_datetime(end_time), col_name, resolution, aggregate_type,
+                                      fill)
+            rows = write_binary(output_file, columns, output_format)
+            if self.stats is not None:
+                self.stats.count("rows_written", rows)
+            return rows
+        values = self.iter_values(FileWriter.string_to_datetime(start_time), FileWriter.string_to_datetime(end_time),
+                                  col_name, resolution, aggregate_type, fill)
+        value_types = FileWriter.output_value_types(aggregate_type)
+        row_writer = RowWriter(output_file, col_name, sep, output_format, value_types,
+                               FileWriter.string_to_datetime(start_time) if resume else None)
+        if self.stats is not None:
+            values = self.stats.time_iterator(values, "aggregate" if aggregate_type != "none" else "raw_values")
+            self.stats.instrument(row_writer, "write_row", "format_write")
+        try:
+            for date, value in values:
+                row_writer.write_row(date, value)
+        finally:
+            row_writer.close()
+            if self.stats is not None:
+                self.stats.count("rows_written", row_writer.rows)
+                self.stats.count("bytes_written", row_writer.bytes)
+        return row_writer.rows
 
-        if output_format == "csv":
-            result = FileWriter.format_csv(values, col_name, sep).rstrip()
-        else:
-            result = FileWriter.format_json(values, col_name, sep).rstrip()
-        FileWriter.dump(result, output_file)
+    def iter_values(self, start_time, end_time, col_name, resolution="minute", aggregate_type="mean", fill="none"):
+        # type: (datetime, datetime, str, str, str, str) -> iter
+        """
+        The rows write outputs
+        :param start_time:
+        :param end_time:
+        :param col_name: name of the column
+        :param resolution: see write
+        :param aggregate_type: "mean", "min", "max", ... (see check_value_type), several of them (see
+                               split_value_types) or "none" (raw values in minute resolution)
+        :param fill: "none", "na", "ffill" or "linear", see write
+        :return: iterator of tuples -> (datetime: timestamp, value, [float]: raw values or (float,): aggregates)
+        """
+        if fill not in FILL_METHODS:
+            raise AssertionError("Invalid fill method: '%s', choose one of %s" % (fill, ", ".join(FILL_METHODS)))
+        if aggregate_type == "none":
+            if fill != "none":
+                raise AssertionError("Gaps can only be filled in aggregated output, choose an aggregation type")
+            return self.iter_raw_values(self.container[col_name], start_time=start_time, end_time=end_time)
+        values = self.iter_aggregated_values(self.container[col_name], start_time=start_time, end_time=end_time,
+                                             resolution=resolution, value_type=aggregate_type)
+        if fill != "none":
+            values = FileWriter.fill_gaps(values, resolution, fill, aggregate_type)
+        return values
+
+    def get_arrays(self, start_time, end_time, col_name, resolution="minute", aggregate_type="mean", fill="none"):
+        # type: (datetime, datetime, str, str, str, str) -> dict
+        """
+        The rows of iter_values as numpy arrays: a datetime64[s] "Date" column and a float64 column per value type
+        (named like the csv header). Raw values are one row per value, a ColumnContainer's values are shared without
+        copying (so do not parse further lines into it while the arrays are in use)
+        :param start_time:
+        :param end_time:
+        :param col_name: name of the column
+        :param resolution: see write
+        :param aggregate_type: see iter_values
+        :param fill: see iter_values
+        :return: dictionary of column name -> numpy array
+        """
+        check_binary_format("npz")
+        objct = self.container[col_name]
+        if aggregate_type == "none" and fill == "none" and objct.name == "column":
+            start_idx, end_idx = objct.get_index_range(start_time, end_time)
+            end_idx = max(start_idx, end_idx)
+            keys = numpy.frombuffer(objct.keys, dtype=numpy.int64)[start_idx:end_idx]
+            offsets = numpy.frombuffer(objct.offsets, dtype=numpy.int64)[start_idx:end_idx + 1]
+            return {DATE_COLUMN: numpy.repeat(minute_array(keys), numpy.diff(offsets)),
+                    col_name: value_array(objct.values)[offsets[0]:offsets[-1]]}
+        rows = self.iter_values(start_time, end_time, col_name, resolution, aggregate_type, fill)
+        keys = array("q")
+        if aggregate_type == "none":  # tree: the lists of raw values are appended as they are
+            values, counts = array("d"), array("q")
+            for date, chunk in rows:
+                keys.append(datetime_to_minute(date))
+                counts.append(len(chunk))
+                values.extend(chunk)
+            return {DATE_COLUMN: numpy.repeat(minute_array(keys), counts), col_name: value_array(values)}
+        value_types = FileWriter.output_value_types(aggregate_type)
+        if value_types is None:
+            values = array("d")
+            for date, value in rows:
+                keys.append(datetime_to_minute(date))
+                values.append(value)
+            return {DATE_COLUMN: minute_array(keys), col_name: value_array(values)}
+        columns = [array("d") for _ in value_types]
+        for date, values in rows:
+            keys.append(datetime_to_minute(date))
+            for column, value in zip(columns, values):
+                column.append(value)
+        result = {DATE_COLUMN: minute_array(keys)}
+        for value_type, column in zip(value_types, columns):
+            result["%s_%s" % (col_name, value_type)] = value_array(column)
         return result
 
+    @staticmethod
+    def output_value_types(aggregate_type):
+        # type: (str) -> (str,)
+        """
+        :param aggregate_type: see iter_values
+        :return: the value types if rows hold several aggregates, else None
+        """
+        if aggregate_type == "none":
+            return None
+        value_types = split_value_types(aggregate_type)
+        return value_types if len(value_types) > 1 else None
+
+    def profile(self, stats=None):
+        # type: (ProfileStats) -> ProfileStats
+        """
+        Enables profiling: querying (aggregation), formatting and writing of the rows are timed from now on
+        :param stats: ProfileStats instance to be used (e.g. the one of the FileReader), a new one by default
+        :return: the stats
+        """
+        self.stats = stats if stats is not None else ProfileStats()
+        self.stats.instrument(self, "write")
+        return self.stats
+
     def get_aggregated_values(self, objct, start_time, end_time, resolution, value_type="mean"):
         # type: (MainContainer, datetime, datetime, str, str) -> [*(datetime, *float)]
         """
-        Recursively calculates aggregated values from a certain date to a certain date with a certain resolution
+        Calculates aggregated values from a certain date to a certain date with a certain resolution
         :param objct: reference to a MainContainer instance "representing kind of the root node"
         :param start_time: datetime object defining the start time, resolution must at least match the desire resolution
         :param end_time: datetime object defining the end time, resolution must at least match the desi re resolution
-        :param resolution: at which resolution data should be aggregated (day, hour, minute)
-        :param value_type: type of aggregation ("mean", "min", "max")
-        :return: list of tuples -> [*(datetime: timestamp, float: value)]
+        :param resolution: at which resolution data should be aggregated (day, hour, minute, week, 15min, ...)
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type) or several of them
+                           (comma separated or a list, see split_value_types)
+        :return: list of tuples -> [*(datetime: timestamp, float: value or (float,): one value per value type)]
+        """
+        return list(self.iter_aggregated_values(objct, start_time, end_time, resolution, value_type))
+
+    def iter_aggregated_values(self, objct, start_time, end_time, resolution, value_type="mean"):
+        # type: (MainContainer, datetime, datetime, str, str) -> iter
+        """
+        Generator version of get_aggregated_values, recursively yields one (datetime, value) tuple per node
+        :param objct: reference to a MainContainer instance "representing kind of the root node"
+        :param start_time: datetime object defining the start time
+        :param end_time: datetime object defining the end time
+        :param resolution: at which resolution data should be aggregated (day, hour, minute or any other resolution
+                           accepted by resolution_width, served from the container's rollup)
+        :param value_type: type of aggregation ("mean", "min", "max", ..., see check_value_type) or several of them,
+                           which are computed in the same traversal
+        :return: iterator of tuples -> (datetime: timestamp, float: value or (float,): one value per value type)
         """
+        if objct.name == "stream":
+            yield from objct.iter_aggregated_values(start_time, end_time, resolution, value_type)
+            return
+        value_types = split_value_types(value_type)
+        if resolution not in ("day", "hour", "minute") or (objct.name == "column" and
+                                                           any(element not in NESTED_TYPES for element in value_types)):
+            yield from self.get_rollup(objct).iter_aggregated_values(start_time, end_time, resolution, value_types)
+            return
+        if objct.name == "column":
+            yield from objct.iter_aggregated_values(start_time, end_time, resolution, value_types)
+            return
         current_list = objct.children
-        # get start and end index, if start/ end time is within current_list, else use whole list
-        if current_list[0] > start_time:
-            start_idx = 0
-        else:
-            start_idx = self.find_item_in_list(current_list, 0, len(current_list), start_time)
-        if current_list[-1] < end_time:
-            end_idx = len(current_list) - 1
-        else:
-            end_idx = self.find_item_in_list(current_list, 0, len(current_list), end_time)
+        start_idx, end_idx = objct.get_index_range(start_time, end_time)
+        if start_idx >= end_idx:
+            return
 
         # Base case
         if current_list[start_idx].name == resolution:
-            values = []
-            for i in range(start_idx, end_idx + 1):
-                if value_type == "mean":
-                    value = (current_list[i].date, current_list[i].get_value())
-                elif value_type == "min":
-                    value = (current_list[i].date, current_list[i].get_min_value())
-                elif value_type == "max":
-                    value = (current_list[i].date, current_list[i].get_max_value())
+            for i in range(start_idx, end_idx):
+                node = current_list[i]
+                if len(value_types) == 1:
+                    yield node.date, node.get_statistic(value_types[0])
                 else:
-                    raise AssertionError("Invalid value type: " + str(value_type))
-                values.append(value)
-            return values
-        # Traverse one layer deeper and repack list
+                    yield node.date, tuple(node.get_statistic(element) for element in value_types)
+        # Traverse one layer deeper
         else:
-            values = []
-            for i in range(start_idx, end_idx + 1):
-                list_of_tuples = self.get_aggregated_values(objct.children[i], start_time, end_time, resolution, value_type)
-                for _tuple in list_of_tuples:
-                    values.append(_tuple)
-            return values
+            for i in range(start_idx, end_idx):
+                yield from self.iter_aggregated_values(objct.children[i], start_time, end_time, resolution,
+                                                       value_types)
+
+    def downsample(self, objct, start_time, end_time, points, method="lttb"):
+        # type: (MainContainer, datetime, datetime, int, str) -> [*(datetime, *float)]
+        """
+        At most points representative points of the values between start and end time, e.g. for plots, mostly computed
+        from the container's rollup (see Rollup.downsample)
+        :param objct: reference to a MainContainer instance "representing kind of the root node" or a ColumnContainer
+        :param start_time: datetime object defining the start time
+        :param end_time: datetime object defining the end time
+        :param points: maximal number of points
+        :param method: "lttb" (Largest-Triangle-Three-Buckets) or "minmax" (min/ max envelope)
+        :return: list of tuples -> (datetime, float: value) for "lttb", (datetime, (float, float): min and max) for
+                 "minmax"
+        """
+        if objct.name == "stream":
+            raise AssertionError("Raw values are not kept by streaming containers, downsampling is not possible")
+        return self.get_rollup(objct).downsample(start_time, end_time, points, method)
+
+    def get_rollup(self, objct):
+        # type: (MainContainer) -> Rollup
+        """
+        :param objct: reference to a MainContainer instance "representing kind of the root node" or a ColumnContainer
+        :return: rollup of the container, built once and reused by all later queries
+        """
+        rollup = self.rollups.get(id(objct))
+        if rollup is None:
+            rollup = Rollup.from_container(objct)
+            self.rollups[id(objct)] = rollup
+        return rollup
 
     def get_raw_values(self, objct, start_time, end_time):
         # type: (MainContainer, datetime, datetime) -> [*(datetime, [*values])]
@@ -566,40 +1659,107 @@ class FileWriter(object):
         :param end_time: datetime object defining the end time, resolution must at least match the desi re resolution
         :return: list of tuples -> [*(datetime: timestamp, float: value)]
         """
+        return list(self.iter_raw_values(objct, start_time, end_time))
+
+    def iter_raw_values(self, objct, start_time, end_time):
+        # type: (MainContainer, datetime, datetime) -> iter
+        """
+        Generator version of get_raw_values, recursively yields one (datetime, [values]) tuple per minute
+        :param objct: reference to a MainContainer instance "representing kind of the root node"
+        :param start_time: datetime object defining the start time
+        :param end_time: datetime object defining the end time
+        :return: iterator of tuples -> (datetime: timestamp, [float]: values)
+        """
+        if objct.name == "column":
+            yield from objct.iter_raw_values(start_time, end_time)
+            return
+        if objct.name == "stream":
+            raise AssertionError("Raw values are not kept by streaming containers, choose an aggregation type")
         current_list = objct.children
-        if current_list[0] > start_time:
-            start_idx = 0
-        else:
-            start_idx = FileWriter.find_item_in_list(current_list, 0, len(current_list), start_time)
-        if current_list[-1] < end_time:
-            end_idx = len(current_list) - 1
-        else:
-            end_idx = FileWriter.find_item_in_list(current_list, 0, len(current_list), end_time)
+        start_idx, end_idx = objct.get_index_range(start_time, end_time)
+        if start_idx >= end_idx:
+            return
 
         # Base case
         if current_list[start_idx].name == "minute":
-            values = []
-            for i in range(start_idx, end_idx + 1):
-                value = (current_list[i].date, current_list[i].children)
-                values.append(value)
-            return values
+            for i in range(start_idx, end_idx):
+                yield current_list[i].date, current_list[i].children
         else:
-            values = []
-            for i in range(start_idx, end_idx + 1):
-                list_of_tuples = self.get_raw_values(objct.children[i], start_time, end_time)
-                for _tuple in list_of_tuples:
-                    values.append(_tuple)
-            return values
+            for i in range(start_idx, end_idx):
+                yield from self.iter_raw_values(objct.children[i], start_time, end_time)
 
     def load(self, file_address):
         # type: (str) -> None
         """
-        Load previously saved container object
-        :param file_address:
+        Load previously saved container object (memory-mapped, values are only read when queried)
+        :param file_address: path of a file written by FileReader.save
         :return:
         """
-        self.container = pickle.load(file_address)
+        self.container = load_store(file_address)
 
 
 
 
+
+
+class RowWriter(object):
+    """
+    Writes (datetime, value) rows one by one to a buffered output file (or stdout), producing valid csv, json or json
+    lines output at any time it is closed
+    """
+    def __init__(self, output_file, col_name, sep=",", output_format="csv", value_types=None, resume_time=None):
+        # type: (str, str, str, str, (str,), datetime) -> None
+        """
+        Constructor, opens the output file and writes the header
+        :param output_file: filename or path including filename ("-" = stdout)
+        :param col_name: name of the written column
+        :param sep: separator to be used
+        :param output_format: "csv", "json" or "jsonl"
+        :param value_types: value types of rows holding a tuple of aggregates (see FileWriter.format_row)
+        :param resume_time: if given, an existing (uncompressed) output file is continued: its rows before this date
+                            are kept, the later ones are replaced by the rows written from now on
+        """
+        self.sep = sep
+        self.output_format = output_format
+        self.value_types = value_types
+        self.rows = 0
+        self.bytes = 0  # written characters (equal to bytes for ascii column names)
+        self.is_continued = False  # whether rows of a resumed output precede the written ones
+        if resume_time is not None and output_file != "-" and os.path.exists(output_file):
+            offset, self.is_continued = FileWriter.find_tail(output_file, resume_time, output_format)
+            with open(output_file, "r+b") as file:
+                file.truncate(offset)
+            if offset > 0:
+                self.file = open(output_file, "a", buffering=WRITE_BUFFER_SIZE)
+                return
+        self.file = FileWriter.open_output(output_file)
+        if output_format == "csv":
+            self.bytes += self.file.write(FileWriter.format_header(col_name, sep, value_types))
+        elif output_format == "json":
+            self.bytes += self.file.write("[")
+
+    def write_row(self, date, value):
+        # type: (datetime, *float) -> None
+        """
+        :param date:
+        :param value: single value, list of values or tuple of aggregates
+        :return:
+        """
+        row = FileWriter.format_row(date, value, self.sep, self.output_format, self.value_types)
+        if self.output_format == "json":
+            row = ("\n" if self.rows == 0 and not self.is_continued else ",\n") + row
+        self.bytes += self.file.write(row)
+        self.rows += 1
+
+    def close(self):
+        # type: (None) -> None
+        """
+        Terminates the output (closing bracket of json) and closes the file
+        :return:
+        """
+        if self.output_format == "json":
+            self.bytes += self.file.write("\n]")
+        if self.file is sys.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
@@ -0,0 +1,163 @@
+#Counters and timers for profiling the parser
+import sys
+import time
+try:
+    import resource
+except ImportError:  # not available on windows, peak memory is not reported then
+    resource = None
+
+"""
+Lightweight profiling: methods of single instances are replaced by timing wrappers only when profiling is enabled, so
+unprofiled runs execute the plain methods without any overhead
+"""
+
+
+def peak_memory():
+    # type: (None) -> float
+    """
+    :return: maximum resident set size of the process in MB, None if it cannot be determined
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, KB elsewhere
+
+
+class ProfileStats(object):
+    """
+    Collects counters (e.g. lines, values, written bytes) and the number of calls and inclusive seconds of stages (e.g.
+    extract_timestamp). Stats of worker processes can be merged
+    """
+    def __init__(self):
+        self.counters = {}
+        self.calls = {}
+        self.seconds = {}
+
+    def __str__(self):
+        return self.report()
+
+    def count(self, counter, n=1):
+        # type: (str, int) -> None
+        """
+        :param counter: name of the counter
+        :param n: amount to be added
+        :return:
+        """
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def add_time(self, stage, seconds, calls=1):
+        # type: (str, float, int) -> None
+        """
+        :param stage: name of the stage
+        :param seconds:
+        :param calls: number of calls the seconds have been spent in
+        :return:
+        """
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def instrument(self, objct, method_name, stage=None, error_counter=None, result_counter=None,
+                   argument_counter=None):
+        # type: (object, str, str, str, str, str) -> None
+        """
+        Replaces a method of the given instance by a wrapper timing its calls (the class itself stays untouched).
+        Recursive calls of the method are timed and counted once, by the outermost call
+        :param objct: instance
+        :param method_name:
+        :param stage: name of the stage the time is added to (default: method name)
+        :param error_counter: optional counter incremented whenever the method raises an exception
+        :param result_counter: optional counter the length of every result is added to
+        :param argument_counter: optional counter the length of the first argument of every call is added to
+        :return:
+        """
+        function = getattr(objct, method_name)
+        stage = stage if stage is not None else method_name
+        self.add_time(stage, 0.0, 0)
+        for counter in (error_counter, result_counter, argument_counter):
+            if counter is not None:
+                self.count(counter, 0)
+        seconds, calls, counters = self.seconds, self.calls, self.counters
+        clock = time.perf_counter
+        depth = [0]  # number of active calls
+
+        def timed(*args, **kwargs):
+            if depth[0]:  # recursive call, part of the outermost one
+                return function(*args, **kwargs)
+            if argument_counter is not None:
+                counters[argument_counter] += len(args[0])
+            depth[0] += 1
+            start = clock()
+            try:
+                result = function(*args, **kwargs)
+            except Exception:
+                if error_counter is not None:
+                    counters[error_counter] += 1
+                raise
+            finally:
+                seconds[stage] += clock() - start
+                calls[stage] += 1
+                depth[0] -= 1
+            if result_counter is not None:
+                counters[result_counter] += len(result)
+            return result
+
+        setattr(objct, method_name, timed)
+
+    def time_iterator(self, iterator, stage):
+        # type: (iter, str) -> iter
+        """
+        :param iterator:
+        :param stage: name of the stage the time spent producing the items is added to
+        :return: iterator yielding the same items
+        """
+        self.add_time(stage, 0.0, 0)
+        clock = time.perf_counter
+        iterator = iter(iterator)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add_time(stage, clock() - start, 0)
+                return
+            self.add_time(stage, clock() - start)
+            yield item
+
+    def merge(self, other):
+        # type: (ProfileStats) -> None
+        """
+        Adds the counters and timings of other, e.g. collected in a worker process
+        :param other:
+        :return:
+        """
+        for counter, n in other.counters.items():
+            self.count(counter, n)
+        for stage, seconds in other.seconds.items():
+            self.add_time(stage, seconds, other.calls[stage])
+
+    def as_dict(self):
+        # type: (None) -> dict
+        """
+        :return: json serializable dictionary of counters, stages (calls and seconds) and the peak memory in MB
+        """
+        return {"counters": dict(self.counters),
+                "stages": {stage: {"calls": self.calls[stage], "seconds": self.seconds[stage]} for stage in self.seconds},
+                "peak_memory_mb": peak_memory()}
+
+    def report(self):
+        # type: (None) -> str
+        """
+        :return: human readable table of the stages and counters
+        """
+        lines = ["Profile (stage times are inclusive and summed over worker processes):"]
+        for stage in sorted(self.seconds, key=self.seconds.get, reverse=True):
+            seconds, calls = self.seconds[stage], self.calls[stage]
+            if calls == 0:
+                continue
+            lines.append("  %-20s %10.3fs %12d calls %12.0f calls/s" % (stage, seconds, calls,
+                                                                      calls / seconds if seconds > 0 else 0))
+        for counter in sorted(self.counters):
+            lines.append("  %-20s %12d" % (counter, self.counters[counter]))
+        memory = peak_memory()
+        lines.append("  %-20s %12s" % ("peak_rss_mb", "?" if memory is None else "%.1f" % memory))
+        return "\n".join(lines)
@@ -0,0 +1,141 @@
+#Counting, sampling and quarantining of fields without a numerical value
+import copy
+
+"""
+A field is bad if no number can be extracted from it (e.g. "NA", "error" or an empty field). Depending on the policy
+bad fields are skipped, stored as nan ("na") or abort the parsing ("fail"). Either way they are counted per column, the
+first lines containing them are kept as a sample and all of these lines can be collected in a quarantine file, which is
+written in blocks rather than line by line
+"""
+
+BAD_VALUE_POLICIES = ("skip", "na", "fail")
+BAD_VALUE_SAMPLES = 10  # offending lines kept for the report
+QUARANTINE_BUFFER = 10000  # offending lines collected before they are written to the quarantine file
+
+
+class BadValueLog(object):
+    """
+    Collects the bad fields of one file. Logs of worker processes (see fork) only collect, they are merged into the log
+    of the main process, which writes the quarantine file
+    """
+    def __init__(self, policy="skip", quarantine=None, max_samples=BAD_VALUE_SAMPLES):
+        # type: (str, str, int) -> None
+        """
+        Constructor
+        :param policy: "skip" (default), "na" or "fail"
+        :param quarantine: optional path of a csv file the offending lines are written to (with the header of the input)
+        :param max_samples: number of offending lines kept for the report
+        """
+        if policy not in BAD_VALUE_POLICIES:
+            raise ValueError("Invalid bad value policy: '%s', choose one of %s" % (policy,
+                                                                                 ", ".join(BAD_VALUE_POLICIES)))
+        self.policy = policy
+        self.quarantine = quarantine
+        self.max_samples = max_samples
+        self.header = None
+        self.counts = {}  # column name -> number of bad fields
+        self.lines = 0  # number of lines containing bad fields
+        self.samples = []
+        self.pending = []  # offending lines not written to the quarantine file yet
+        self.is_writer = True  # False for forks, their lines are written by the log they are merged into
+        self.is_started = False  # whether the quarantine file has been created
+        self._seen = {}  # id -> recently recorded line (referenced, so the id is not reused), see forget
+
+    def __getstate__(self):
+        # type: (None) -> dict
+        state = dict(self.__dict__)
+        state["_seen"] = {}
+        return state
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def fork(self):
+        # type: (None) -> BadValueLog
+        """
+        :return: empty log with the same settings, collecting (but not writing) the offending lines of a worker
+        """
+        log = copy.copy(self)
+        log.counts = {}
+        log.lines = 0
+        log.samples = []
+        log.pending = []
+        log.is_writer = False
+        log._seen = {}
+        return log
+
+    def add(self, column, line, sep):
+        # type: (str, [str], str) -> None
+        """
+        Records a bad field, a line with several bad fields is sampled and quarantined once (as long as it is among
+        the QUARANTINE_BUFFER most recent ones, or recorded since forget)
+        :param column: name of the column
+        :param line: fields of the csv line
+        :param sep: separator the line is joined with again
+        :return:
+        """
+        self.counts[column] = self.counts.get(column, 0) + 1
+        if self._seen.get(id(line)) is line:
+            return
+        if len(self._seen) >= QUARANTINE_BUFFER:
+            self._seen = {}
+        self._seen[id(line)] = line
+        self.lines += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append(sep.join(line).rstrip("\r\n"))
+        if self.quarantine is not None:
+            text = sep.join(line)
+            self.pending.append(text if text.endswith("\n") else text + "\n")
+            if len(self.pending) >= QUARANTINE_BUFFER:
+                self.flush()
+
+    def forget(self):
+        # type: (None) -> None
+        """
+        Is called before a new batch of lines is parsed, the lines recorded so far will not be seen again
+        :return:
+        """
+        if self._seen:
+            self._seen = {}
+
+    def merge(self, other):
+        # type: (BadValueLog) -> None
+        """
+        Adds the counts, samples and offending lines of other (collected by a worker on the following part of the file)
+        :param other:
+        :return:
+        """
+        for column, n in other.counts.items():
+            self.counts[column] = self.counts.get(column, 0) + n
+        self.lines += other.lines
+        self.samples.extend(other.samples[:self.max_samples - len(self.samples)])
+        self.pending.extend(other.pending)
+        if len(self.pending) >= QUARANTINE_BUFFER:
+            self.flush()
+
+    def flush(self):
+        # type: (None) -> None
+        """
+        Writes the collected offending lines to the quarantine file (created with the header by the first call)
+        :return:
+        """
+        if not self.is_writer or self.quarantine is None or (self.is_started and not self.pending):
+            return
+        with open(self.quarantine, "a" if self.is_started else "w") as file:
+            if not self.is_started and self.header is not None:
+                file.write(self.header if self.header.endswith("\n") else self.header + "\n")
+            file.writelines(self.pending)
+        self.is_started = True
+        self.pending = []
+
+    def report(self):
+        # type: (None) -> str
+        """
+        :return: human readable summary of the bad fields per column and the sampled lines
+        """
+        lines = ["%d bad values in %d lines (policy '%s'): %s" % (len(self), self.lines, self.policy, ", ".join(
+            "%s: %d" % item for item in sorted(self.counts.items())))]
+        if self.quarantine is not None:
+            lines.append("  quarantined to %s" % self.quarantine)
+        lines += ["  " + sample for sample in self.samples]
+        return "\n".join(lines)
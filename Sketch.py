@@ -0,0 +1,234 @@
+#Mergeable summaries of value distributions: moments and quantile sketches
+import math
+import re
+
+"""
+A Summary keeps count, sum, min, max, the Welford moments (mean and sum of squared deviations) and a t-digest of the
+values added to it. Summaries of adjacent buckets merge exactly (moments by Chan's formula) or approximately (digests),
+so the statistics of coarse buckets are computed from the summaries of their children instead of all raw values.
+
+The t-digest clusters the sorted values into centroids (mean, weight) whose size is limited by the scale function
+k(q) = compression / (2 pi) * asin(2q - 1): centroids near the tails stay small, so extreme percentiles are accurate,
+and a digest never holds more than about compression centroids.
+"""
+
+DIGEST_COMPRESSION = 100
+DIGEST_BUFFER = 5  # values are buffered up to this multiple of the compression before they are merged into centroids
+# statistics of the values of a bucket, besides the nested "mean"/ "min"/ "max" and percentiles like "p95" or "p99.9"
+SUMMARY_TYPES = ("count", "sum", "var", "std", "median")
+PERCENTILE_PATTERN = re.compile(r"^p([0-9]+(?:\.[0-9]+)?)$")
+
+
+def percentile_fraction(value_type):
+    # type: (str) -> float
+    """
+    :param value_type: "median" or a percentile like "p95", "p99.9"
+    :return: the quantile as fraction between 0 and 1, None if value_type is no percentile
+    """
+    if value_type == "median":
+        return 0.5
+    match = PERCENTILE_PATTERN.match(value_type)
+    if match is None or float(match.group(1)) > 100:
+        return None
+    return float(match.group(1)) / 100
+
+
+class TDigest(object):
+    """
+    Merging t-digest, values are added in bulk and merged into the sorted centroids whenever the buffer is full
+    """
+    def __init__(self, compression=DIGEST_COMPRESSION):
+        # type: (int) -> None
+        """
+        Constructor
+        :param compression: bounds the number of centroids, higher values are more accurate
+        """
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.buffer = []  # values (weight 1) added since the last compression
+        self.min = float("inf")
+        self.max = float("-inf")
+
+    def __len__(self):
+        return int(sum(self.weights)) + len(self.buffer)
+
+    def add(self, values):
+        # type: ([float]) -> None
+        """
+        :param values: finite values
+        :return:
+        """
+        self.buffer.extend(values)
+        if len(self.buffer) > DIGEST_BUFFER * self.compression:
+            self.compress()
+
+    def merge(self, other):
+        # type: (TDigest) -> None
+        """
+        Adds the centroids and buffered values of other
+        :param other:
+        :return:
+        """
+        self.means.extend(other.means)
+        self.weights.extend(other.weights)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.add(other.buffer)
+        if len(self.means) > DIGEST_BUFFER * self.compression:
+            self.compress()
+
+    def compress(self):
+        # type: (None) -> None
+        """
+        Sorts centroids and buffered values and merges neighbours as long as the merged centroid spans at most one unit
+        of the scale function
+        :return:
+        """
+        if self.buffer:
+            self.min = min(self.min, min(self.buffer))
+            self.max = max(self.max, max(self.buffer))
+        items = sorted(list(zip(self.means, self.weights)) + [(value, 1) for value in self.buffer])
+        self.buffer = []
+        if not items:
+            return
+        total = sum(weight for _, weight in items)
+        scale = self.compression / (2 * math.pi)
+        means, weights = [items[0][0]], [items[0][1]]
+        done = 0  # weight of the finished centroids
+        limit = self.quantile_limit(0.0, scale) * total
+        for mean, weight in items[1:]:
+            if done + weights[-1] + weight <= limit:
+                weights[-1] += weight
+                means[-1] += (mean - means[-1]) * weight / weights[-1]
+            else:
+                done += weights[-1]
+                limit = self.quantile_limit(done / total, scale) * total
+                means.append(mean)
+                weights.append(weight)
+        self.means, self.weights = means, weights
+
+    @staticmethod
+    def quantile_limit(q, scale):
+        # type: (float, float) -> float
+        """
+        :param q: quantile the centroid starts at
+        :param scale: compression / (2 pi)
+        :return: quantile one unit of the scale function above q
+        """
+        k = scale * math.asin(max(-1.0, min(1.0, 2 * q - 1))) + 1
+        if k >= scale * math.pi / 2:
+            return 1.0
+        return (math.sin(k / scale) + 1) / 2
+
+    def quantile(self, q):
+        # type: (float) -> float
+        """
+        Interpolates between the centers of the centroids (and min/ max at the ends), exact for a few values
+        :param q: quantile between 0 and 1
+        :return: estimated value, nan if the digest is empty
+        """
+        self.compress()
+        means, weights = self.means, self.weights
+        if not means:
+            return float("nan")
+        if len(means) == 1:
+            return means[0] if weights[0] == 1 else self.min + (self.max - self.min) * q
+        total = sum(weights)
+        target = q * total
+        if target <= weights[0] / 2:  # between min and the center of the first centroid
+            if weights[0] == 1:
+                return means[0]
+            return self.min + (means[0] - self.min) * target / (weights[0] / 2)
+        center = weights[0] / 2
+        for i in range(1, len(means)):
+            next_center = center + (weights[i - 1] + weights[i]) / 2
+            if target <= next_center:
+                return means[i - 1] + (means[i] - means[i - 1]) * (target - center) / (next_center - center)
+            center = next_center
+        if weights[-1] == 1:
+            return means[-1]
+        return means[-1] + (self.max - means[-1]) * (target - center) / (total - center)
+
+
+class Summary(object):
+    """
+    Count, sum, min, max, Welford moments and t-digest of the values of a bucket
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.digest = TDigest()
+
+    def add(self, values):
+        # type: ([float]) -> None
+        """
+        Welford's online update, non-finite values (e.g. stored "NA" fields) are left out of the digest
+        :param values:
+        :return:
+        """
+        count, mean, m2 = self.count, self.mean, self.m2
+        finite = []
+        for value in values:
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+            if value - value == 0:
+                finite.append(value)
+            if value < self.min:
+                self.min = value
+            if value > self.max:
+                self.max = value
+            self.total += value
+        self.count, self.mean, self.m2 = count, mean, m2
+        self.digest.add(finite)
+
+    def merge(self, other):
+        # type: (Summary) -> None
+        """
+        Chan's parallel combination of the moments, the digests are merged
+        :param other:
+        :return:
+        """
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.digest.merge(other.digest)
+
+    def get(self, value_type):
+        # type: (str) -> float
+        """
+        :param value_type: "count", "sum", "mean" (of all values), "min", "max", "var" (population variance), "std",
+                           "median" or a percentile like "p95"
+        :return: the statistic
+        """
+        if value_type == "count":
+            return self.count
+        if value_type == "sum":
+            return self.total
+        if value_type == "mean":
+            return self.mean if self.count else float("nan")
+        if value_type == "min" or value_type == "max":
+            if self.min > self.max:  # no values or only nan, which are left out
+                return float("nan")
+            return self.min if value_type == "min" else self.max
+        if value_type == "var":
+            return self.m2 / self.count if self.count else float("nan")
+        if value_type == "std":
+            return math.sqrt(self.m2 / self.count) if self.count else float("nan")
+        fraction = percentile_fraction(value_type)
+        if fraction is None:
+            raise AssertionError("Invalid value type: " + str(value_type))
+        return self.digest.quantile(fraction)
@@ -0,0 +1,89 @@
+#Chronological ordering of csv lines with unsorted timestamps
+import heapq
+import os
+import tempfile
+from itertools import islice
+from operator import itemgetter
+
+"""
+The containers can only append values to their latest minute, so unsorted lines have to be ordered before they are
+parsed. Mostly sorted input (e.g. merged logs of several devices) is ordered on the fly by a bounded reorder buffer,
+completely unsorted input by an external merge sort: sorted runs of the lines are written to temporary files and
+merged lazily, so the memory use is bounded by the run size rather than by the file size. Both are stable, lines of the
+same minute keep their order
+"""
+
+REORDER_LINES = 100000  # default capacity of the reorder buffer
+SORT_RUN_LINES = 1000000  # lines sorted in memory per run of the external sort
+KEY_WIDTH = 12  # digits of the minute prefixed to the lines in the run files
+KEY_OFFSET = 10 ** 10  # keeps the prefixed minutes of dates before 1970 positive
+
+
+def reorder_lines(lines, key, capacity=REORDER_LINES):
+    # type: (iter, callable, int) -> iter
+    """
+    Orders lines that are at most capacity lines away from their chronological position
+    :param lines: iterable of csv lines
+    :param key: function returning the epoch minute of a line
+    :param capacity: number of lines held back in the buffer
+    :return: iterator of the lines in chronological order
+    """
+    heap = []
+    released = None  # minute of the last line released from the buffer
+    for i, line in enumerate(lines):
+        minute = key(line)
+        if released is not None and minute < released:
+            raise ValueError("Line is further out of order than the reorder buffer of %d lines can handle, increase "
+                             "it or sort the file: '%s'" % (capacity, line.rstrip("\r\n")))
+        heapq.heappush(heap, (minute, i, line))
+        if len(heap) > capacity:
+            released, _, line = heapq.heappop(heap)
+            yield line
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def sort_lines(lines, key, run_lines=SORT_RUN_LINES, temp_dir=None):
+    # type: (iter, callable, int, str) -> iter
+    """
+    External merge sort, input fitting into a single run is sorted in memory only
+    :param lines: iterable of csv lines
+    :param key: function returning the epoch minute of a line
+    :param run_lines: number of lines sorted in memory at once
+    :param temp_dir: directory of the temporary run files (default: the system's temporary directory)
+    :return: iterator of the lines in chronological order
+    """
+    lines = iter(lines)
+    run = sort_run(islice(lines, run_lines), key)
+    if len(run) < run_lines:
+        for _, line in run:
+            yield line
+        return
+    with tempfile.TemporaryDirectory(prefix="sort_", dir=temp_dir) as directory:
+        files = []
+        try:
+            while run:
+                file = open(os.path.join(directory, "run%d" % len(files)), "w+")
+                files.append(file)
+                file.writelines("%0*d%s" % (KEY_WIDTH, minute + KEY_OFFSET, line if line.endswith("\n") else
+                                            line + "\n") for minute, line in run)
+                file.seek(0)
+                run = sort_run(islice(lines, run_lines), key)
+            # heapq.merge prefers the earlier run on equal keys, which keeps the sort stable
+            for line in heapq.merge(*files, key=itemgetter(slice(0, KEY_WIDTH))):
+                yield line[KEY_WIDTH:]
+        finally:
+            for file in files:
+                file.close()
+
+
+def sort_run(lines, key):
+    # type: (iter, callable) -> [*(int, str)]
+    """
+    :param lines: iterable of csv lines
+    :param key: function returning the epoch minute of a line
+    :return: list of (minute, line) tuples sorted (stable) by minute
+    """
+    run = [(key(line), line) for line in lines]
+    run.sort(key=itemgetter(0))
+    return run
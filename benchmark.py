@@ -0,0 +1,291 @@
+#Benchmarks for the parser hot paths
+from Parser import *
+import getopt
+import json
+import platform
+import random
+import shutil
+import tempfile
+import time
+import timeit
+
+"""
+Synthetic data generator and benchmark suite, run as script: python benchmark.py -h
+
+Every configuration is measured in a fresh worker process, so the reported peak memory (maximum resident set size) is
+the one of this configuration only. Results are stored as json and can be compared against the results of another
+version with --compare.
+"""
+
+# name -> (strftime format of the timestamp field, date_format argument of the FileReader)
+TIMESTAMP_FORMATS = {
+    "iso24": ("%Y-%m-%d %H:%M:%S", "auto"),
+    "iso12": ("%Y-%m-%d %I:%M:%S %p", "auto"),
+    "eu24": ("%d.%m.%Y %H:%M:%S", "auto"),
+    "eu12": ("%d.%m.%Y %I:%M:%S %p", "auto"),
+    "us24": ("%m/%d/%Y %H:%M:%S", "US"),
+    "us12": ("%m/%d/%Y %I:%M:%S %p", "US"),
+}
+WRITE_CASES = [("minute", "none")] + [(resolution, value_type) for resolution in ("minute", "15min", "hour", "day")
+                                      for value_type in ("mean", "min", "max")]
+
+
+def generate_csv(file_path, timestamp_format="iso24", minutes=1440, rows_per_minute=60, channels=3,
+                 start=datetime.datetime(2017, 1, 1), seed=0):
+    # type: (str, str, int, int, int, datetime, int) -> int
+    """
+    Writes a synthetic sensor file the LineParser accepts: a header "Timestamp,ch1,...,chN" followed by rows evenly
+    spread over every minute, each channel holding a random walk. The output is reproducible for a given seed, its size
+    is roughly minutes * rows_per_minute * (27 + 7 * channels) bytes
+    :param file_path:
+    :param timestamp_format: key of TIMESTAMP_FORMATS
+    :param minutes: duration of the data in minutes
+    :param rows_per_minute:
+    :param channels: number of value columns
+    :param start: timestamp of the first row
+    :param seed: seed of the random values
+    :return: number of data rows
+    """
+    random_generator = random.Random(seed)
+    # the seconds are inserted per row, everything else of the timestamp is formatted once per minute
+    minute_format = TIMESTAMP_FORMATS[timestamp_format][0].replace("%S", "<seconds>")
+    levels = [50.0] * channels
+    with open(file_path, "w", buffering=WRITE_BUFFER_SIZE) as file:
+        file.write("Timestamp," + ",".join("ch%d" % (i + 1) for i in range(channels)) + "\n")
+        for minute in range(minutes):
+            head, tail = (start + datetime.timedelta(minutes=minute)).strftime(minute_format).split("<seconds>")
+            rows = []
+            for row in range(rows_per_minute):
+                for i in range(channels):
+                    levels[i] += random_generator.random() - 0.5
+                rows.append("%s%02d%s,%s\n" % (head, row * 60 // rows_per_minute, tail,
+                                               ",".join(["%.3f" % level for level in levels])))
+            file.write("".join(rows))
+    return minutes * rows_per_minute
+
+
+def bench_extract_timestamp(n=200000, repeat=3):
+    # type: (int, int) -> dict
+    """
+    Measures the throughput of LineParser.extract_timestamp with the fixed-layout fast path against the general
+    regex based path, for 24h and 12h timestamps
+    :param n: number of timestamps converted per run
+    :param repeat: number of runs, the fastest one is reported
+    :return: dictionary of timestamps per second, keyed by "<sample>|<path>"
+    """
+    samples = {
+        "24h": ("Timestamp,Value", "2017-01-01 14:15:03.250,1.0"),
+        "12h": ("Timestamp,Value", "01.01.2017 02:15:03 PM,1.0"),
+    }
+    results = {}
+    for name, (header, line) in samples.items():
+        parser = LineParser({}, None, hour_format=12 if name == "12h" else "auto")
+        parser.parse_header(header)
+        parser.initialize(line)
+        field = line.split(",")[0]
+        for path, function in (("fast", parser.extract_timestamp), ("regex", parser.search_timestamp)):
+            seconds = min(timeit.repeat(lambda: function(field), number=n, repeat=repeat))
+            results["%s|%s" % (name, path)] = n / seconds
+    return results
+
+
+def bench_file(file_path, date_format, rows, storage="tree", workers=1, output_dir=None):
+    # type: (str, str, int, str, int, str) -> dict
+    """
+    Times FileReader.read_file and FileWriter.write (all columns, every case of WRITE_CASES) on one file, meant to be
+    run in a fresh process (see run_suite)
+    :param file_path: file written by generate_csv
+    :param date_format: date_format argument of the FileReader
+    :param rows: number of data rows of the file
+    :param storage: "tree" or "columnar"
+    :param workers: number of processes parsing the file
+    :param output_dir: directory for the written files (a temporary one by default)
+    :return: dictionary of measurements, keyed by "read", "write|<resolution>|<aggregation type>" and "peak_memory_mb"
+    """
+    results = {}
+    size = os.path.getsize(file_path)
+    file_reader = FileReader(file_path, date_format=date_format, storage=storage)
+    start = time.perf_counter()
+    file_reader.read_file(workers)
+    seconds = time.perf_counter() - start
+    results["read"] = {"seconds": seconds, "rows_per_second": rows / seconds, "mb_per_second": size / 1e6 / seconds}
+
+    directory = output_dir if output_dir is not None else tempfile.mkdtemp()
+    try:
+        file_writer = FileWriter(file_reader.container)
+        for resolution, value_type in WRITE_CASES:
+            written = 0
+            start = time.perf_counter()
+            for column in file_reader.line_parser.get_column_names():
+                written += file_writer.write(os.path.join(directory, "%s.csv" % column), "1980:01:01:00:00",
+                                             "2050:01:01:00:00", column, resolution=resolution,
+                                             aggregate_type=value_type)
+            seconds = time.perf_counter() - start
+            results["write|%s|%s" % (resolution, value_type)] = {"seconds": seconds, "rows": written,
+                                                                 "rows_per_second": written / seconds}
+    finally:
+        if output_dir is None:
+            shutil.rmtree(directory)
+    results["peak_memory_mb"] = peak_memory()
+    return results
+
+
+def run_suite(timestamp_formats=("iso24",), storages=("tree", "columnar"), minutes=1440, rows_per_minute=60,
+              channels=3, workers=1, data_dir=None, seed=0):
+    # type: ([str], [str], int, int, int, int, str, int) -> dict
+    """
+    Generates one file per timestamp format and benchmarks every storage backend on it, each configuration in its own
+    process
+    :param timestamp_formats: keys of TIMESTAMP_FORMATS
+    :param storages: storage backends to be measured ("tree", "columnar")
+    :param minutes: duration of the generated files in minutes
+    :param rows_per_minute:
+    :param channels: number of value columns of the generated files
+    :param workers: number of processes parsing a file
+    :param data_dir: directory the generated files are kept in, a temporary one is removed afterwards by default
+    :param seed: seed of the random values
+    :return: json serializable dictionary holding the environment, the configuration and the results keyed by
+             "<timestamp format>|<storage>"
+    """
+    config = {"timestamp_formats": list(timestamp_formats), "storages": list(storages), "minutes": minutes,
+              "rows_per_minute": rows_per_minute, "channels": channels, "workers": workers, "seed": seed}
+    report = {"created": datetime.datetime.now().isoformat(), "python": platform.python_version(),
+              "platform": platform.platform(), "config": config, "results": {}}
+    directory = data_dir if data_dir is not None else tempfile.mkdtemp()
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for timestamp_format in timestamp_formats:
+            file_path = os.path.join(directory, "%s_%d_%d_%d.csv" % (timestamp_format, minutes, rows_per_minute,
+                                                                     channels))
+            rows = minutes * rows_per_minute
+            if not os.path.exists(file_path):  # generated under a temporary name, an interrupted run leaves no stub
+                rows = generate_csv(file_path + ".part", timestamp_format, minutes, rows_per_minute, channels, seed=seed)
+                os.replace(file_path + ".part", file_path)
+            for storage in storages:
+                with ProcessPoolExecutor(1) as executor:  # fresh process, thus independent peak memory
+                    results = executor.submit(bench_file, file_path, TIMESTAMP_FORMATS[timestamp_format][1], rows,
+                                              storage, workers).result()
+                results["file_mb"] = os.path.getsize(file_path) / 1e6
+                results["rows"] = rows
+                report["results"]["%s|%s" % (timestamp_format, storage)] = results
+        report["results"]["extract_timestamp"] = bench_extract_timestamp()
+    finally:
+        if data_dir is None:
+            shutil.rmtree(directory)
+    return report
+
+
+def compare_reports(old, new, tolerance=0.1):
+    # type: (dict, dict, float) -> [str]
+    """
+    Finds the measurements of new which are slower (or use more memory) than the same measurements of old by more than
+    the tolerance
+    :param old: report of run_suite, e.g. of the previous version
+    :param new: report of run_suite
+    :param tolerance: accepted relative deviation
+    :return: list of messages, one per regression
+    """
+    regressions = []
+    for case, results in new["results"].items():
+        old_results = old["results"].get(case)
+        if old_results is None:
+            continue
+        for key, value in results.items():
+            old_value = old_results.get(key)
+            if isinstance(value, dict):
+                value, old_value = value.get("rows_per_second"), (old_value or {}).get("rows_per_second")
+                if value is not None and old_value and value < old_value * (1 - tolerance):
+                    regressions.append("%s %s: %.0f rows/s -> %.0f rows/s" % (case, key, old_value, value))
+            elif key == "peak_memory_mb":
+                if value is not None and old_value and value > old_value * (1 + tolerance):
+                    regressions.append("%s %s: %.1f MB -> %.1f MB" % (case, key, old_value, value))
+            elif case == "extract_timestamp" and old_value and value < old_value * (1 - tolerance):
+                regressions.append("%s %s: %.0f/s -> %.0f/s" % (case, key, old_value, value))
+    return regressions
+
+
+def print_report(report):
+    # type: (dict) -> None
+    """
+    :param report: report of run_suite
+    :return:
+    """
+    for case, results in sorted(report["results"].items()):
+        if case == "extract_timestamp":
+            for key, rate in sorted(results.items()):
+                print("extract_timestamp %-10s %12.0f timestamps/s" % (key, rate))
+            continue
+        memory = results["peak_memory_mb"]
+        print("%s: %d rows, %.1f MB, peak memory %s MB" % (case, results["rows"], results["file_mb"],
+                                                           "?" if memory is None else "%.1f" % memory))
+        for key, measurement in sorted(results.items()):
+            if isinstance(measurement, dict):
+                print("    %-24s %8.3fs %12.0f rows/s" % (key, measurement["seconds"], measurement["rows_per_second"]))
+
+
+def cli(argv):
+    _help = "Usage: benchmark.py --<parameter>=<value> \n\n" \
+            "--formats=<names>     comma separated timestamp formats of the generated files, default 'iso24', any of\n" \
+            "                      %s or 'all'\n\n" \
+            "--storages=<names>     comma separated storage backends, default 'tree,columnar'\n\n" \
+            "--minutes=<number>     duration of the generated data, default 1440 (one day)\n\n" \
+            "--rows_per_minute=<number>     default 60\n\n" \
+            "--channels=<number>     number of value columns, default 3\n\n" \
+            "--workers=<number>     number of processes parsing a file, default 1\n\n" \
+            "--seed=<number>     seed of the random values, default 0\n\n" \
+            "--data_dir=<directory>     keep the generated files (and reuse them in later runs)\n\n" \
+            "--output=<file>     write the results as json\n\n" \
+            "--compare=<file>     json results of a previous run, regressions are listed and the exit status is 1\n\n" \
+            "--tolerance=<fraction>     accepted relative deviation when comparing, default 0.1\n\n" \
+            "--generate=<file>     only generate a file (using --formats, --minutes, --rows_per_minute, --channels)\n" \
+            % ", ".join(sorted(TIMESTAMP_FORMATS))
+    try:
+        opts, args = getopt.getopt(argv, "h", ["formats=", "storages=", "minutes=", "rows_per_minute=", "channels=",
+                                               "workers=", "seed=", "data_dir=", "output=", "compare=",
+                                               "tolerance=", "generate="])
+    except getopt.GetoptError as e:
+        print(e)
+        print(_help)
+        sys.exit(2)
+    options = dict(opts)
+    if "-h" in options:
+        print(_help)
+        sys.exit(0)
+    formats = options.get("--formats", "iso24")
+    formats = sorted(TIMESTAMP_FORMATS) if formats == "all" else formats.split(",")
+    for timestamp_format in formats:
+        if timestamp_format not in TIMESTAMP_FORMATS:
+            print("Unknown timestamp format: '%s'" % timestamp_format)
+            sys.exit(2)
+    storages = options.get("--storages", "tree,columnar").split(",")
+    for storage in storages:
+        if storage not in ("tree", "columnar"):
+            print("Only the 'tree' and 'columnar' storage can be benchmarked, not '%s'" % storage)
+            sys.exit(2)
+    minutes = int(options.get("--minutes", 1440))
+    rows_per_minute = int(options.get("--rows_per_minute", 60))
+    channels = int(options.get("--channels", 3))
+    seed = int(options.get("--seed", 0))
+
+    if "--generate" in options:
+        rows = generate_csv(options["--generate"], formats[0], minutes, rows_per_minute, channels, seed=seed)
+        print("%d rows written to %s" % (rows, options["--generate"]))
+        return
+
+    report = run_suite(formats, storages, minutes, rows_per_minute,
+                       channels, int(options.get("--workers", 1)), options.get("--data_dir"), seed)
+    print_report(report)
+    if "--output" in options:
+        with open(options["--output"], "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+    if "--compare" in options:
+        with open(options["--compare"]) as file:
+            regressions = compare_reports(json.load(file), report, float(options.get("--tolerance", 0.1)))
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli(sys.argv[1:])
@@ -3,19 +3,31 @@ from main import *
 
 # define settings
 settings = {
-    "-i": "required",  # path to input file
-    "-o": "required",  # path to output file
-    "-c": None,  # column name of the column to be extracted (header), defaults to all, however only numerical values can be extracted
+    "-i": "required",  # path to (optionally gzip/ xz/ bz2 compressed) input file, or a directory/ glob pattern (e.g. "data/*.csv") of several files to be processed in batch mode
+    "-o": "required",  # path to output file (not needed in batch mode), compressed if ending with ".gz", ".xz" or ".bz2"
+    "-c": None,  # column name (or list of names) of the columns to be extracted (header), defaults to all, however only numerical values can be extracted
     "--start": "1980:10:10:10:10",  # start point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
     "--end": "2050:10:10:10:10",  # end point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
     "--sep": ",",  # separator used in the input csv file (same will be used for output)
-    "--format_out": "csv",  # desired output format "csv" or "json"
+    "--format_out": "csv",  # desired output format "csv", "json" or "jsonl" (one json object per line), or binary "npz" (numpy), "arrow" (Arrow IPC) or "feather" with datetime64/ float64 columns
     "--date_format": "auto",  # date format of the input file timestamp (only US needs to be specified as "US" since it's ambiguous)
-    "--resolution": "minute",  # desired resolution of output (if aggregated) -> "day", "hour", "minute"
-    "--aggregation_type": "none",  # how values should be aggregated "mean", "min", "max", "none" - "none" will just output raw values at 1 minute resolution
+    "--resolution": "minute",  # desired resolution of output (if aggregated) -> "day", "hour", "minute", "week" or any multiple like "5min", "15min", "6h", "2d", "1w"
+    "--aggregation_type": "none",  # how values should be aggregated "mean", "min", "max", "count", "sum", "var", "std", "median", a percentile like "p95", several comma separated ones like "mean,min,max" (one output column each) or "none" - "none" will just output raw values at 1 minute resolution
+    "--fill": "none",  # how buckets without values are filled in aggregated output: left out ("none"), "na", forward filled ("ffill") or interpolated ("linear") - optional
     "--timestamp_column": -1,  # csv field where timestamp is located (starting at 0), -1 = automatically detect it - optional
     "--hour_format": "auto",  # 12 or 24 hour format as int 12 or 24, defaults to automatic detection - optional
-    "--sensor_name": ""  # name of sensor - optional
+    "--sensor_name": "",  # name of sensor - optional
+    "--workers": 1,  # number of processes parsing the input file in parallel - optional
+    "--state": None,  # state file for incremental runs on a growing input file, only appended lines are parsed and only changed buckets are written - optional
+    "--output_dir": None,  # batch mode: directory the outputs of all input files are written to, named after the input files - optional
+    "--jobs": None,  # batch mode: number of files processed concurrently, defaults to the number of cpus - optional
+    "--profile": False,  # print counters and per-stage timings of the hot paths to stderr - optional
+    "--bad_values": "skip",  # fields without a numerical value are skipped ("skip"), stored as nan ("na") or abort the run ("fail") - optional
+    "--quarantine": None,  # csv file the lines with such fields are written to (a directory in batch mode) - optional
+    "--reorder": 0,  # capacity (lines) of a reorder buffer for input files that are only slightly out of chronological order - optional
+    "--sort": False,  # order completely unsorted input files by an external merge sort (temporary files in --temp_dir) - optional
+    "--temp_dir": None,  # directory of the temporary files of --sort, defaults to the system's temporary directory - optional
+    "--storage": "tree"  # container backend "tree", "columnar" (array based, far less memory on large files) or "stream" (one-pass aggregation at --resolution, raw values are discarded) - optional
 }
 
 # run script with given settings
@@ -1,21 +1,39 @@
 from Parser import *
-import sys, getopt
+from Compression import strip_compression_extension
+from Quarantine import BAD_VALUE_POLICIES
+from concurrent.futures import as_completed
+import sys, getopt, os, glob, time
+
+# --start/ --end defaults, covering the whole file (only bounds given by the user are seeked in the input file)
+DEFAULT_START, DEFAULT_END = "1980:10:10:10:10", "2050:10:10:10:10"
 
 """Define Settings"""
 settings = {
-    "-i": "required",  # path to input file
-    "-o": "required",  # path to output file
-    "-c": None,  # column name of the column to be extracted (header), defaults to all, however only numerical values can be extracted
-    "--start": "1980:10:10:10:10",  # start point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
-    "--end": "2050:10:10:10:10",  # end point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
+    "-i": "required",  # path to (optionally gzip/ xz/ bz2 compressed) input file, or a directory/ glob pattern (e.g. "data/*.csv") of several files to be processed in batch mode
+    "-o": "required",  # path to output file (not needed in batch mode), compressed if ending with ".gz", ".xz" or ".bz2"
+    "-c": None,  # column name (or comma separated names) of the columns to be extracted (header), defaults to all, however only numerical values can be extracted
+    "--start": DEFAULT_START,  # start point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
+    "--end": DEFAULT_END,  # end point as date and time "yyyy:mm:dd:hh:mm", defaults to whole file
     "--sep": ",",  # separator used in the input csv file (same will be used for output)
-    "--format_out": "csv",  # desired output format "csv" or "json"
+    "--format_out": "csv",  # desired output format "csv", "json" or "jsonl" (one json object per line), or binary "npz" (numpy), "arrow" (Arrow IPC) or "feather" with datetime64/ float64 columns
     "--date_format": "auto",  # date format of the input file timestamp (only US needs to be specified as "US" since it's ambiguous)
-    "--resolution": "minute",  # desired resolution of output (if aggregated) -> "day", "hour", "minute"
-    "--aggregation_type": "none",  # how values should be aggregated "mean", "min", "max", "none" - "none" will just output raw values at 1 minute resolution
+    "--resolution": "minute",  # desired resolution of output (if aggregated) -> "day", "hour", "minute", "week" or any multiple like "5min", "15min", "6h", "2d", "1w"
+    "--aggregation_type": "none",  # how values should be aggregated "mean", "min", "max", "count", "sum", "var", "std", "median", a percentile like "p95", several comma separated ones like "mean,min,max" (one output column each) or "none" - "none" will just output raw values at 1 minute resolution
+    "--fill": "none",  # how buckets without values are filled in aggregated output: left out ("none"), "na", forward filled ("ffill") or interpolated ("linear") - optional
     "--timestamp_column": -1,  # csv field where timestamp is located (starting at 0), -1 = automatically detect it - optional
     "--hour_format": "auto",  # 12 or 24 hour format as int 12 or 24, defaults to automatic detection - optional
-    "--sensor_name": ""  # name of sensor - optional
+    "--sensor_name": "",  # name of sensor - optional
+    "--workers": 1,  # number of processes parsing the input file in parallel - optional
+    "--state": None,  # state file for incremental runs on a growing input file, only appended lines are parsed and only changed buckets are written - optional
+    "--output_dir": None,  # batch mode: directory the outputs of all input files are written to, named after the input files - optional
+    "--jobs": None,  # batch mode: number of files processed concurrently, defaults to the number of cpus - optional
+    "--profile": False,  # print counters and per-stage timings of the hot paths to stderr - optional
+    "--bad_values": "skip",  # fields without a numerical value are skipped ("skip"), stored as nan ("na") or abort the run ("fail") - optional
+    "--quarantine": None,  # csv file the lines with such fields are written to (a directory in batch mode) - optional
+    "--reorder": 0,  # capacity (lines) of a reorder buffer for input files that are only slightly out of chronological order - optional
+    "--sort": False,  # order completely unsorted input files by an external merge sort (temporary files in --temp_dir) - optional
+    "--temp_dir": None,  # directory of the temporary files of --sort, defaults to the system's temporary directory - optional
+    "--storage": "tree"  # container backend "tree", "columnar" (array based, far less memory on large files) or "stream" (one-pass aggregation at --resolution, raw values are discarded) - optional
 }
 
 
@@ -27,45 +45,350 @@ class ParseController(object):
         self.file_writer = None
 
     def __str__(self):
-        return str(settings)
+        return str(self.settings)
 
     def main(self):
+        if self.settings["--output_dir"] is not None:
+            return self.batch_main()
+        if self.settings["--storage"] == "stream" and self.settings["--format_out"] not in BINARY_FORMATS:
+            self.stream_main()  # binary files are written at once from the closed buckets by file_main
+        elif self.settings["--state"] is not None:
+            self.tail_main()
+        else:
+            self.file_main()
+        if len(self.file_reader.line_parser.bad_value_log) > 0:
+            print("%s: %s" % (self.settings["-i"], self.file_reader.line_parser.bad_value_log.report()),
+                  file=sys.stderr)
+        if self.settings["--profile"]:
+            print("%s:\n%s" % (self.settings["-i"], self.file_reader.update_stats().report()), file=sys.stderr)
+
+    def file_main(self):
+        # type: (None) -> None
+        """
+        Default mode: parses the input file (the lines within --start/ --end) and writes every column
+        :return:
+        """
+        self.create_file_reader()
+        self.file_reader.read_file(self.settings["--workers"], *self.time_range())
+        self.create_file_writer()
+        columns = self.file_reader.line_parser.get_column_names()
+        for column in columns:
+            self.file_writer.write(ParseController.output_path(self.settings["-o"], column, len(columns)),
+                                   self.settings["--start"], self.settings["--end"], column, self.settings["--sep"],
+                                   self.settings["--resolution"], self.settings["--aggregation_type"],
+                                   self.settings["--format_out"], self.settings["--fill"])
+
+    def stream_main(self):
+        # type: (None) -> None
+        """
+        One-pass mode: every bucket is written as soon as the streaming containers close it
+        :return:
+        """
+        width = resolution_width(self.settings["--resolution"])
+        start_key = bucket_start(datetime_to_minute(FileWriter.string_to_datetime(self.settings["--start"])), width)
+        end_key = bucket_start(datetime_to_minute(FileWriter.string_to_datetime(self.settings["--end"])), width)
+        row_writers = {}
+        value_types = split_value_types(self.settings["--aggregation_type"])
+        last_rows = {}  # column -> (key, value) of the last written bucket, the start of the next gap to be filled
+
+        def write_bucket(column, date, stats):
+            if not start_key <= datetime_to_minute(date) <= end_key:
+                return
+            if column not in row_writers:
+                row_writers[column] = self.open_row_writer(column)
+            values = tuple(stats[value_type] if value_type in NESTED_TYPES else stats["summary"].get(value_type)
+                           for value_type in value_types)
+            value = values[0] if len(values) == 1 else values
+            key = datetime_to_minute(date)
+            if self.settings["--fill"] != "none" and column in last_rows:
+                for gap_date, gap_value in FileWriter.gap_rows(*last_rows[column], key, value, width,
+                                                               self.settings["--fill"], value_types):
+                    row_writers[column].write_row(gap_date, gap_value)
+            last_rows[column] = key, value
+            row_writers[column].write_row(date, value)
+
+        self.create_file_reader(write_bucket)
+        try:
+            self.file_reader.read_file(1, *self.time_range())
+            for column in self.file_reader.line_parser.get_column_names():
+                if column not in row_writers:  # no bucket within the time range, still write an (empty) output
+                    row_writers[column] = self.open_row_writer(column)
+        finally:
+            for row_writer in row_writers.values():
+                row_writer.close()
+                if self.file_reader.stats is not None:
+                    self.file_reader.stats.count("rows_written", row_writer.rows)
+                    self.file_reader.stats.count("bytes_written", row_writer.bytes)
+
+    def tail_main(self):
+        # type: (None) -> None
+        """
+        Incremental mode: restores the state of the previous run, parses only the lines appended since then and
+        rewrites only the buckets that changed, the earlier rows of the output are kept. Without a (matching) state or
+        if the input got shorter, the whole file is parsed and the whole output is written
+        :return:
+        """
+        self.create_file_reader()
+        is_resumed = os.path.exists(self.settings["--state"]) and \
+            self.file_reader.load_state(self.settings["--state"], self.settings["--resolution"])
+        first_time = self.file_reader.read_new_lines()
+        self.file_reader.save_state(self.settings["--state"], self.settings["--resolution"])
+        if first_time is None:
+            print("No new lines in %s" % self.settings["-i"], file=sys.stderr)
+            return
+
+        start_time = FileWriter.string_to_datetime(self.settings["--start"])
+        if is_resumed:  # rows are replaced from the bucket of the first new line on
+            start_time = minute_to_datetime(bucket_start(datetime_to_minute(max(start_time, first_time)),
+                                                         resolution_width(self.settings["--resolution"])))
+        self.create_file_writer()
+        columns = self.file_reader.line_parser.get_column_names()
+        for column in columns:
+            self.file_writer.write(ParseController.output_path(self.settings["-o"], column, len(columns)),
+                                   start_time.strftime("%Y:%m:%d:%H:%M"), self.settings["--end"], column,
+                                   self.settings["--sep"], self.settings["--resolution"],
+                                   self.settings["--aggregation_type"], self.settings["--format_out"],
+                                   resume=is_resumed)
+
+    def batch_main(self):
+        # type: (None) -> int
+        """
+        Batch mode: the files matched by -i are fanned out over a pool of --jobs processes, each one writing to
+        --output_dir. Throughput and failures are reported per file, a failing file does not abort the batch
+        :return: number of failed files
+        """
+        file_paths = ParseController.expand_input(self.settings["-i"])
+        os.makedirs(self.settings["--output_dir"], exist_ok=True)
+        if self.settings["--quarantine"] is not None:
+            os.makedirs(self.settings["--quarantine"], exist_ok=True)
+        batch = []
+        for file_path in file_paths:
+            file_settings = dict(self.settings)
+            file_settings["-i"] = file_path
+            file_settings["-o"] = ParseController.batch_output_path(file_path, self.settings["--output_dir"],
+                                                                    self.settings["--format_out"])
+            file_settings["--output_dir"] = None
+            if self.settings["--quarantine"] is not None:
+                file_settings["--quarantine"] = ParseController.batch_output_path(file_path,
+                                                                                  self.settings["--quarantine"], "csv")
+            batch.append(file_settings)
+        if len(set(file_settings["-o"] for file_settings in batch)) < len(batch):
+            raise ValueError("Several input files have the same name, their outputs would overwrite each other")
+
+        failures = 0
+        total_size = 0
+        start = time.perf_counter()
+        with ProcessPoolExecutor(self.settings["--jobs"]) as executor:
+            futures = [executor.submit(run_file, file_settings) for file_settings in batch]
+            for future in as_completed(futures):
+                file_path, size, seconds, error = future.result()
+                if error is not None:
+                    failures += 1
+                    print("%s: failed after %.2fs - %s" % (file_path, seconds, error), file=sys.stderr)
+                    continue
+                total_size += size
+                print("%s: %.1f MB in %.2fs (%.1f MB/s)" % (file_path, size / 1e6, seconds,
+                                                            size / 1e6 / max(seconds, 1e-9)), file=sys.stderr)
+        seconds = time.perf_counter() - start
+        print("%d files, %d failed, %.1f MB in %.2fs (%.1f MB/s)" % (len(batch), failures, total_size / 1e6, seconds,
+                                                                   total_size / 1e6 / max(seconds, 1e-9)),
+              file=sys.stderr)
+        return failures
+
+    @staticmethod
+    def expand_input(input_path):
+        # type: (str) -> [str]
+        """
+        :param input_path: directory, glob pattern or path of a single file
+        :return: sorted list of the input files (all files of a directory, hidden ones excluded)
+        """
+        if os.path.isdir(input_path):
+            file_paths = [os.path.join(input_path, name) for name in os.listdir(input_path) if not name.startswith(".")]
+        else:
+            file_paths = glob.glob(input_path)
+        file_paths = sorted(file_path for file_path in file_paths if os.path.isfile(file_path))
+        if not file_paths:
+            raise ValueError("No input files found: '%s'" % input_path)
+        return file_paths
+
+    @staticmethod
+    def is_batch_input(input_path):
+        # type: (str) -> bool
+        """
+        :param input_path: -i given by the user
+        :return: whether the path is a directory or a glob pattern (containing "*", "?" or "[")
+        """
+        return os.path.isdir(input_path) or any(character in input_path for character in "*?[")
+
+    @staticmethod
+    def batch_output_path(file_path, output_dir, output_format):
+        # type: (str, str, str) -> str
+        """
+        :param file_path: input file
+        :param output_dir:
+        :param output_format: "csv", "json" or "jsonl", used as file extension
+        :return: output path of the input file
+        """
+        name = os.path.splitext(os.path.basename(strip_compression_extension(file_path)))[0]
+        return os.path.join(output_dir, "%s.%s" % (name, output_format))
+
+    def time_range(self):
+        # type: (None) -> (datetime, datetime)
+        """
+        Widens --start/ --end to whole buckets of the output resolution, so the reader can skip all lines outside
+        while aggregates at the edges stay complete
+        :return: tuple (first minute, last minute) to be parsed, None for a bound left at its default (the whole file
+                 is read sequentially if neither is given)
+        """
+        width = resolution_width(self.settings["--resolution"]) if self.settings["--aggregation_type"] != "none" else 1
+        start_time, end_time = None, None
+        if self.settings["--start"] != DEFAULT_START:
+            start_key = bucket_start(datetime_to_minute(FileWriter.string_to_datetime(self.settings["--start"])), width)
+            start_time = minute_to_datetime(start_key)
+        if self.settings["--end"] != DEFAULT_END:
+            end_key = bucket_start(datetime_to_minute(FileWriter.string_to_datetime(self.settings["--end"])), width)
+            end_time = minute_to_datetime(end_key + width - 1)
+        return start_time, end_time
+
+    def create_file_reader(self, on_bucket=None):
+        # type: (callable) -> None
+        """
+        Creates the FileReader of the input file (profiled if --profile is set)
+        :param on_bucket: callback of the stream backend, see FileReader
+        :return:
+        """
         self.file_reader = FileReader(self.settings["-i"], self.settings["--timestamp_column"],
                                       self.settings["--sep"], self.settings["--sensor_name"],
                                       self.settings["-c"], self.settings["--hour_format"],
-                                      self.settings["--date_format"])
-        self.file_reader.read_file()
+                                      self.settings["--date_format"], self.settings["--storage"],
+                                      self.settings["--resolution"], on_bucket, self.settings["--bad_values"],
+                                      self.settings["--quarantine"], self.settings["--reorder"],
+                                      self.settings["--sort"], self.settings["--temp_dir"],
+                                      self.settings["--aggregation_type"])
+        if self.settings["--profile"]:
+            self.file_reader.profile()
+
+    def create_file_writer(self):
+        # type: (None) -> None
+        """
+        Creates the FileWriter of the parsed containers, sharing the stats of the FileReader when profiling
+        :return:
+        """
         self.file_writer = FileWriter(self.file_reader.container)
-        self.file_writer.write(self.settings["-o"], self.settings["--start"], self.settings["--end"],
-                               self.settings["-c"], self.settings["--sep"], self.settings["--resolution"],
-                               self.settings["--aggregation_type"], self.settings["--format_out"])
+        if self.file_reader.stats is not None:
+            self.file_writer.profile(self.file_reader.stats)
+
+    def open_row_writer(self, column):
+        # type: (str) -> RowWriter
+        """
+        :param column: name of the column
+        :return: RowWriter writing the column to its output file
+        """
+        columns = self.file_reader.line_parser.get_column_names()
+        row_writer = RowWriter(ParseController.output_path(self.settings["-o"], column, len(columns)), column,
+                               self.settings["--sep"], self.settings["--format_out"],
+                               FileWriter.output_value_types(self.settings["--aggregation_type"]))
+        if self.file_reader.stats is not None:
+            self.file_reader.stats.instrument(row_writer, "write_row", "format_write")
+        return row_writer
+
+    @staticmethod
+    def output_path(output_file, column, n_columns):
+        # type: (str, str, int) -> str
+        """
+        When several columns are extracted each one is written to its own file, named after the column (in front of
+        the file and compression extensions, e.g. "out_a.csv.gz" for "out.csv.gz"). stdout only takes a single column,
+        a ValueError is raised otherwise
+        :param output_file: output path given by the user
+        :param column: name of the column
+        :param n_columns: number of extracted columns
+        :return: output path of the column
+        """
+        if output_file == "-" and n_columns > 1:
+            raise ValueError("Only a single column can be written to stdout (-o -), choose it with -c")
+        if n_columns == 1:
+            return output_file
+        uncompressed = strip_compression_extension(output_file)
+        root, extension = os.path.splitext(uncompressed)
+        return "%s_%s%s%s" % (root, column, extension, output_file[len(uncompressed):])
+
+
+def run_file(file_settings):
+    # type: (dict) -> (str, int, float, str)
+    """
+    Processes one file of a batch (runs in a worker process), errors are returned rather than raised so the remaining
+    files are still processed
+    :param file_settings: settings of the file
+    :return: tuple (input path, input size in bytes, seconds, error message or None)
+    """
+    start = time.perf_counter()
+    try:
+        ParseController(file_settings).main()
+        size = os.path.getsize(file_settings["-i"])
+    except Exception as e:
+        return file_settings["-i"], 0, time.perf_counter() - start, "%s: %s" % (type(e).__name__, str(e))
+    return file_settings["-i"], size, time.perf_counter() - start, None
 
 
 def cli(argv):
     param_list = ["-i", "-o", "-c", "--sep", "--start", "--end", "--format_out", "--date_format", "--resolution",
-                  "--aggregation_type", "--timestamp_column", "--sensor_name", "--hour_format"]
+                  "--aggregation_type", "--timestamp_column", "--sensor_name", "--hour_format", "--storage",
+                  "--workers", "--state", "--output_dir", "--jobs", "--profile", "--bad_values", "--quarantine",
+                  "--reorder", "--sort", "--temp_dir", "--fill"]
 
     usage = "parse.py -i <inputfile> -o <outputfile> -c <colname> \n\n" \
             "for information about additional parameters type parser.py -h"
 
     _help = "Usage example: parse.py -i <inputfile> -o <outputfile> -c <colname> --<additional parameter>=<parameter> \n\n" \
-           "-i <inputfile> \n\n" \
-           "-o <outputfile> \n\n" \
-           "-c <colname>     name of the column to be extracted - thus header name of the respective field \n\n" \
+           "-i <inputfile>     input file (may be gzip, xz or bz2 compressed), or a directory/ glob pattern of several\n" \
+           "                   files (see --output_dir) \n\n" \
+           "-o <outputfile>     '-' writes to stdout, files ending with '.gz', '.xz' or '.bz2' are compressed \n\n" \
+           "-c <colname>     name of the column to be extracted - thus header name of the respective field, several names can be\n" \
+           "                 given comma separated (e.g. 'ECG,EMG'), each column is then written to <outputfile>_<colname> \n\n" \
            "--sep=<separator>     separator of the input csv file \n\n" \
            "--start=<start_time>     where extraction should begin 'yyyy:mm:dd:hh:mm' -> e.g. '2017:01:01:14:15' \n\n" \
            "--end=<end_time>     where extraction should end 'yyyy:mm:dd:hh:mm' -> e.g. '2017:01:01:14:15' \n\n" \
-           "--format_out=<file_format>     desired output file formatting, 'csv' or 'json' \n\n" \
-           "--resolution=<time_resolution>     desired output resolution of time -> 'day', 'hour' or 'minute' \n\n" \
-           "--aggregation_type=<type>     whether values should be aggregated and how 'none', 'mean', 'min', 'max' \n\n" \
+           "--format_out=<file_format>     desired output file formatting, 'csv', 'json' or 'jsonl' (json lines), or the\n" \
+           "                               binary 'npz' (numpy), 'arrow' (Arrow IPC file) and 'feather' with a\n" \
+           "                               datetime64 'Date' and float64 value columns (needs numpy/ pyarrow) \n\n" \
+           "--resolution=<time_resolution>     desired output resolution of time -> 'day', 'hour', 'minute', 'week' or a \n" \
+           "                                   multiple like '5min', '15min', '6h', '2d' or '1w' \n\n" \
+           "--aggregation_type=<type>     whether values should be aggregated and how 'none', 'mean', 'min', 'max',\n" \
+           "                              'count', 'sum', 'var', 'std' (population variance/ deviation), 'median' or a\n" \
+           "                              percentile like 'p95', 'p99.9' (estimated from t-digest sketches). Several\n" \
+           "                              comma separated types like 'mean,min,max,count' are computed in one pass\n" \
+           "                              and written as one column each \n\n" \
+           "--fill=<method>     buckets without values are left out ('none', default) or written as nan ('na'), with\n" \
+           "                    the previous value ('ffill') or interpolated between their neighbours ('linear') \n\n" \
            "--timestamp_column=<number>     in which field the timestamp can be found (should usually be automatically)\n\n" \
            "--date_format=<format>     what timeformat is used in the inputfile, only specify if it's american format -> 'US'\n\n" \
            "--sensor_name=<name>     optional name of the used sensor e.g. 'ECG'\n\n" \
-           "--hour_format=<number>    hour format used in input file 12 or 24, is by default detected automatically\n"
+           "--hour_format=<number>    hour format used in input file 12 or 24, is by default detected automatically\n\n" \
+           "--workers=<number>     number of processes parsing the input file in parallel (tree/ columnar storage)\n\n" \
+           "--state=<file>     incremental mode for growing input files: parser state is kept in <file>, later runs only\n" \
+           "                   parse appended lines and only write the buckets that changed\n\n" \
+           "--output_dir=<directory>     batch mode: -i is a directory or a (quoted) glob pattern like 'data/*.csv', the\n" \
+           "                             output of every input file is written to <directory>/<name>.<format_out>\n\n" \
+           "--jobs=<number>     batch mode: number of files processed concurrently, defaults to the number of cpus\n\n" \
+           "--profile     prints calls and seconds per stage (timestamp/ value extraction, node creation, aggregation,\n" \
+           "              formatting), lines, values, bad values, nodes, written rows/ bytes and peak memory to stderr\n\n" \
+           "--bad_values=<policy>     fields without a numerical value (e.g. 'NA', empty) are skipped ('skip', default),\n" \
+           "                          stored as nan ('na') or abort the run ('fail'), they are counted and reported\n\n" \
+           "--quarantine=<file>     csv file the lines containing such fields are written to, in batch mode a directory\n" \
+           "                        getting one file per input file\n\n" \
+           "--reorder=<lines>     orders input files whose lines are at most <lines> lines away from their chronological\n" \
+           "                      position (e.g. merged logs of several devices) by a buffer of that size\n\n" \
+           "--sort     orders completely unsorted input files by an external merge sort, needs temporary disk space of\n" \
+           "           about the file size (uncompressed) \n\n" \
+           "--temp_dir=<directory>     directory of the temporary files of --sort \n\n" \
+           "--storage=<backend>     'tree' (default), 'columnar' to keep values in compact arrays for large files or\n" \
+           "                        'stream' to aggregate in one pass at --resolution without keeping raw values\n"
     try:
         opts, args = getopt.getopt(argv, "hi:o:c:", ["sep=", "start=", "end=", "format_out=", "date_format=",
                                                      "resolution=", "aggregation_type=", "timestamp_column=",
-                                                     "sensor_name=", "hour_format="])
+                                                     "sensor_name=", "hour_format=", "storage=", "workers=", "state=",
+                                                     "output_dir=", "jobs=", "profile", "bad_values=",
+                                                     "quarantine=", "reorder=", "sort", "temp_dir=", "fill="])
     except getopt.GetoptError as e:
         print(e)
         print(usage)
@@ -75,16 +398,76 @@ def cli(argv):
         if opt == "-h":
             print(_help)
             sys.exit(0)
+        if opt == "--profile" or opt == "--sort":  # switches without value
+            arg = True
         for param in param_list:
-            if opt in param:
+            if opt == param:
                 settings[param] = arg
     settings["--timestamp_column"] = int(settings["--timestamp_column"])
+    settings["--workers"] = int(settings["--workers"])
+    settings["--reorder"] = int(settings["--reorder"])
+    if settings["--jobs"] is not None:
+        settings["--jobs"] = int(settings["--jobs"])
+    if settings["--output_dir"] is None and ParseController.is_batch_input(settings["-i"]):
+        print("Several input files are processed in batch mode, specify an --output_dir")
+        sys.exit(2)
+    if settings["--output_dir"] is not None and settings["--state"] is not None:
+        print("--state only supports a single input file")
+        sys.exit(2)
+    if settings["--state"] is not None and (settings["--reorder"] > 0 or settings["--sort"]):
+        print("--state requires a chronologically ordered input file, --reorder and --sort cannot be used")
+        sys.exit(2)
+    if settings["--format_out"] in BINARY_FORMATS:
+        try:
+            check_binary_format(settings["--format_out"])
+        except ImportError as e:
+            print(e)
+            sys.exit(2)
+        if settings["--state"] is not None:
+            print("--state only writes the changed buckets, which is not supported by binary output formats")
+            sys.exit(2)
+    if settings["--state"] is not None and strip_compression_extension(settings["-o"]) != settings["-o"]:
+        print("--state replaces the changed rows of the output in place, which is not supported by compressed outputs")
+        sys.exit(2)
+    elif settings["--format_out"] not in ("csv", "json", "jsonl"):
+        print("Invalid output format: '%s'" % settings["--format_out"])
+        sys.exit(2)
+    if settings["--fill"] not in FILL_METHODS:
+        print("--fill must be one of %s" % ", ".join(FILL_METHODS))
+        sys.exit(2)
+    if settings["--fill"] != "none" and (settings["--aggregation_type"] == "none" or settings["--state"] is not None):
+        print("--fill requires an --aggregation_type and cannot be used with --state (only the changed buckets are "
+              "written)")
+        sys.exit(2)
+    if settings["--bad_values"] not in BAD_VALUE_POLICIES:
+        print("--bad_values must be one of %s" % ", ".join(BAD_VALUE_POLICIES))
+        sys.exit(2)
+    try:
+        resolution_width(settings["--resolution"])
+    except ValueError as e:
+        print(e)
+        sys.exit(2)
+    if settings["--aggregation_type"] != "none":
+        try:
+            split_value_types(settings["--aggregation_type"])
+        except AssertionError as e:
+            print(e)
+            sys.exit(2)
+    if settings["--storage"] == "stream" and settings["--aggregation_type"] == "none":
+        print("--storage=stream does not keep raw values, choose an --aggregation_type")
+        sys.exit(2)
+    if settings["-c"] is not None and "," in settings["-c"]:
+        settings["-c"] = [name.strip() for name in settings["-c"].split(",")]
+        if settings["-o"] == "-":
+            print("Only a single column can be written to stdout (-o -), choose it with -c")
+            sys.exit(2)
 
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         cli(sys.argv[1:])
-        print("\nSettings:\n%s\n" % str(settings))
+        print("\nSettings:\n%s\n" % str(settings), file=sys.stderr)
         parser = ParseController(settings)
-        parser.main()
+        if parser.main():  # failed files in batch mode
+            sys.exit(1)
 
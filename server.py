@@ -0,0 +1,310 @@
+#Local http query server keeping parsed files in memory
+from Parser import *
+from DataStore import MAGIC
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+import asyncio
+import getopt
+import json
+
+"""
+Parses (or memory-maps stored) files once and answers queries over http, run as script: python server.py -h
+
+    GET /files                      json description of the loaded files and their columns
+    GET /query?file=<name>&column=<column>&start=yyyy:mm:dd:hh:mm&end=yyyy:mm:dd:hh:mm&resolution=<resolution>
+              &aggregation_type=<type>&fill=<method>&format_out=<format>&sep=<separator>
+    GET /query?...&points=<number>&downsample=<lttb|minmax>  at most <number> points of the raw values for plotting
+
+The query parameters match the ones of main.py (and FileWriter.write), only column is required if several columns are
+loaded and file if several files are loaded. Results are kept in a least recently used cache.
+"""
+
+CONTENT_TYPES = {"csv": "text/csv", "json": "application/json", "jsonl": "application/x-ndjson"}
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+QUERY_DEFAULTS = {"start": "1980:10:10:10:10", "end": "2050:10:10:10:10", "resolution": "minute",
+                  "aggregation_type": "none", "fill": "none", "points": "0", "downsample": "lttb", "format_out": "csv",
+                  "sep": ","}
+
+
+class QueryError(Exception):
+    """Invalid request, answered with the given http status"""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryServer(object):
+    """
+    Holds a FileWriter per loaded file and answers queries from an asyncio server. Cache hits are answered directly
+    on the event loop, all other queries are computed one after another in a worker thread (the containers build
+    their indices lazily and are not meant to be queried concurrently), so slow queries do not block cached ones
+    """
+    def __init__(self, cache_size=256):
+        # type: (int) -> None
+        """
+        Constructor
+        :param cache_size: number of query results kept in the cache
+        """
+        self.file_writers = OrderedDict()  # name -> FileWriter
+        self.columns = {}  # name -> list of column names
+        self.cache = OrderedDict()  # normalized query -> (content type, body)
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def load(self, file_path, name=None, workers=1, **reader_options):
+        # type: (str, str, int, ...) -> str
+        """
+        Parses a csv file or memory-maps a file written by FileReader.save
+        :param file_path:
+        :param name: name the file is queried by (default: file name without extension)
+        :param workers: number of processes parsing the file
+        :param reader_options: further keyword arguments of FileReader (sep, columns, date_format, storage, ...)
+        :return: the name
+        """
+        name = name if name is not None else os.path.splitext(os.path.basename(file_path))[0]
+        if name in self.file_writers:
+            raise ValueError("A file named '%s' has already been loaded" % name)
+        with open(file_path, "rb") as file:
+            is_store = file.read(len(MAGIC)) == MAGIC
+        if is_store:
+            file_writer = FileWriter({})
+            file_writer.load(file_path)
+            columns = list(file_writer.container)
+        else:
+            file_reader = FileReader(file_path, **reader_options)
+            file_reader.read_file(workers)
+            file_writer = FileWriter(file_reader.container)
+            columns = file_reader.line_parser.get_column_names()
+        self.file_writers[name] = file_writer
+        self.columns[name] = columns
+        return name
+
+    def normalize(self, params):
+        # type: (dict) -> tuple
+        """
+        Validates the query parameters and fills in the defaults
+        :param params: dictionary of query parameters
+        :return: tuple (file, column, start, end, resolution, aggregation_type, fill, points, downsample, format_out,
+                 sep)
+        """
+        unknown = set(params) - set(QUERY_DEFAULTS) - {"file", "column"}
+        if unknown:
+            raise QueryError(400, "Unknown parameters: %s" % ", ".join(sorted(unknown)))
+        name = params.get("file")
+        if name is None:
+            if len(self.file_writers) != 1:
+                raise QueryError(400, "Several files are loaded, specify file")
+            name = next(iter(self.file_writers))
+        if name not in self.file_writers:
+            raise QueryError(404, "Unknown file: '%s'" % name)
+        column = params.get("column")
+        if column is None:
+            if len(self.columns[name]) != 1:
+                raise QueryError(400, "Several columns are loaded, specify column")
+            column = self.columns[name][0]
+        if column not in self.columns[name]:
+            raise QueryError(404, "Unknown column: '%s'" % column)
+        query = dict(QUERY_DEFAULTS)
+        query.update((key, value) for key, value in params.items() if key in QUERY_DEFAULTS)
+        if query["aggregation_type"] != "none":
+            try:  # normalized, so "mean, max" and "mean,max" share a cache entry
+                query["aggregation_type"] = ",".join(split_value_types(query["aggregation_type"]))
+            except AssertionError:
+                raise QueryError(400, "Invalid aggregation type: '%s'" % query["aggregation_type"])
+        if query["fill"] not in FILL_METHODS:
+            raise QueryError(400, "Invalid fill method: '%s'" % query["fill"])
+        try:
+            points = int(query["points"])
+        except ValueError:
+            raise QueryError(400, "Invalid number of points: '%s'" % query["points"])
+        if points != 0 and (points < 3 or query["downsample"] not in DOWNSAMPLE_METHODS):
+            raise QueryError(400, "Downsampling needs at least 3 points and one of the methods %s" %
+                             ", ".join(DOWNSAMPLE_METHODS))
+        if points != 0 and (query["aggregation_type"] != "none" or query["fill"] != "none"):
+            raise QueryError(400, "Downsampling works on the raw values, aggregation_type and fill cannot be used")
+        if query["format_out"] not in CONTENT_TYPES:
+            raise QueryError(400, "Invalid format: '%s'" % query["format_out"])
+        try:
+            resolution_width(query["resolution"])
+            start = FileWriter.string_to_datetime(query["start"])
+            end = FileWriter.string_to_datetime(query["end"])
+        except ValueError as e:
+            raise QueryError(400, str(e))
+        return (name, column, start, end, query["resolution"], query["aggregation_type"], query["fill"], points,
+                query["downsample"] if points else None, query["format_out"], query["sep"])
+
+    def compute(self, query):
+        # type: (tuple) -> (str, bytes)
+        """
+        :param query: normalized query
+        :return: tuple (content type, body)
+        """
+        name, column, start, end, resolution, aggregation_type, fill, points, method, output_format, sep = query
+        file_writer = self.file_writers[name]
+        try:
+            if points:
+                values = file_writer.downsample(file_writer.container[column], start, end, points, method)
+            else:
+                values = list(file_writer.iter_values(start, end, column, resolution, aggregation_type, fill))
+        except AssertionError as e:  # e.g. raw values of a streaming container
+            raise QueryError(400, str(e))
+        value_types = ("min", "max") if method == "minmax" else FileWriter.output_value_types(aggregation_type)
+        body = FileWriter.format_values(values, column, sep, output_format, value_types).encode("utf-8")
+        return CONTENT_TYPES[output_format], body
+
+    async def query(self, params):
+        # type: (dict) -> (str, bytes, bool)
+        """
+        Answers a query from the cache or computes it in the worker thread
+        :param params: dictionary of query parameters
+        :return: tuple (content type, body, whether it was a cache hit)
+        """
+        query = self.normalize(params)
+        result = self.cache.get(query)
+        if result is not None:
+            self.cache.move_to_end(query)
+            self.hits += 1
+            return result[0], result[1], True
+        self.misses += 1
+        result = await asyncio.get_running_loop().run_in_executor(self.executor, self.compute, query)
+        self.cache[query] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result[0], result[1], False
+
+    def describe(self):
+        # type: (None) -> bytes
+        """
+        :return: json body listing the loaded files, their columns and the cache statistics
+        """
+        return json.dumps({"files": self.columns, "cache": {"entries": len(self.cache), "size": self.cache_size,
+                                                            "hits": self.hits, "misses": self.misses}}).encode("utf-8")
+
+    async def handle_request(self, method, target):
+        # type: (str, str) -> (int, str, bytes, dict)
+        """
+        :param method: http method
+        :param target: request target (path and query string)
+        :return: tuple (status, content type, body, additional headers)
+        """
+        if method != "GET":
+            raise QueryError(405, "Only GET requests are supported")
+        url = urlsplit(target)
+        if url.path == "/files":
+            return 200, "application/json", self.describe(), {}
+        if url.path == "/query":
+            content_type, body, hit = await self.query(dict(parse_qsl(url.query, keep_blank_values=True)))
+            return 200, content_type, body, {"X-Cache": "hit" if hit else "miss"}
+        raise QueryError(404, "Unknown path: '%s'" % url.path)
+
+    async def handle_connection(self, reader, writer):
+        # type: (asyncio.StreamReader, asyncio.StreamWriter) -> None
+        """
+        Serves the http requests of one connection (keep-alive is supported)
+        :param reader:
+        :param writer:
+        :return:
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                request = lines[0].split(" ")
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        key, value = line.split(":", 1)
+                        headers[key.strip().lower()] = value.strip()
+                if len(request) != 3:
+                    status, content_type, body, extra = 400, "text/plain", b"Malformed request line", {}
+                else:
+                    try:
+                        status, content_type, body, extra = await self.handle_request(request[0], request[1])
+                    except QueryError as e:
+                        status, content_type, body, extra = e.status, "text/plain", str(e).encode("utf-8"), {}
+                keep_alive = (len(request) == 3 and request[2] == "HTTP/1.1" and
+                              headers.get("connection", "").lower() != "close")
+                response = ["HTTP/1.1 %d %s" % (status, STATUS_TEXT[status]), "Content-Type: " + content_type,
+                            "Content-Length: %d" % len(body), "Connection: " + ("keep-alive" if keep_alive else "close")]
+                response += ["%s: %s" % item for item in extra.items()]
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, unix_socket=None):
+        # type: (str, int, str) -> None
+        """
+        Serves until cancelled
+        :param host:
+        :param port:
+        :param unix_socket: path of a unix socket to listen on instead of host/ port
+        :return:
+        """
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def cli(argv):
+    _help = "Usage: server.py --<parameter>=<value> <file> [<file> ...] \n\n" \
+            "<file>     csv file to be parsed or file written by FileReader.save, queried by its name without extension\n\n" \
+            "--host=<address>     default 127.0.0.1\n\n" \
+            "--port=<number>     default 8080\n\n" \
+            "--socket=<path>     listen on a unix socket instead of host and port\n\n" \
+            "--cache_size=<number>     number of cached query results, default 256\n\n" \
+            "-c <colnames>     comma separated columns to be parsed, defaults to all\n\n" \
+            "--sep=<separator>     separator of the csv files \n\n" \
+            "--date_format=<format>     only specify if american date format is used -> 'US'\n\n" \
+            "--hour_format=<number>    12 or 24, is by default detected automatically\n\n" \
+            "--storage=<backend>     'tree' (default) or 'columnar'\n\n" \
+            "--workers=<number>     number of processes parsing a file\n\n" \
+            "Queries: GET /files, GET /query?file=<name>&column=<column>&start=<yyyy:mm:dd:hh:mm>&end=<yyyy:mm:dd:hh:mm>\n" \
+            "         &resolution=<resolution>&aggregation_type=<type>&fill=<none|na|ffill|linear>\n" \
+            "         &points=<number>&downsample=<lttb|minmax>&format_out=<csv|json|jsonl>"
+    try:
+        opts, args = getopt.getopt(argv, "hc:", ["host=", "port=", "socket=", "cache_size=", "sep=", "date_format=",
+                                                 "hour_format=", "storage=", "workers="])
+    except getopt.GetoptError as e:
+        print(e)
+        print(_help)
+        sys.exit(2)
+    options = dict(opts)
+    if "-h" in options or not args:
+        print(_help)
+        sys.exit(0 if "-h" in options else 2)
+    if options.get("--storage", "tree") not in ("tree", "columnar"):
+        print("Only the 'tree' and 'columnar' storage can be queried")
+        sys.exit(2)
+    columns = options.get("-c")
+    hour_format = options.get("--hour_format", "auto")
+    server = QueryServer(int(options.get("--cache_size", 256)))
+    for file_path in args:
+        name = server.load(file_path, workers=int(options.get("--workers", 1)), sep=options.get("--sep", ","),
+                           columns=columns.split(",") if columns is not None else None,
+                           hour_format=int(hour_format) if hour_format != "auto" else hour_format,
+                           date_format=options.get("--date_format", "auto"), storage=options.get("--storage", "tree"))
+        print("Loaded %s as '%s', columns: %s" % (file_path, name, ", ".join(server.columns[name])), file=sys.stderr)
+    address = options.get("--socket") or "http://%s:%s" % (options.get("--host", "127.0.0.1"),
+                                                           options.get("--port", 8080))
+    print("Serving on %s" % address, file=sys.stderr)
+    try:
+        asyncio.run(server.serve(options.get("--host", "127.0.0.1"), int(options.get("--port", 8080)),
+                                 options.get("--socket")))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    cli(sys.argv[1:])
@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Parser import FileReader  # noqa: E402
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """
+    Writes csv lines to a temporary file
+    :return: function (lines, name) -> path of the file
+    """
+    def write(lines, name="input.csv", newline="\n"):
+        path = tmp_path / name
+        with open(str(path), "w", newline="") as file:
+            file.write(newline.join(lines) + newline)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def read_csv():
+    """
+    Parses a csv file into a FileReader
+    :return: function (path, storage, **options) -> FileReader
+    """
+    def read(path, storage="tree", **options):
+        reader = FileReader(path, storage=storage, **options)
+        reader.read_file()
+        return reader
+    return read
@@ -0,0 +1,108 @@
+import math
+
+import pytest
+
+import Quarantine
+from Parser import FileReader
+from Quarantine import BadValueLog
+
+LINES = ["Date,a,b", "01.03.2017 10:00:00,1,2", "01.03.2017 10:00:30,NA,3", "01.03.2017 10:01:00,error,",
+         "01.03.2017 10:02:00,4,5"]
+
+
+def raw_values(reader, column):
+    return [value for day in reader.container[column].children for hour in day.children
+            for minute in hour.children for value in minute.children]
+
+
+def test_skip_policy_leaves_bad_fields_out(write_csv, read_csv):
+    reader = read_csv(write_csv(LINES))
+    assert raw_values(reader, "a") == [1.0, 4.0]
+    assert raw_values(reader, "b") == [2.0, 3.0, 5.0]
+    log = reader.line_parser.bad_value_log
+    assert log.counts == {"a": 2, "b": 1}
+    assert (len(log), log.lines) == (3, 2)
+    assert log.samples == ["01.03.2017 10:00:30,NA,3", "01.03.2017 10:01:00,error,"]
+
+
+def test_na_policy_stores_nan(write_csv, read_csv):
+    reader = read_csv(write_csv(LINES), bad_values="na")
+    values = raw_values(reader, "a")
+    assert values[0] == 1.0 and math.isnan(values[1]) and math.isnan(values[2]) and values[3] == 4.0
+
+
+def test_fail_policy_raises(write_csv, read_csv):
+    with pytest.raises(ValueError):
+        read_csv(write_csv(LINES), bad_values="fail")
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        BadValueLog("drop")
+
+
+def test_quarantine_holds_every_offending_line_once(write_csv, read_csv, tmp_path):
+    quarantine = str(tmp_path / "bad.csv")
+    read_csv(write_csv(LINES), quarantine=quarantine)
+    with open(quarantine) as file:
+        assert file.read().splitlines() == [LINES[0], LINES[2], LINES[3]]
+
+
+def test_line_with_several_bad_fields_is_recorded_once():
+    log = BadValueLog()
+    line = ["01.03.2017 10:00:00", "NA", "NA\n"]
+    log.add("a", line, ",")
+    log.add("b", line, ",")
+    assert (log.counts, log.lines, log.samples) == ({"a": 1, "b": 1}, 1, ["01.03.2017 10:00:00,NA,NA"])
+    log.forget()
+    log.add("a", line, ",")
+    assert (len(log), log.lines) == (3, 2)
+
+
+def test_quarantine_is_written_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(Quarantine, "QUARANTINE_BUFFER", 3)
+    quarantine = str(tmp_path / "bad.csv")
+    log = BadValueLog(quarantine=quarantine)
+    log.header = "Date,a\n"
+    for i in range(4):
+        log.add("a", ["01.03.2017 10:0%d:00" % i, "NA\n"], ",")
+        assert (tmp_path / "bad.csv").exists() == (i >= 2)
+    assert len(log.pending) == 1
+    log.flush()
+    with open(quarantine) as file:
+        assert file.read().splitlines() == ["Date,a"] + ["01.03.2017 10:0%d:00,NA" % i for i in range(4)]
+
+
+def test_forks_collect_and_are_merged(tmp_path):
+    quarantine = str(tmp_path / "bad.csv")
+    log = BadValueLog("na", quarantine, max_samples=3)
+    log.header = "Date,a"
+    log.add("a", ["01.03.2017 10:00:00", "NA"], ",")
+    fork = log.fork()
+    assert (fork.policy, fork.quarantine, len(fork), fork.is_writer) == ("na", quarantine, 0, False)
+    for i in range(1, 4):
+        fork.add("a", ["01.03.2017 10:0%d:00" % i, "x"], ",")
+    fork.add("b", ["01.03.2017 10:05:00", "y"], ",")
+    fork.flush()
+    assert not (tmp_path / "bad.csv").exists()
+    log.merge(fork)
+    assert (log.counts, log.lines) == ({"a": 4, "b": 1}, 5)
+    assert log.samples == ["01.03.2017 10:00:00,NA", "01.03.2017 10:01:00,x", "01.03.2017 10:02:00,x"]
+    log.flush()
+    with open(quarantine) as file:
+        assert len(file.read().splitlines()) == 6
+
+
+def test_parallel_parsing_quarantines_like_serial(write_csv, tmp_path):
+    lines = ["Date,a"] + ["01.03.2017 %02d:%02d:00,%s" % (i // 60, i % 60, "NA" if i % 7 == 0 else i)
+                          for i in range(600)]
+    path = write_csv(lines)
+    outputs = []
+    for workers in (1, 2):
+        quarantine = str(tmp_path / ("bad%d.csv" % workers))
+        reader = FileReader(path, quarantine=quarantine)
+        reader.read_file(workers)
+        assert len(reader.line_parser.bad_value_log) == 86
+        with open(quarantine) as file:
+            outputs.append(file.read())
+    assert outputs[0] == outputs[1]
@@ -0,0 +1,100 @@
+import datetime
+import json
+import math
+import random
+import struct
+import sys
+from array import array
+
+import pytest
+
+import DataStore
+from DataStore import load_store, save_store
+from Parser import FileWriter
+
+RANDOM = random.Random(3)
+ORIGIN = datetime.datetime(2017, 2, 26, 22, 41)
+# irregular samples over nine days (crossing a week boundary), bad values stored as nan
+SAMPLES = []
+offset = 0
+while offset < 9 * 86400:
+    SAMPLES.append((ORIGIN + datetime.timedelta(seconds=offset), "NA" if RANDOM.random() < 0.03 else
+                    round(RANDOM.uniform(-40, 60), 2), RANDOM.randrange(100)))
+    offset += RANDOM.choice([15, 40, 40, 130, 600, 5000])
+LINES = ["Date,temp,hum"] + [date.strftime("%d.%m.%Y %H:%M:%S") + ",%s,%s" % (temp, hum)
+                             for date, temp, hum in SAMPLES]
+START, END = datetime.datetime(2017, 1, 1), datetime.datetime(2018, 1, 1)
+RESOLUTIONS = ["minute", "hour", "day", "week", "15min", "2d"]
+VALUE_TYPES = "mean,min,max,count,sum,var,std,median,p95"
+
+
+def same(a, b, rel=0.0):
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(same(x, y, rel) for x, y in zip(a, b))
+    return a == b or isinstance(a, float) and (math.isnan(a) and math.isnan(b) or abs(a - b) <= rel * abs(a))
+
+
+def tolerance(reader):
+    # trees combine the variances of their nodes in another order than the columnar rollup
+    return 1e-12 if reader.line_parser._storage == "tree" else 0.0
+
+
+def dump(container):
+    writer = FileWriter(container)
+    result = {}
+    for name in ("temp", "hum"):
+        result[name, "none"] = writer.get_raw_values(container[name], START, END)
+        for resolution in RESOLUTIONS:
+            result[name, resolution] = writer.get_aggregated_values(container[name], START, END, resolution,
+                                                                    VALUE_TYPES)
+    return result
+
+
+@pytest.fixture(params=["tree", "columnar"])
+def reader(request, write_csv, read_csv):
+    return read_csv(write_csv(LINES), request.param, bad_values="na")
+
+
+def test_round_trip_keeps_every_resolution_and_value_type(reader, tmp_path):
+    path = str(tmp_path / "store.bin")
+    reader.save(path)
+    loaded = load_store(path)
+    assert all(container.name == "column" for container in loaded.values())
+    assert (loaded["temp"].type, loaded["temp"].sensor) == ("temp", reader.container["temp"].sensor)
+    expected, actual = dump(reader.container), dump(loaded)
+    assert set(actual) == set(expected)
+    for key in expected:
+        assert same(actual[key], expected[key], tolerance(reader)), key
+
+
+def test_foreign_byte_order_is_swapped(reader, tmp_path):
+    path = str(tmp_path / "store.bin")
+    save_store(reader.container, path)
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+    length = struct.unpack_from("<Q", data, len(DataStore.MAGIC))[0]
+    header_end = len(DataStore.MAGIC) + 8 + length
+    header = json.loads(data[len(DataStore.MAGIC) + 8:header_end].decode("utf-8"))
+    data_start = header_end + (-header_end % DataStore.ALIGNMENT)
+    for column in header["columns"].values():
+        for typecode, offset, size in column["arrays"].values():
+            swapped = array(typecode, data[data_start + offset:data_start + offset + size * 8])
+            swapped.byteswap()
+            data[data_start + offset:data_start + offset + size * 8] = swapped.tobytes()
+    foreign = "big" if sys.byteorder == "little" else "little"
+    data[len(DataStore.MAGIC) + 8:header_end] = json.dumps(dict(header, byteorder=foreign)).encode("utf-8").ljust(
+        length)
+    with open(path, "wb") as file:
+        file.write(data)
+    expected, actual = dump(reader.container), dump(load_store(path))
+    for key in expected:
+        assert same(actual[key], expected[key], tolerance(reader)), key
+
+
+def test_invalid_stores(read_csv, write_csv, tmp_path):
+    path = write_csv(LINES)
+    with pytest.raises(ValueError):
+        load_store(path)
+    stream = read_csv(path, "stream", resolution="hour")
+    with pytest.raises(AssertionError):
+        save_store(stream.container, str(tmp_path / "store.bin"))
@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+from Parser import FileWriter
+
+ORIGIN = datetime.datetime(2017, 3, 1)
+# three days with a value every 5 minutes and a spike every 4 hours
+MINUTES = list(range(0, 3 * 1440, 5))
+VALUES = [100.0 if minute % 240 == 0 else float(minute % 97) for minute in MINUTES]
+LINES = ["Date,temp"] + [(ORIGIN + datetime.timedelta(minutes=minute)).strftime("%d.%m.%Y %H:%M:%S") + ",%s" % value
+                         for minute, value in zip(MINUTES, VALUES)]
+START, END = datetime.datetime(2017, 3, 1, 13, 40), datetime.datetime(2017, 3, 3, 1, 52)
+
+
+@pytest.fixture(params=["tree", "columnar"])
+def container(request, write_csv, read_csv):
+    return read_csv(write_csv(LINES), request.param).container["temp"]
+
+
+def in_range():
+    return [(ORIGIN + datetime.timedelta(minutes=minute), value) for minute, value in zip(MINUTES, VALUES)
+            if START <= ORIGIN + datetime.timedelta(minutes=minute) <= END]
+
+
+@pytest.mark.parametrize("points", [5, 7, 100])
+def test_minmax_pixels_start_at_range(container, points):
+    pixels = FileWriter({}).downsample(container, START, END, points, "minmax")
+    rows = in_range()
+    first, last = rows[0][0], rows[-1][0]
+    width = pixels[1][0] - pixels[0][0]
+    assert pixels[0][0] == first
+    assert len(pixels) <= points
+    assert all(b[0] - a[0] == width for a, b in zip(pixels, pixels[1:]))
+    for k, (date, extremes) in enumerate(pixels):
+        values = [value for row_date, value in rows if date <= row_date < date + width]
+        assert extremes == (min(values), max(values))
+    assert pixels[-1][0] <= last < pixels[-1][0] + width
+
+
+@pytest.mark.parametrize("points", [5, 20, 60])
+def test_lttb_stays_within_range(container, points):
+    selected = FileWriter({}).downsample(container, START, END, points, "lttb")
+    rows = in_range()
+    assert 3 <= len(selected) <= points
+    assert selected[0][0] == rows[0][0]
+    assert all(START <= date <= END for date, value in selected)
+    assert all(min(value for _, value in rows) <= value <= max(value for _, value in rows) for _, value in selected)
+    assert [date for date, _ in selected] == sorted(date for date, _ in selected)
@@ -0,0 +1,21 @@
+import datetime
+import os
+
+import pytest
+
+from Parser import FileWriter
+
+numpy = pytest.importorskip("numpy")
+
+LINES = ["Date,temp"] + ["01.03.2017 10:%02d:00,%d" % (minute, minute) for minute in range(10)]
+
+
+def test_npz_is_written_to_the_given_path(write_csv, read_csv, tmp_path):
+    reader = read_csv(write_csv(LINES), "columnar")
+    path = str(tmp_path / "out.bin")
+    FileWriter(reader.container).write(path, "2017:03:01:10:00", "2017:03:01:11:00", "temp", ",", "minute", "mean",
+                                       "npz")
+    assert sorted(os.listdir(str(tmp_path))) == ["input.csv", "out.bin"]
+    with numpy.load(path) as arrays:
+        assert arrays["Date"][0] == numpy.datetime64(datetime.datetime(2017, 3, 1, 10))
+        assert arrays["temp"].tolist() == [float(minute) for minute in range(10)]
@@ -0,0 +1,62 @@
+import datetime
+import json
+
+import pytest
+
+from Parser import FileWriter
+
+# 10:00 - 10:02 and 10:06, with an "NA" field at 10:01
+LINES = ["Date,temp", "01.03.2017 10:00:00,1.0", "01.03.2017 10:00:30,3.0", "01.03.2017 10:01:00,NA",
+         "01.03.2017 10:02:00,4.0", "01.03.2017 10:06:00,8.0"]
+START, END = datetime.datetime(2017, 3, 1, 10, 2), datetime.datetime(2017, 3, 1, 11)
+
+
+@pytest.fixture
+def reader(write_csv, read_csv):
+    return read_csv(write_csv(LINES), bad_values="na")
+
+
+def load(path, output_format):
+    with open(path) as file:
+        if output_format == "json":
+            return json.load(file)
+        return [json.loads(line) for line in file]
+
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+@pytest.mark.parametrize("aggregate_type", ["none", "mean", "mean,max"])
+def test_json_output_with_nan_parses(reader, tmp_path, output_format, aggregate_type):
+    path = str(tmp_path / ("out." + output_format))
+    fill = "none" if aggregate_type == "none" else "na"
+    FileWriter(reader.container).write(path, "2017:03:01:10:00", "2017:03:01:11:00", "temp", ",", "minute",
+                                       aggregate_type, output_format, fill)
+    rows = load(path, output_format)
+    if aggregate_type == "none":
+        assert [row["Data"] for row in rows] == [[1.0, 3.0], [None], [4.0], [8.0]]
+    elif aggregate_type == "mean":
+        assert [row["Data"] for row in rows] == [2.0, None, 4.0, None, None, None, 8.0]
+    else:
+        assert rows[1]["Data"] == {"mean": None, "max": None}
+        assert rows[3]["Data"] == {"mean": None, "max": None}
+        assert rows[6]["Data"] == {"mean": 8.0, "max": 8.0}
+
+
+@pytest.mark.parametrize("fill", ["na", "ffill", "linear"])
+def test_gaps_have_no_count_and_sum(reader, fill):
+    rows = list(FileWriter(reader.container).iter_values(START, END, "temp", "minute",
+                                                         "count,sum,max", fill))
+    assert [date.minute for date, value in rows] == [2, 3, 4, 5, 6]
+    assert [value[:2] for date, value in rows] == [(1, 4.0), (0, 0), (0, 0), (0, 0), (1, 8.0)]
+    maxima = [value[2] for date, value in rows[1:4]]
+    if fill == "ffill":
+        assert maxima == [4.0, 4.0, 4.0]
+    elif fill == "linear":
+        assert maxima == [5.0, 6.0, 7.0]
+    else:
+        assert all(value != value for value in maxima)
+
+
+def test_single_count_gaps_are_zero(reader):
+    rows = list(FileWriter(reader.container).iter_values(START, END, "temp", "minute",
+                                                         "count", "linear"))
+    assert [value for date, value in rows] == [1, 0, 0, 0, 1]
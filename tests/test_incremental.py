@@ -0,0 +1,131 @@
+import datetime
+import os
+
+import pytest
+
+import main
+from main import ParseController
+from Parser import FileReader, FileWriter
+
+ORIGIN = datetime.datetime(2017, 3, 1, 9, 52)
+# a line every 40 seconds over three hours, every 13th value is missing
+LINES = ["Date,temp"] + [(ORIGIN + datetime.timedelta(seconds=40 * i)).strftime("%d.%m.%Y %H:%M:%S") +
+                         ",%s" % ("NA" if i % 13 == 0 else i % 17 - 8) for i in range(270)]
+DATA = "\n".join(LINES) + "\n"
+# cuts in the middle of lines, at line ends, within and across buckets, repeated ones (nothing new)
+CUTS = [5, 40, 300, 301, 2500, 2500, 6100, 9000, len(DATA)]
+
+
+def run(tmp_path, storage, output_format, resolution, **options):
+    settings = dict(main.settings, **{"-i": str(tmp_path / "input.csv"), "-o": str(tmp_path / "out.txt"),
+                                      "--storage": storage, "--format_out": output_format, "--resolution": resolution,
+                                      "--aggregation_type": "none" if resolution == "minute" else "mean,min,max"})
+    settings.update(options)
+    ParseController(settings).main()
+    with open(settings["-o"]) as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+@pytest.mark.parametrize("output_format", ["csv", "json", "jsonl"])
+@pytest.mark.parametrize("resolution", ["minute", "hour", "15min"])
+def test_growing_file_keeps_earlier_buckets(tmp_path, storage, output_format, resolution):
+    state = str(tmp_path / "state")
+    runs = 0
+    for cut in CUTS:
+        with open(str(tmp_path / "input.csv"), "w") as file:
+            file.write(DATA[:cut])
+        if DATA[:cut].count("\n") < 2:  # no complete line yet
+            continue
+        output = run(tmp_path, storage, output_format, resolution, **{"--state": state})
+        with open(str(tmp_path / "complete.csv"), "w") as file:
+            file.write(DATA[:DATA.rindex("\n", 0, cut) + 1])
+        assert output == run(tmp_path, storage, output_format, resolution, **{"-i": str(tmp_path / "complete.csv"),
+                                                                            "-o": str(tmp_path / "full.txt")})
+        runs += 1
+    assert runs == 8
+
+
+def test_cli_rejects_compressed_output(monkeypatch):
+    monkeypatch.setattr(main, "settings", dict(main.settings))
+    with pytest.raises(SystemExit) as exit_info:
+        main.cli(["-i", "input.csv", "-o", "out.csv.gz", "--state=state"])
+    assert exit_info.value.code == 2
+
+
+def aggregates(reader):
+    writer = FileWriter(reader.container)
+    start, end = datetime.datetime(2017, 1, 1), datetime.datetime(2018, 1, 1)
+    return {resolution: writer.get_aggregated_values(reader.container["temp"], start, end, resolution, "mean,min,max")
+            for resolution in ("minute", "hour", "day", "15min")}
+
+
+def write_input(path, cut):
+    with open(path, "w") as file:
+        file.write(DATA[:cut])
+
+
+def first_new_time(previous_cut, cut):
+    """timestamp of the first complete line between the ends of previous_cut and cut, None if there is none"""
+    start = max(DATA.rfind("\n", 0, previous_cut) + 1, len(LINES[0]) + 1)
+    end = DATA.rfind("\n", 0, cut) + 1
+    if end <= start:
+        return None
+    return datetime.datetime.strptime(DATA[start:DATA.index(",", start)], "%d.%m.%Y %H:%M:%S").replace(second=0)
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+def test_new_lines_extend_the_containers(tmp_path, storage):
+    path = str(tmp_path / "input.csv")
+    reader = FileReader(path, storage=storage)
+    previous_cut = 0
+    for cut in CUTS:
+        write_input(path, cut)
+        assert reader.read_new_lines() == first_new_time(previous_cut, cut)
+        if reader.container:
+            aggregates(reader)  # fills the cached aggregates of the last nodes, invalidated by the next call
+        previous_cut = max(previous_cut, cut)
+    full = FileReader(path, storage=storage)
+    full.read_file()
+    assert aggregates(reader) == aggregates(full)
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+def test_saved_state_holds_only_the_open_bucket(tmp_path, storage):
+    path, state = str(tmp_path / "input.csv"), str(tmp_path / "state")
+    previous_cut = 0
+    for cut in CUTS:
+        write_input(path, cut)
+        reader = FileReader(path, storage=storage)
+        if os.path.exists(state):
+            assert reader.load_state(state, "hour") == (previous_cut >= 40)
+        assert reader.read_new_lines() == first_new_time(previous_cut, cut)
+        reader.save_state(state, "hour")
+        assert os.path.getsize(state) < 2000  # at most one hour of minutes (90 lines)
+        previous_cut = max(previous_cut, cut)
+    full = FileReader(path, storage=storage)
+    full.read_file()
+    last_hour = datetime.datetime(2017, 3, 1, 12)
+    assert [row for row in aggregates(reader)["minute"] if row[0] >= last_hour] == \
+        [row for row in aggregates(full)["minute"] if row[0] >= last_hour]
+    with pytest.raises(ValueError):
+        FileReader(path, storage=storage).load_state(state, "day")
+    assert FileReader(path, storage=storage).load_state(state, "15min")
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+def test_shortened_or_replaced_file_is_read_again(tmp_path, storage):
+    path, state = str(tmp_path / "input.csv"), str(tmp_path / "state")
+    write_input(path, 6100)
+    reader = FileReader(path, storage=storage)
+    reader.read_new_lines()
+    reader.save_state(state)
+    write_input(path, DATA.rindex("\n", 0, 2500) + 1)
+    assert not FileReader(path, storage=storage).load_state(state)
+    assert reader.read_new_lines() == ORIGIN
+    full = FileReader(path, storage=storage)
+    full.read_file()
+    assert aggregates(reader) == aggregates(full)
+    with open(path, "w") as file:  # longer, but with another first line
+        file.write(DATA.replace("09:52:00,NA", "09:52:00,1"))
+    assert not FileReader(path, storage=storage).load_state(state)
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import main
+from main import ParseController
+
+LINES = ["Date,a,b", "01.01.2017 00:00:00,1,10", "01.01.2017 12:00:00,3,30", "02.01.2017 00:03:00,4,40"]
+
+
+def run(write_csv, **options):
+    settings = dict(main.settings, **{"-i": write_csv(LINES), "--aggregation_type": "mean", "--resolution": "day",
+                                      "--format_out": "json"})
+    settings.update(options)
+    ParseController(settings).main()
+
+
+@pytest.mark.parametrize("output_file, expected", [("out.csv", "out_a.csv"), ("out.csv.gz", "out_a.csv.gz"),
+                                                   ("dir/out.json.bz2", "dir/out_a.json.bz2"), ("out", "out_a"),
+                                                   ("out.xz", "out_a.xz")])
+def test_column_output_paths_keep_the_extensions(output_file, expected):
+    assert ParseController.output_path(output_file, "a", 2) == expected
+    assert ParseController.output_path(output_file, "a", 1) == output_file
+
+
+def test_batch_input_detection(tmp_path):
+    assert ParseController.is_batch_input(str(tmp_path))
+    assert ParseController.is_batch_input("data/*.csv")
+    assert ParseController.is_batch_input("data/day_?.csv")
+    assert ParseController.is_batch_input("data/day_[12].csv")
+    assert not ParseController.is_batch_input(str(tmp_path / "input.csv"))
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar", "stream"])
+def test_stdout_takes_a_single_column(write_csv, capsys, storage):
+    run(write_csv, **{"-o": "-", "-c": "b", "--storage": storage})
+    rows = json.loads(capsys.readouterr().out)
+    assert rows == [{"Date": "2017-01-01 00:00:00", "Data": 20.0}, {"Date": "2017-01-02 00:00:00", "Data": 40.0}]
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar", "stream"])
+def test_several_columns_are_not_mixed_on_stdout(write_csv, capsys, storage):
+    with pytest.raises(ValueError):
+        run(write_csv, **{"-o": "-", "-c": None, "--storage": storage})
+    assert capsys.readouterr().out == ""
+
+
+def test_cli_rejects_several_columns_on_stdout(monkeypatch):
+    monkeypatch.setattr(main, "settings", dict(main.settings))
+    with pytest.raises(SystemExit) as exit_info:
+        main.cli(["-i", "input.csv", "-o", "-", "-c", "a,b", "--aggregation_type=mean"])
+    assert exit_info.value.code == 2
@@ -0,0 +1,66 @@
+import datetime
+import math
+
+import pytest
+
+from Parser import FileWriter
+
+START, END = datetime.datetime(1980, 1, 1), datetime.datetime(2050, 1, 1)
+# "NA" first, in the middle and last within a minute, a minute and a whole hour holding only "NA"
+FIELDS = [("10:00:00", "NA"), ("10:00:20", "5"), ("10:00:40", "-2"),
+          ("10:01:00", "7"), ("10:01:20", "NA"), ("10:01:40", "3"),
+          ("10:02:00", "4"), ("10:02:30", "NA"),
+          ("10:03:00", "NA"),
+          ("11:05:00", "NA"), ("11:06:00", "NA"),
+          ("12:00:00", "1")]
+LINES = ["Date,temp"] + ["01.03.2017 %s,%s" % field for field in FIELDS]
+WIDTHS = {"minute": 1, "hour": 60, "day": 1440, "15min": 15, "2h": 120}
+
+
+def expected(resolution, value_type):
+    buckets = {}
+    for time, value in FIELDS:
+        date = datetime.datetime.strptime("2017-03-01 " + time, "%Y-%m-%d %H:%M:%S")
+        minute = (date.hour * 60 + date.minute) // WIDTHS[resolution] * WIDTHS[resolution]
+        key = datetime.datetime(2017, 3, 1) + datetime.timedelta(minutes=minute)
+        buckets.setdefault(key, [])
+        if value != "NA":
+            buckets[key].append(float(value))
+    function = min if value_type == "min" else max
+    return [(date, function(values) if values else float("nan")) for date, values in sorted(buckets.items())]
+
+
+def same(values, expected_values):
+    return len(values) == len(expected_values) and all(
+        date == expected_date and (value == expected_value or math.isnan(value) and math.isnan(expected_value))
+        for (date, value), (expected_date, expected_value) in zip(values, expected_values))
+
+
+@pytest.fixture
+def path(write_csv):
+    return write_csv(LINES)
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar", "stored tree", "stored columnar"])
+@pytest.mark.parametrize("resolution", sorted(WIDTHS))
+@pytest.mark.parametrize("value_type", ["min", "max"])
+def test_extremes_leave_nan_out(path, read_csv, tmp_path, storage, resolution, value_type):
+    reader = read_csv(path, storage.split()[-1], bad_values="na")
+    container = reader.container
+    if storage.startswith("stored"):
+        reader.save(str(tmp_path / "store.bin"))
+        writer = FileWriter(None)
+        writer.load(str(tmp_path / "store.bin"))
+        container = writer.container
+    values = FileWriter(container).get_aggregated_values(container["temp"], START, END, resolution, value_type)
+    assert same(values, expected(resolution, value_type))
+
+
+@pytest.mark.parametrize("resolution", sorted(WIDTHS))
+@pytest.mark.parametrize("value_type", ["min", "max"])
+@pytest.mark.parametrize("summaries", ["mean", "count"])
+def test_stream_extremes_leave_nan_out(path, read_csv, resolution, value_type, summaries):
+    reader = read_csv(path, "stream", bad_values="na", resolution=resolution, value_type=summaries)
+    values = FileWriter(reader.container).get_aggregated_values(reader.container["temp"], START, END, resolution,
+                                                                value_type)
+    assert same(values, expected(resolution, value_type))
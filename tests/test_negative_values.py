@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+
+from Parser import FileWriter
+
+START, END = datetime.datetime(1980, 1, 1), datetime.datetime(2050, 1, 1)
+# two days of all negative values, the max of every bucket is -3 or less
+LINES = ["Date,temp"] + ["%02d.03.2017 %02d:%02d:00,%d" % (day, hour, minute, -3 - (minute % 7))
+                         for day in (1, 2) for hour in (0, 5, 23) for minute in (0, 10, 59)]
+
+
+@pytest.fixture
+def path(write_csv):
+    return write_csv(LINES)
+
+
+def expected(resolution, value_type):
+    buckets = {}
+    for line in LINES[1:]:
+        date, value = line.split(",")
+        date = datetime.datetime.strptime(date, "%d.%m.%Y %H:%M:%S")
+        if resolution == "hour":
+            date = date.replace(minute=0)
+        elif resolution == "day":
+            date = date.replace(hour=0, minute=0)
+        buckets.setdefault(date, []).append(float(value))
+    function = max if value_type == "max" else min
+    return [(date, function(values)) for date, values in sorted(buckets.items())]
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+@pytest.mark.parametrize("resolution", ["minute", "hour", "day"])
+@pytest.mark.parametrize("value_type", ["min", "max"])
+def test_extremes_of_negative_values(path, read_csv, storage, resolution, value_type):
+    reader = read_csv(path, storage)
+    values = FileWriter(reader.container).get_aggregated_values(reader.container["temp"], START, END, resolution,
+                                                                value_type)
+    assert values == expected(resolution, value_type)
+
+
+@pytest.mark.parametrize("resolution", ["minute", "hour", "day"])
+@pytest.mark.parametrize("value_type", ["min", "max"])
+def test_extremes_of_negative_values_stream(path, read_csv, resolution, value_type):
+    reader = read_csv(path, "stream", resolution=resolution)
+    assert reader.container["temp"].get_aggregated_values(START, END, resolution, value_type) == \
+        expected(resolution, value_type)
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+def test_rollup_max_of_negative_values(path, read_csv, storage):
+    reader = read_csv(path, storage)
+    values = FileWriter(reader.container).get_aggregated_values(reader.container["temp"], START, END, "6h", "max")
+    assert all(value <= -3 for _, value in values)
+    assert max(value for _, value in values) == -3
+
+
+def test_stored_max_of_negative_values(path, read_csv, tmp_path):
+    reader = read_csv(path, "columnar")
+    reader.save(str(tmp_path / "store.bin"))
+    writer = FileWriter(None)
+    writer.load(str(tmp_path / "store.bin"))
+    assert writer.get_aggregated_values(writer.container["temp"], START, END, "day", "max") == expected("day", "max")
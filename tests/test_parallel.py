@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+
+import Parser
+from Parser import FileReader, FileWriter
+
+ORIGIN = datetime.datetime(2017, 3, 1, 21, 30)
+# a line every 7 seconds over a day boundary, so most chunk boundaries fall within a minute (and some within the
+# last line of an hour or day), several bad values and a value with a unit
+LINES = ["Date,temp,hum"] + [(ORIGIN + datetime.timedelta(seconds=7 * i)).strftime("%d.%m.%Y %H:%M:%S") +
+                             ",%s,%s" % ("NA" if i % 31 == 0 else i % 43 - 21, "" if i % 37 == 0 else "%d%%" % (i % 9))
+                             for i in range(2000)]
+START, END = datetime.datetime(2017, 1, 1), datetime.datetime(2018, 1, 1)
+
+
+def structure(container):
+    if container.name == "column":
+        return list(container.keys), list(container.offsets), list(container.values)
+    return [(day.date, [(hour.date, [(minute.date, minute.children) for minute in hour.children])
+                        for hour in day.children]) for day in container.children]
+
+
+def dump(reader):
+    writer = FileWriter(reader.container)
+    return {name: [structure(container)] + [
+        writer.get_aggregated_values(container, START, END, resolution, "mean,min,max,count")
+        for resolution in ("hour", "day", "15min")] for name, container in reader.container.items() if name != "Date"}
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("final_newline", [True, False])
+def test_parallel_parsing_matches_serial(tmp_path, monkeypatch, storage, newline, final_newline):
+    path = str(tmp_path / "input.csv")
+    with open(path, "w", newline="") as file:
+        file.write(newline.join(LINES) + (newline if final_newline else ""))
+    monkeypatch.setattr(Parser, "MIN_CHUNK_SIZE", 997)  # dozens of chunks
+    serial = FileReader(path, storage=storage)
+    serial.read_file()
+    parallel = FileReader(path, storage=storage)
+    parallel.read_file(3)
+    assert dump(parallel) == dump(serial)
+    assert len(parallel.line_parser.bad_value_log) == len(serial.line_parser.bad_value_log) == 65 + 55
+
+
+def test_chunks_start_at_line_starts(tmp_path, monkeypatch):
+    monkeypatch.setattr(Parser, "MIN_CHUNK_SIZE", 1)
+    path = str(tmp_path / "input.csv")
+    with open(path, "w", newline="") as file:
+        file.write("\r\n".join(LINES) + "\r\n")
+    with open(path, "rb") as file:
+        data = file.read()
+        start = data.index(b"\n") + 1
+        ranges = FileReader.split_file(file, start, len(data), 40)
+    assert 35 <= len(ranges) <= 41
+    assert ranges[0][0] == start and ranges[-1][1] == len(data)
+    assert all(end == next_start and data[next_start - 1:next_start] == b"\n"
+               for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
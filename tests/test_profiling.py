@@ -0,0 +1,28 @@
+from Parser import FileReader
+
+LINES = ["Date,temp,hum"] + ["01.03.2017 10:%02d:00,%d,%d" % (minute, minute, 2 * minute) for minute in range(60)]
+
+
+def test_bulk_conversion_is_timed_as_extract_values(write_csv):
+    reader = FileReader(write_csv(LINES))
+    stats = reader.profile()
+    reader.read_file()
+    assert stats.calls["extract_values"] > 0
+    assert stats.counters["values"] == 120
+
+
+# stage -> stage its time is part of
+PARENTS = {"parse_lines": "read_file", "extract_timestamp": "parse_lines", "extract_values": "parse_lines",
+           "insert_value": "parse_lines"}
+
+
+def test_stage_times_do_not_exceed_their_parent(write_csv):
+    lines = ["Date,temp,hum"] + ["%02d.03.2017 %02d:%02d:%02d,%s,%d" % (1 + i // 4320, i // 180 % 24, i // 3 % 60,
+                                                                      i % 3 * 20, "x" if i % 50 == 0 else i, i)
+                                 for i in range(3000)]
+    reader = FileReader(write_csv(lines))
+    stats = reader.profile()
+    reader.read_file()
+    for stage, parent in PARENTS.items():
+        assert stats.seconds[stage] <= stats.seconds[parent]
+    assert stats.calls["insert_value"] == 2 * 1000  # first value of a column per minute, recursion not counted
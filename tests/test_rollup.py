@@ -0,0 +1,106 @@
+import datetime
+import math
+import random
+
+import pytest
+
+from DataAggregator import DIRECT_SUM_ENTRIES, ColumnContainer, datetime_to_minute
+from Parser import FileReader, FileWriter
+
+EPOCH = datetime.datetime(1970, 1, 1)
+ORIGIN = datetime.datetime(2017, 3, 1, 7, 13)
+RANDOM = random.Random(11)
+# ten days of irregular samples, up to three per minute, with gaps of up to a few hours
+SAMPLES = []
+offset = 0
+while offset < 10 * 86400:
+    SAMPLES.append((ORIGIN + datetime.timedelta(seconds=offset), round(RANDOM.uniform(-50, 50), 3)))
+    offset += RANDOM.choice([20, 20, 45, 300, 900, 7200])
+LINES = ["Date,temp"] + [date.strftime("%d.%m.%Y %H:%M:%S") + ",%s" % value for date, value in SAMPLES]
+START, END = datetime.datetime(2017, 2, 1), datetime.datetime(2017, 4, 1)
+WIDTHS = {"15min": 15, "45min": 45, "6h": 360, "5h": 300, "2d": 2880, "1w": 10080}
+
+
+def mean(values):
+    return sum(values) / len(values)
+
+
+def brute_force(width, value_type):
+    minutes = {}
+    for date, value in SAMPLES:
+        minutes.setdefault(date.replace(second=0), []).append(value)
+    # nested means: hours of minute means, days of hour means
+    levels = {1: {date: mean(values) for date, values in minutes.items()}}
+    for level, finer in ((60, 1), (1440, 60)):
+        groups = {}
+        for date, value in levels[finer].items():
+            groups.setdefault(date.replace(minute=0) if level == 60 else date.replace(hour=0, minute=0),
+                              []).append(value)
+        levels[level] = {date: mean(values) for date, values in groups.items()}
+    level = max(level for level in levels if width % level == 0)
+
+    def bucket(date):
+        if width == 10080:  # weeks start on mondays
+            return (date - datetime.timedelta(days=date.weekday())).replace(hour=0, minute=0)
+        minute = int((date - EPOCH).total_seconds() // 60)
+        return EPOCH + datetime.timedelta(minutes=minute - minute % width)
+
+    buckets = {}
+    if value_type == "mean":
+        for date, value in levels[level].items():
+            buckets.setdefault(bucket(date), []).append(value)
+        return [(date, mean(values)) for date, values in sorted(buckets.items())]
+    for date, value in SAMPLES:
+        buckets.setdefault(bucket(date.replace(second=0)), []).append(value)
+    function = min if value_type == "min" else max
+    return [(date, function(values)) for date, values in sorted(buckets.items())]
+
+
+@pytest.fixture(params=["tree", "columnar"], scope="module")
+def container(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp("rollup") / "input.csv"
+    path.write_text("\n".join(LINES) + "\n")
+    reader = FileReader(str(path), storage=request.param)
+    reader.read_file()
+    return reader.container["temp"]
+
+
+@pytest.mark.parametrize("resolution", sorted(WIDTHS))
+@pytest.mark.parametrize("value_type", ["mean", "min", "max"])
+def test_rollup_matches_brute_force(container, resolution, value_type):
+    values = FileWriter({}).get_aggregated_values(container, START, END, resolution, value_type)
+    expected = brute_force(WIDTHS[resolution], value_type)
+    assert [date for date, value in values] == [date for date, value in expected]
+    assert [value for date, value in values] == pytest.approx([value for date, value in expected], rel=1e-9)
+
+
+def test_partial_range_keeps_whole_edge_buckets(container):
+    start, end = datetime.datetime(2017, 3, 3, 10, 20), datetime.datetime(2017, 3, 5, 3, 10)
+    values = FileWriter({}).get_aggregated_values(container, start, end, "6h", "max")
+    expected = [(date, value) for date, value in brute_force(360, "max")
+                if datetime.datetime(2017, 3, 3, 6) <= date <= datetime.datetime(2017, 3, 5)]
+    assert values == expected
+
+
+@pytest.fixture(scope="module")
+def constant():
+    # thirty days of the same value every minute, its prefix sums grow far beyond the sum of a bucket
+    container = ColumnContainer(_type="temp")
+    first = datetime_to_minute(datetime.datetime(2016, 1, 1))
+    for key in range(first, first + 30 * 1440):
+        container.add_value(key, [1000000.1])
+    return FileWriter({}), container
+
+
+@pytest.mark.parametrize("resolution, value_type", [("15min", "mean"), ("15min", "sum"), ("90min", "sum"),
+                                                    ("1000min", "mean"), ("1000min", "sum")])
+def test_constant_buckets_do_not_drift(constant, resolution, value_type):
+    writer, container = constant
+    width = WIDTHS.get(resolution) or int(resolution[:-3])
+    expected = math.fsum([1000000.1] * width) / (width if value_type == "mean" else 1)
+    values = writer.get_aggregated_values(container, START - datetime.timedelta(days=400), END, resolution, value_type)
+    assert all(value == pytest.approx(expected, rel=1e-15) for date, value in values[1:-1])
+    if width <= DIRECT_SUM_ENTRIES:  # short buckets are exact, wherever they are and wherever the range starts
+        assert set(value for date, value in values[1:-1]) == {expected}
+        date, value = values[-2]
+        assert writer.get_aggregated_values(container, date, END, resolution, value_type)[0] == (date, value)
@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from Parser import FileWriter
+from server import QueryServer
+
+ORIGIN = datetime.datetime(2017, 3, 1)
+# two days with a line every 3 minutes
+LINES = ["Date,temp,hum"] + [(ORIGIN + datetime.timedelta(minutes=3 * i)).strftime("%d.%m.%Y %H:%M:%S") +
+                             ",%d,%d" % (i % 23 - 11, i % 7) for i in range(960)]
+START, END = datetime.datetime(1980, 10, 10, 10, 10), datetime.datetime(2050, 10, 10, 10, 10)
+
+
+class Writer(object):
+    """collects what handle_connection writes to the connection"""
+    def __init__(self):
+        self.data = b""
+        self.is_closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.is_closed = True
+
+
+def request(target, method="GET", version="HTTP/1.1", headers=()):
+    return ("%s %s %s\r\n%s\r\n" % (method, target, version, "".join("%s: %s\r\n" % item for item in headers))).encode(
+        "latin-1")
+
+
+def exchange(server, *requests):
+    """
+    feeds the requests to one connection
+    :return: list of (status, headers, body) of the responses
+    """
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"".join(requests))
+        reader.feed_eof()
+        writer = Writer()
+        await server.handle_connection(reader, writer)
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.is_closed
+    responses, data = [], writer.data
+    while data:
+        head, data = data.split(b"\r\n\r\n", 1)
+        lines = head.decode("latin-1").split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        length = int(headers["Content-Length"])
+        responses.append((int(lines[0].split(" ")[1]), headers, data[:length]))
+        data = data[length:]
+    return responses
+
+
+@pytest.fixture
+def server(write_csv, read_csv, tmp_path):
+    path = write_csv(LINES, "weather.csv")
+    server = QueryServer(cache_size=2)
+    server.load(path)
+    read_csv(path, "columnar").save(str(tmp_path / "stored.bin"))
+    server.load(str(tmp_path / "stored.bin"), storage="columnar")
+    return server
+
+
+@pytest.mark.parametrize("target, status", [
+    ("/query?column=temp", 400),  # several files
+    ("/query?file=weather", 400),  # several columns
+    ("/query?file=weather&column=temp&colour=red", 400),
+    ("/query?file=weather&column=temp&aggregation_type=avg", 400),
+    ("/query?file=weather&column=temp&fill=zero", 400),
+    ("/query?file=weather&column=temp&points=x", 400),
+    ("/query?file=weather&column=temp&points=2", 400),
+    ("/query?file=weather&column=temp&points=10&downsample=mean", 400),
+    ("/query?file=weather&column=temp&points=10&aggregation_type=mean", 400),
+    ("/query?file=weather&column=temp&format_out=xml", 400),
+    ("/query?file=weather&column=temp&resolution=7x", 400),
+    ("/query?file=weather&column=temp&start=2017:13:01", 400),
+    ("/query?file=rain&column=temp", 404),
+    ("/query?file=weather&column=wind", 404),
+    ("/metrics", 404)])
+def test_invalid_queries(server, target, status):
+    [(response_status, headers, body)] = exchange(server, request(target))
+    assert response_status == status and headers["Content-Type"] == "text/plain" and body
+    assert server.misses == 0
+
+
+def test_malformed_requests(server):
+    assert [response[0] for response in exchange(server, request("/files", "POST"), b"GET /files\r\n\r\n")] == [
+        405, 400]
+
+
+@pytest.mark.parametrize("name", ["weather", "stored"])
+def test_query_matches_file_writer(server, name):
+    target = "/query?file=%s&column=hum&resolution=2h&aggregation_type=mean,%%20max&format_out=json" % name
+    [(status, headers, body)] = exchange(server, request(target))
+    assert (status, headers["Content-Type"], headers["X-Cache"]) == (200, "application/json", "miss")
+    writer = server.file_writers[name]
+    values = list(writer.iter_values(START, END, "hum", "2h", "mean,max"))
+    assert json.loads(body) == json.loads(FileWriter.format_json(values, "hum", ",", ("mean", "max")))
+
+
+def test_cache_hits_and_eviction(server):
+    targets = ["/query?file=weather&column=temp&resolution=hour&aggregation_type=mean,max",
+               "/query?file=weather&column=temp&resolution=hour&aggregation_type=mean,%20max",  # same normalized query
+               "/query?file=weather&column=temp&resolution=day&aggregation_type=mean",
+               "/query?file=weather&column=temp&resolution=day&aggregation_type=mean&format_out=jsonl",
+               "/query?file=weather&column=temp&resolution=hour&aggregation_type=mean,max"]  # evicted (size 2)
+    responses = exchange(server, *[request(target) for target in targets])
+    assert [headers["X-Cache"] for status, headers, body in responses] == ["miss", "hit", "miss", "miss", "miss"]
+    assert responses[0][2] == responses[1][2] == responses[4][2]
+    [(status, headers, body)] = exchange(server, request("/files"))
+    description = json.loads(body)
+    assert description["files"]["weather"] == ["temp", "hum"]
+    assert description["cache"] == {"entries": 2, "size": 2, "hits": 1, "misses": 4}
+
+
+@pytest.mark.parametrize("version, headers, answered", [("HTTP/1.1", (), 3), ("HTTP/1.0", (), 1),
+                                                        ("HTTP/1.1", (("Connection", "close"),), 1)])
+def test_keep_alive(server, version, headers, answered):
+    responses = exchange(server, *[request("/files", version=version, headers=headers)] * 3)
+    assert len(responses) == answered
+    assert responses[-1][1]["Connection"] == ("keep-alive" if answered == 3 else "close")
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_query(server, method):
+    target = "/query?file=weather&column=temp&start=2017:03:01:06:00&end=2017:03:02:06:00&points=20&downsample=" + \
+             method
+    [(status, headers, body)] = exchange(server, request(target))
+    assert status == 200
+    rows = body.decode("utf-8").splitlines()
+    assert rows[0] == ("Date, temp" if method == "lttb" else "Date, temp_min, temp_max")
+    writer = server.file_writers["weather"]
+    expected = writer.downsample(writer.container["temp"], datetime.datetime(2017, 3, 1, 6),
+                                 datetime.datetime(2017, 3, 2, 6), 20, method)
+    assert 3 <= len(rows) - 1 == len(expected) <= 20
+    assert rows[1].startswith(str(expected[0][0]))
@@ -0,0 +1,82 @@
+import datetime
+import os
+import random
+from functools import partial
+
+import pytest
+
+import Parser
+from Parser import FileReader, FileWriter
+from Sorting import reorder_lines, sort_lines
+
+RANDOM = random.Random(5)
+ORIGIN = datetime.datetime(2017, 3, 1)
+# a line every 25 seconds over a day, several lines per minute
+TIMES = [ORIGIN + datetime.timedelta(seconds=25 * i) for i in range(3456)]
+START, END = datetime.datetime(2017, 1, 1), datetime.datetime(2018, 1, 1)
+
+
+def minute(line):
+    return int(line.split(",")[0])
+
+
+def shuffled(lines, block):
+    """shuffles the lines within consecutive blocks, no line moves further than block - 1 positions"""
+    result = []
+    for i in range(0, len(lines), block):
+        chunk = lines[i:i + block]
+        RANDOM.shuffle(chunk)
+        result += chunk
+    return result
+
+
+# several lines per minute, tagged with their position to check the order within a minute
+LINES = ["%d,%d\n" % (RANDOM.randrange(-50, 150), i) for i in range(500)]
+
+
+@pytest.mark.parametrize("capacity", [1, 4, 30])
+def test_reorder_buffer_is_stable(capacity):
+    lines = shuffled(sorted(LINES, key=minute), capacity + 1)
+    assert list(reorder_lines(lines, minute, capacity)) == sorted(lines, key=minute)
+
+
+def test_reorder_buffer_overflow_raises():
+    lines = sorted(LINES, key=minute)
+    lines.insert(300, lines.pop(0))
+    with pytest.raises(ValueError):
+        list(reorder_lines(lines, minute, 100))
+    assert list(reorder_lines(lines, minute, 300)) == sorted(lines, key=minute)
+
+
+@pytest.mark.parametrize("run_lines", [1, 7, 499, 500, 501, 10000])
+def test_external_sort_is_stable(tmp_path, run_lines):
+    lines = LINES[:-1] + [LINES[-1].rstrip("\n")]  # the last line of a file may lack its newline
+    result = list(sort_lines(lines, minute, run_lines, str(tmp_path)))
+    assert [line.rstrip("\n") for line in result] == [line.rstrip("\n") for line in sorted(lines, key=minute)]
+    assert os.listdir(str(tmp_path)) == []  # run files are removed
+
+
+def dump(reader):
+    writer = FileWriter(reader.container)
+    return [writer.get_raw_values(reader.container["temp"], START, END)] + [
+        writer.get_aggregated_values(reader.container["temp"], START, END, resolution, "mean,min,max,count")
+        for resolution in ("hour", "15min")]
+
+
+@pytest.mark.parametrize("storage", ["tree", "columnar"])
+@pytest.mark.parametrize("options", [{"reorder_lines": 40}, {"external_sort": True}, {"run_lines": 100}])
+def test_unsorted_file_matches_sorted_file(write_csv, read_csv, monkeypatch, tmp_path, storage, options):
+    if "run_lines" in options:  # several runs are merged
+        monkeypatch.setattr(Parser, "sort_lines", partial(sort_lines, run_lines=options.pop("run_lines")))
+        options["external_sort"] = True
+    numbered = list(enumerate(TIMES))
+    order = shuffled(numbered, 41) if "reorder_lines" in options else RANDOM.sample(numbered, len(numbered))
+    # the values keep the order of the unsorted file within a minute, which both sorts preserve
+    unsorted = write_csv(["Date,temp"] + [date.strftime("%d.%m.%Y %H:%M:%S") + ",%d" % (i % 89) for i, date in order],
+                         "unsorted.csv")
+    stable = sorted(order, key=lambda element: element[1].replace(second=0))
+    expected = write_csv(["Date,temp"] + [date.strftime("%d.%m.%Y %H:%M:%S") + ",%d" % (i % 89) for i, date in stable],
+                         "sorted.csv")
+    reader = FileReader(unsorted, storage=storage, temp_dir=str(tmp_path), **options)
+    reader.read_file()
+    assert dump(reader) == dump(read_csv(expected, storage))
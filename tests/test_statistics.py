@@ -0,0 +1,69 @@
+import datetime
+import math
+import random
+
+import pytest
+
+from Parser import FileWriter
+
+START, END = datetime.datetime(1980, 1, 1), datetime.datetime(2050, 1, 1)
+ORIGIN = datetime.datetime(2017, 3, 1, 10)
+# two hours with a value every 6 seconds, skewed so that mean and median differ
+RANDOM = random.Random(7)
+VALUES = [round(RANDOM.expovariate(0.5), 6) for _ in range(1200)]
+LINES = ["Date,temp"] + [(ORIGIN + datetime.timedelta(seconds=6 * i)).strftime("%d.%m.%Y %H:%M:%S") + ",%r" % value
+                         for i, value in enumerate(VALUES)]
+
+
+@pytest.fixture
+def path(write_csv):
+    return write_csv(LINES)
+
+
+def hours():
+    return [VALUES[:600], VALUES[600:]]
+
+
+def aggregate(reader, value_type, resolution="hour"):
+    writer = FileWriter(reader.container)
+    return [value for date, value in writer.get_aggregated_values(reader.container["temp"], START, END, resolution,
+                                                                  value_type)]
+
+
+@pytest.fixture(params=["tree", "columnar", "stream"])
+def reader(request, path, read_csv):
+    if request.param == "stream":
+        return read_csv(path, "stream", resolution="hour", value_type="count,sum,var,std,p5,median,p95")
+    return read_csv(path, request.param)
+
+
+def test_count_and_sum(reader):
+    assert aggregate(reader, "count") == [600, 600]
+    assert aggregate(reader, "sum") == pytest.approx([math.fsum(values) for values in hours()], rel=1e-12)
+
+
+def test_variance_and_deviation(reader):
+    variances = []
+    for values in hours():
+        mean = math.fsum(values) / len(values)
+        variances.append(math.fsum((value - mean) ** 2 for value in values) / len(values))
+    assert aggregate(reader, "var") == pytest.approx(variances, rel=1e-9)
+    assert aggregate(reader, "std") == pytest.approx([math.sqrt(variance) for variance in variances], rel=1e-9)
+
+
+@pytest.mark.parametrize("value_type, fraction", [("p5", 0.05), ("median", 0.5), ("p95", 0.95)])
+def test_percentiles_within_rank_error(reader, value_type, fraction):
+    for estimate, values in zip(aggregate(reader, value_type), hours()):
+        ordered = sorted(values)
+        low = ordered[int((fraction - 0.01) * len(ordered))]
+        high = ordered[int((fraction + 0.01) * len(ordered))]
+        assert low <= estimate <= high
+
+
+def test_stream_keeps_summaries_only_when_needed(path, read_csv):
+    reader = read_csv(path, "stream", resolution="hour", value_type="mean,min,max")
+    container = reader.container["temp"]
+    assert container.summaries is None
+    assert aggregate(reader, "max") == [max(values) for values in hours()]
+    with pytest.raises(AssertionError):
+        aggregate(reader, "p95")
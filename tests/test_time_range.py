@@ -0,0 +1,44 @@
+import datetime
+
+import pytest
+
+from Parser import FileReader, FileWriter
+import main
+
+ORIGIN = datetime.datetime(2017, 3, 1)
+# one line every 7 minutes over two days, several lines share some minutes
+MINUTES = sorted(list(range(0, 2880, 7)) + list(range(0, 2880, 91)))
+LINES = ["Date,temp"] + [(ORIGIN + datetime.timedelta(minutes=minute)).strftime("%d.%m.%Y %H:%M:%S") + ",%d" % minute
+                         for minute in MINUTES]
+RANGES = [(None, None), (0, 2879), (1, 2878), (7, 14), (700, 700), (701, 706), (None, 1000), (1000, None),
+          (2870, None), (2872, 2878), (-100, -1), (3000, 4000)]
+
+
+def read_minutes(reader):
+    values = FileWriter(reader.container).iter_values(ORIGIN - datetime.timedelta(days=1),
+                                                      ORIGIN + datetime.timedelta(days=3), "temp", aggregate_type="none")
+    return [int(value) for date, chunk in values for value in chunk]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("final_newline", [True, False])
+@pytest.mark.parametrize("first, last", RANGES)
+def test_seeked_lines_match_the_range(tmp_path, newline, final_newline, first, last):
+    path = str(tmp_path / "input.csv")
+    with open(path, "w", newline="") as file:
+        file.write(newline.join(LINES) + (newline if final_newline else ""))
+    start_time = None if first is None else ORIGIN + datetime.timedelta(minutes=first)
+    end_time = None if last is None else ORIGIN + datetime.timedelta(minutes=last)
+    reader = FileReader(path)
+    reader.read_file(1, start_time, end_time)
+    expected = [minute for minute in MINUTES if (first is None or minute >= first) and (last is None or minute <= last)]
+    assert (read_minutes(reader) if reader.container else []) == expected
+
+
+def test_default_range_is_not_seeked():
+    controller = main.ParseController(dict(main.settings, **{"--aggregation_type": "mean", "--resolution": "hour"}))
+    assert controller.time_range() == (None, None)
+    controller.settings["--start"] = "2017:03:01:10:20"
+    assert controller.time_range() == (datetime.datetime(2017, 3, 1, 10), None)
+    controller.settings["--end"] = "2017:03:01:12:20"
+    assert controller.time_range() == (datetime.datetime(2017, 3, 1, 10), datetime.datetime(2017, 3, 1, 12, 59))
@@ -0,0 +1,39 @@
+import datetime
+
+import pytest
+
+from Parser import FileReader
+
+# 12 hour clock times and the hours they stand for
+TIMES = [("12:00:00 AM", 0, 0), ("12:30:00 AM", 0, 30), ("01:00:00 AM", 1, 0), ("11:59:00 AM", 11, 59),
+         ("12:00:00 PM", 12, 0), ("12:30:00 PM", 12, 30), ("01:00:00 PM", 13, 0), ("11:59:00 PM", 23, 59)]
+DATES = {"auto": "05.03.2017", "US": "03/05/2017"}
+
+
+@pytest.fixture(params=sorted(DATES))
+def parser(request, write_csv):
+    date = DATES[request.param]
+    path = write_csv(["Date,temp"] + ["%s %s,%d" % (date, time, i) for i, (time, _, _) in enumerate(TIMES)])
+    reader = FileReader(path, date_format=request.param, hour_format=12)
+    reader.read_file()
+    return reader.line_parser, date
+
+
+def test_fixed_layout_converts_12_hour_clock(parser):
+    line_parser, date = parser
+    assert line_parser._layout is not None
+    for time, hour, minute in TIMES:
+        assert line_parser.extract_timestamp("%s %s" % (date, time)) == datetime.datetime(2017, 3, 5, hour, minute)
+
+
+def test_regex_fallback_converts_12_hour_clock(parser):
+    line_parser, date = parser
+    for time, hour, minute in TIMES:
+        assert line_parser.search_timestamp("%s %s" % (date, time)) == datetime.datetime(2017, 3, 5, hour, minute)
+
+
+def test_parsed_values_are_stored_at_24_hour_times(parser):
+    line_parser, _ = parser
+    minutes = [(hour.date.hour, minute.date.minute, minute.children[0]) for day in line_parser.container["temp"].children
+               for hour in day.children for minute in hour.children]
+    assert sorted(minutes) == sorted((hour, minute, float(i)) for i, (_, hour, minute) in enumerate(TIMES))